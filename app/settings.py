@@ -155,7 +155,7 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 FILE_UPLOAD_HANDLERS = [
-    'django.core.files.uploadhandler.TemporaryFileUploadHandler'
+    'main.upload_handlers.HashingTemporaryFileUploadHandler'
 ]
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -192,6 +192,46 @@ CORS_ALLOW_HEADERS = ['*']
 CORS_ALLOW_ALL_ORIGINS = os.environ.get('APP_ENV') == 'dev'
 CORS_ALLOW_CREDENTIALS = True
 
+# Max total size of vector stores kept loaded in memory by each worker process
+VECTOR_STORE_CACHE_MAX_BYTES = env.int('VECTOR_STORE_CACHE_MAX_BYTES', default=256 * 1024 * 1024)
+# Max number of vector stores kept loaded by each worker process (memory-mapped stores take little memory,
+# but keep their files open)
+VECTOR_STORE_CACHE_MAX_ITEMS = env.int('VECTOR_STORE_CACHE_MAX_ITEMS', default=64)
+# Number of text chunks per embeddings API request and max number of concurrent requests
+EMBEDDINGS_BATCH_SIZE = env.int('EMBEDDINGS_BATCH_SIZE', default=64)
+EMBEDDINGS_MAX_CONCURRENCY = env.int('EMBEDDINGS_MAX_CONCURRENCY', default=4)
+# Number of background threads per worker process building vector stores in job mode
+EMBEDDINGS_JOB_WORKERS = env.int('EMBEDDINGS_JOB_WORKERS', default=2)
+# Time to live (seconds) and max number of cached question embeddings per worker process
+EMBEDDINGS_QUERY_CACHE_TTL = env.int('EMBEDDINGS_QUERY_CACHE_TTL', default=3600)
+EMBEDDINGS_QUERY_CACHE_MAX_ITEMS = env.int('EMBEDDINGS_QUERY_CACHE_MAX_ITEMS', default=10000)
+# Cache of answers to the same question to the same store (0 - disabled)
+EMBEDDINGS_ANSWER_CACHE_TTL = env.int('EMBEDDINGS_ANSWER_CACHE_TTL', default=0)
+EMBEDDINGS_ANSWER_CACHE_MAX_ITEMS = env.int('EMBEDDINGS_ANSWER_CACHE_MAX_ITEMS', default=1000)
+# In-process embeddings models ("local:<sentence-transformers model>"): encode batch size and runtime ("torch" or "onnx")
+LOCAL_EMBEDDINGS_BATCH_SIZE = env.int('LOCAL_EMBEDDINGS_BATCH_SIZE', default=32)
+LOCAL_EMBEDDINGS_RUNTIME = env.str('LOCAL_EMBEDDINGS_RUNTIME', default='torch')
+# FAISS index of new stores: "auto" (by chunk count: flat, hnsw, ivf, ivfpq), or one of these types,
+# and search parameters of the approximate indexes (higher is more accurate and slower)
+FAISS_INDEX_TYPE = env.str('FAISS_INDEX_TYPE', default='auto')
+FAISS_NPROBE = env.int('FAISS_NPROBE', default=16)
+FAISS_EF_SEARCH = env.int('FAISS_EF_SEARCH', default=64)
+# Default format of new vector stores: "faiss", "mmap" (memory-mapped float32) or "mmap_fp16"
+VECTOR_STORE_FORMAT = env.str('VECTOR_STORE_FORMAT', default='faiss')
+# Defaults of the vector_stores_gc command (0 - no limit): max total size of all stores (least recently used
+# stores are evicted first), max size of a single store and days since the last access
+VECTOR_STORAGE_MAX_BYTES = env.int('VECTOR_STORAGE_MAX_BYTES', default=0)
+VECTOR_STORE_MAX_BYTES = env.int('VECTOR_STORE_MAX_BYTES', default=0)
+VECTOR_STORE_MAX_AGE_DAYS = env.int('VECTOR_STORE_MAX_AGE_DAYS', default=0)
+# Background video processing jobs: worker threads per process and max number of jobs running
+# at the same time on the host (shared by all worker processes)
+MEDIA_JOB_WORKERS = env.int('MEDIA_JOB_WORKERS', default=2)
+MEDIA_JOBS_HOST_CONCURRENCY = env.int('MEDIA_JOBS_HOST_CONCURRENCY', default=2)
+# Resumable chunked uploads of media files: max size of an upload, and hours after the last chunk
+# when incomplete or unused uploads are deleted
+MEDIA_UPLOAD_MAX_BYTES = env.int('MEDIA_UPLOAD_MAX_BYTES', default=100 * 1024 * 1024)
+MEDIA_UPLOAD_EXPIRE_HOURS = env.int('MEDIA_UPLOAD_EXPIRE_HOURS', default=24)
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
@@ -88,13 +88,25 @@ urlpatterns = [
 
     # OpenAI Embeddings
     path('api/v1/store_create', views.embeddings_create_store_action, name='embeddings_create_store_action'),
+    path('api/v1/store_status/<uuid:store_uuid>', views.embeddings_store_status_action,
+         name='embeddings_store_status_action'),
+    path('api/v1/store_update', views.embeddings_update_store_action, name='embeddings_update_store_action'),
     path('api/v1/store_question', views.embeddings_store_question_action, name='embeddings_store_question_action'),
+    path('api/v1/store_question_stream', views.embeddings_store_question_stream_action,
+         name='embeddings_store_question_stream_action'),
+    path('api/v1/store_search', views.embeddings_store_search_action, name='embeddings_store_search_action'),
+    path('api/v1/store_stats', views.embeddings_store_stats_action, name='embeddings_store_stats_action'),
 
     # Video
     path('api/v1/extract_video_frame', views.extract_video_frame, name='extract_video_frame'),
+    path('api/v1/extract_video_frames', views.extract_video_frames, name='extract_video_frames'),
     path('api/v1/replace_video_audio', views.replace_video_audio, name='replace_video_audio'),
     path('api/v1/trim_video', views.trim_video, name='trim_video'),
     path('api/v1/concatenate_videos', views.concatenate_video_files, name='concatenate_videos'),
+    path('api/v1/media_upload', views.media_upload_create, name='media_upload_create'),
+    path('api/v1/media_upload/<uuid:upload_id>', views.media_upload_action, name='media_upload_action'),
+    path('api/v1/media_job_status/<uuid:job_uuid>', views.media_job_status, name='media_job_status'),
+    path('api/v1/media_job_result/<uuid:job_uuid>', views.media_job_result, name='media_job_result'),
 
     # Screenshot
     path('api/v1/website_screenshot', website_screenshot, name='website_screenshot'),
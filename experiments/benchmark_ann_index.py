@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Benchmark of the FAISS index types used for vector stores (main/faiss_index.py).
+
+Builds each index type over clustered random vectors and reports build time,
+recall@10 against the exact flat index and search latency per query for several
+values of the search parameter (efSearch for HNSW, nprobe for IVF and IVFPQ).
+
+Usage:
+    python experiments/benchmark_ann_index.py [count] [dimensions]
+"""
+
+import os
+import sys
+import time
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Setup Django settings
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+import django
+django.setup()
+
+import numpy as np
+
+from main.faiss_index import choose_index_type, create_index, tune_index
+
+QUERIES_COUNT = 200
+K = 10
+SEARCH_PARAMETERS = {
+    'flat': [None],
+    'hnsw': [16, 32, 64, 128, 256],
+    'ivf': [1, 4, 16, 64],
+    'ivfpq': [1, 4, 16, 64],
+}
+
+
+def normalize(vectors):
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def make_vectors(count, dimensions, rng):
+    """Clustered unit vectors, similar in structure to text embeddings."""
+    centers = rng.normal(size=(max(count // 500, 10), dimensions))
+    return normalize(centers[rng.integers(0, len(centers), count)] + rng.normal(scale=0.5, size=(count, dimensions)))
+
+
+def search(index, queries):
+    start = time.perf_counter()
+    _, ids = index.search(queries, K)
+    return ids, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def recall(ids, true_ids):
+    return float(np.mean([len(set(row) & set(true_row)) / K for row, true_row in zip(ids, true_ids)]))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    dimensions = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    rng = np.random.default_rng(0)
+    vectors = make_vectors(count, dimensions, rng)
+    # Questions are close to some of the chunks, but not equal to them
+    queries = normalize(vectors[rng.choice(count, QUERIES_COUNT, replace=False)]
+                        + rng.normal(scale=0.05, size=(QUERIES_COUNT, dimensions)))
+    print(f'{count} vectors x {dimensions} dimensions, {QUERIES_COUNT} queries, '
+          f'auto index type: {choose_index_type(count, "auto")}')
+    print(f'{"index":<8} {"param":>6} {"build s":>8} {"recall@10":>10} {"ms/query":>9}')
+
+    true_ids = None
+    for index_type, parameters in SEARCH_PARAMETERS.items():
+        start = time.perf_counter()
+        index = create_index(vectors, index_type)
+        build_time = time.perf_counter() - start
+        for parameter in parameters:
+            tune_index(index, nprobe=parameter, ef_search=parameter)
+            ids, latency = search(index, queries)
+            if true_ids is None:
+                true_ids = ids
+            print(f'{index_type:<8} {parameter or "-":>6} {build_time:>8.2f} {recall(ids, true_ids):>10.3f} '
+                  f'{latency:>9.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+Benchmark of the batched, concurrent embeddings pipeline used to build vector stores.
+
+Starts a local fake OpenAI-compatible embeddings server (fixed latency per request plus
+latency per text, optional random 429 responses) and compares FAISS.from_texts with
+main.embeddings._build_vector_store on the same set of chunks.
+
+Usage:
+    python experiments/benchmark_embeddings_pipeline.py [chunks_count] [rate_limit_probability]
+"""
+
+import base64
+import hashlib
+import json
+import os
+import random
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Setup Django settings
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+import django
+django.setup()
+
+from langchain_community.vectorstores import FAISS
+from langchain_openai import OpenAIEmbeddings
+
+from main.embeddings import _build_vector_store
+
+DIMENSIONS = 256
+REQUEST_LATENCY = 0.15  # seconds per request
+TEXT_LATENCY = 0.002    # seconds per text in the request
+
+
+def fake_vector(text: str) -> list[float]:
+    digest = hashlib.sha256(text.encode('utf-8')).digest()
+    rnd = random.Random(digest)
+    return [rnd.uniform(-1, 1) for _ in range(DIMENSIONS)]
+
+
+class FakeEmbeddingsHandler(BaseHTTPRequestHandler):
+    rate_limit_probability = 0.0
+    requests_count = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        FakeEmbeddingsHandler.requests_count += 1
+
+        if random.random() < self.rate_limit_probability:
+            self.send_response(429)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            self.wfile.write(json.dumps({'error': {'message': 'Rate limit', 'type': 'rate_limit'}}).encode())
+            return
+
+        inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+        time.sleep(REQUEST_LATENCY + TEXT_LATENCY * len(inputs))
+
+        data = []
+        for index, text in enumerate(inputs):
+            vector = fake_vector(str(text))
+            if body.get('encoding_format') == 'base64':
+                vector = base64.b64encode(struct.pack(f'{len(vector)}f', *vector)).decode()
+            data.append({'object': 'embedding', 'index': index, 'embedding': vector})
+
+        output = json.dumps({
+            'object': 'list',
+            'data': data,
+            'model': body.get('model'),
+            'usage': {'prompt_tokens': 0, 'total_tokens': 0},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(output)))
+        self.end_headers()
+        self.wfile.write(output)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    chunks_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    FakeEmbeddingsHandler.rate_limit_probability = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeEmbeddingsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url_base = f'http://127.0.0.1:{server.server_port}/v1'
+
+    texts = [f'Chunk {i}: ' + ' '.join(f'word{(i * 7 + j) % 997}' for j in range(150)) for i in range(chunks_count)]
+    embeddings_model = OpenAIEmbeddings(
+        model='text-embedding-fake',
+        openai_api_base=api_url_base,
+        openai_api_key='test',
+        check_embedding_ctx_length=False,
+        chunk_size=64,
+    )
+
+    print(f'Chunks: {chunks_count}, rate limit probability: {FakeEmbeddingsHandler.rate_limit_probability}')
+    print('=' * 60)
+
+    FakeEmbeddingsHandler.requests_count = 0
+    start = time.perf_counter()
+    FAISS.from_texts(texts, embeddings_model)
+    print(f'FAISS.from_texts:     {time.perf_counter() - start:7.2f} s '
+          f'({FakeEmbeddingsHandler.requests_count} requests)')
+
+    for concurrency in (1, 4, 8):
+        FakeEmbeddingsHandler.requests_count = 0
+        start = time.perf_counter()
+        vector_store = _build_vector_store(texts, embeddings_model, batch_size=64, max_concurrency=concurrency)
+        print(f'pipeline (x{concurrency}):       {time.perf_counter() - start:7.2f} s '
+              f'({FakeEmbeddingsHandler.requests_count} requests, {vector_store.index.ntotal} vectors)')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
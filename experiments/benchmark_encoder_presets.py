@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Benchmark of the encoder presets of the video concatenation (main/lib_ffmpeg.py ENCODER_PRESETS).
+
+Creates a test video, re-encodes it scaled to the output size with each preset on one core,
+and reports the time, the output size and the output pixels encoded per second by one core,
+to compare with ENCODER_PIXEL_RATES used by the auto preset. Then reports the preset chosen
+by the auto mode for videos of several durations.
+
+Usage:
+    python experiments/benchmark_encoder_presets.py [duration] [width]x[height]
+"""
+
+import os
+import sys
+import subprocess
+import tempfile
+import time
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Setup Django settings
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+import django
+django.setup()
+
+from main.lib_ffmpeg import FFMPEG_PATH, CPU_COUNT, ENCODER_PRESETS, ENCODER_PIXEL_RATES, FFmpegProcessGroup, \
+    _scale_video, choose_encoder_preset
+
+FPS = 25
+CONCATENATION_TIMEOUT = 300
+AUTO_DURATIONS = (10, 60, 180, 600)
+
+
+def create_video(output_path, duration, size):
+    cmd = [
+        FFMPEG_PATH, '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=s={size}:d={duration}:r={FPS}',
+        '-f', 'lavfi', '-i', f'sine=d={duration}',
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-shortest', '-y', output_path
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def main():
+    duration = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    size = sys.argv[2] if len(sys.argv) > 2 else '1280x720'
+    width, height = (int(value) for value in size.split('x'))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Input of another size, so it is scaled as in the concatenation
+        video_path = os.path.join(temp_dir, 'video.mp4')
+        create_video(video_path, duration, f'{width * 3 // 4 // 2 * 2}x{height * 3 // 4 // 2 * 2}')
+        print(f'{duration} s video scaled to {size}, 1 thread')
+        print(f'{"preset":<9} {"time s":>7} {"size KB":>8} {"pixels/s":>12} {"configured":>12}')
+
+        for preset in ENCODER_PRESETS:
+            output_path = os.path.join(temp_dir, f'{preset}.mp4')
+            started = time.perf_counter()
+            success = _scale_video(video_path, output_path, width, height, FFmpegProcessGroup(600),
+                                   threads=1, preset=preset)
+            elapsed = time.perf_counter() - started
+            if not success:
+                print(f'{preset:<9} failed')
+                continue
+            pixel_rate = duration * FPS * width * height / elapsed
+            print(f'{preset:<9} {elapsed:>7.2f} {os.path.getsize(output_path) // 1024:>8} '
+                  f'{pixel_rate:>12,.0f} {ENCODER_PIXEL_RATES[preset]:>12,}')
+
+    print(f'\nAuto preset for two {size} videos, {CPU_COUNT} cores, {CONCATENATION_TIMEOUT} s timeout')
+    for video_duration in AUTO_DURATIONS:
+        media_infos = [{'duration': video_duration, 'fps': FPS}] * 2
+        preset = choose_encoder_preset(media_infos, width, height, CONCATENATION_TIMEOUT)
+        print(f'{video_duration:>5} s: {preset}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+"""
+Benchmark of the markdown chunker used for docs mode vector stores.
+
+Compares main.embeddings._split_markdown_docs (single pass over the lines) with the
+previous implementation based on MarkdownHeaderTextSplitter, kept below for reference,
+on large synthetic documentation and checks that both produce the same chunks.
+
+Usage:
+    python experiments/benchmark_markdown_chunker.py [size_mb ...]
+"""
+
+import os
+import random
+import re
+import sys
+import time
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Setup Django settings
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+import django
+django.setup()
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter, MarkdownHeaderTextSplitter
+
+from main.embeddings import _split_markdown_docs
+
+WORDS = ('request', 'response', 'store', 'vector', 'chunk', 'header', 'token', 'model', 'worker', 'cache',
+         'index', 'query', 'answer', 'section', 'document', 'server', 'client', 'option', 'value', 'limit')
+
+
+# --- Previous implementation (reference) ---
+
+LEGACY_CODE_BLOCK_RE = re.compile(
+    r'(```[\s\S]*?```'        # fenced code blocks
+    r'|`[^`\n]+`'             # inline code
+    r'|(?:^\|.+\|[ \t]*\n)+'  # consecutive markdown table rows
+    r')',
+    re.MULTILINE,
+)
+
+
+def legacy_split_preserving_code_blocks(text: str, chunk_size: int, chunk_overlap: int,
+                                   splitter: RecursiveCharacterTextSplitter) -> list[str]:
+    """Split text into chunks without ever breaking code blocks."""
+    if len(text) <= chunk_size or not LEGACY_CODE_BLOCK_RE.search(text):
+        return splitter.split_text(text)
+
+    # Tokenise: alternate between prose segments and code blocks
+    tokens = LEGACY_CODE_BLOCK_RE.split(text)   # [prose, code, prose, code, ...]
+    code_blocks = LEGACY_CODE_BLOCK_RE.findall(text)
+
+    result: list[str] = []
+    buffer = ''
+
+    # tokens holds the code blocks too, only the prose segments (even items) are iterated here
+    for i, prose in enumerate(tokens[::2]):
+        if len(buffer) + len(prose) <= chunk_size:
+            buffer += prose
+        else:
+            if buffer.strip():
+                result.extend(splitter.split_text(buffer))
+            buffer = prose
+
+        if i < len(code_blocks):
+            code = code_blocks[i]
+            if len(buffer) + len(code) <= chunk_size * 1.5:
+                buffer += code
+            else:
+                if buffer.strip():
+                    result.extend(splitter.split_text(buffer))
+                result.append(code)   # code block becomes its own chunk even if large
+                buffer = ''
+
+    if buffer.strip():
+        result.extend(splitter.split_text(buffer))
+
+    return result or [text]
+
+
+def legacy_get_parent_breadcrumb(metadata: dict) -> str:
+    """Return the breadcrumb of the parent header (all levels except the deepest)."""
+    parts = [metadata[k] for k in ('h1', 'h2', 'h3', 'h4') if metadata.get(k)]
+    return ' > '.join(parts[:-1]) if len(parts) > 1 else ''
+
+
+def legacy_build_summary_chunk(source_text: str) -> str:
+    """Build a document overview chunk from h1/h2/h3 headings."""
+    heading_re = re.compile(r'^(#{1,3})\s+(.+)$', re.MULTILINE)
+    lines = []
+    for match in heading_re.finditer(source_text):
+        level = len(match.group(1))
+        indent = '  ' * (level - 1)
+        lines.append(f'{indent}- {match.group(2).strip()}')
+    if not lines:
+        return ''
+    return '[Document Overview]\n\n' + '\n'.join(lines)
+
+
+def legacy_split_markdown_docs(source_text: str, chunk_size: int = 2000,
+                         chunk_overlap: int = 200) -> list[str]:
+    """
+    Smart chunking for Markdown documentation:
+
+    1. Split by headers (##/###/####) — each section gets full breadcrumb path.
+    2. Code blocks and markdown tables are never split.
+    3. Small sibling sections (same parent header) are merged if combined < chunk_size.
+    4. Oversized sections are split by paragraphs/lines while protecting code blocks.
+    5. The breadcrumb is prepended to every chunk so the LLM always knows the context.
+    6. A summary/index chunk is generated from h1/h2/h3 headings.
+    """
+    headers_to_split_on = [
+        ('#', 'h1'),
+        ('##', 'h2'),
+        ('###', 'h3'),
+        ('####', 'h4'),
+    ]
+    md_splitter = MarkdownHeaderTextSplitter(
+        headers_to_split_on=headers_to_split_on,
+        strip_headers=False,
+    )
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=['\n\n', '\n', ' '],
+    )
+
+    header_docs = md_splitter.split_text(source_text)
+
+    # --- Merge small sibling sections ---
+    merged_docs = []
+    i = 0
+    while i < len(header_docs):
+        doc = header_docs[i]
+        content = doc.page_content.strip()
+        metadata = dict(doc.metadata)
+        parent = legacy_get_parent_breadcrumb(metadata)
+
+        # Try merging with following siblings that share the same parent
+        while (i + 1 < len(header_docs)
+               and legacy_get_parent_breadcrumb(header_docs[i + 1].metadata) == parent
+               and parent  # only merge if there IS a parent (not top-level)
+               and len(content) + len(header_docs[i + 1].page_content) + 2 < chunk_size):
+            i += 1
+            content = content + '\n\n' + header_docs[i].page_content.strip()
+
+        merged_docs.append((metadata, content))
+        i += 1
+
+    # --- Build final chunks ---
+    final_chunks: list[str] = []
+
+    # Summary chunk
+    summary = legacy_build_summary_chunk(source_text)
+    if summary:
+        final_chunks.append(summary)
+
+    for metadata, content in merged_docs:
+        if not content:
+            continue
+
+        breadcrumb_parts = [
+            metadata[k]
+            for k in ('h1', 'h2', 'h3', 'h4')
+            if metadata.get(k)
+        ]
+        breadcrumb = ' > '.join(breadcrumb_parts)
+        prefix = f'[{breadcrumb}]\n\n' if breadcrumb else ''
+
+        if len(prefix) + len(content) <= chunk_size:
+            final_chunks.append(prefix + content)
+        else:
+            sub_chunks = legacy_split_preserving_code_blocks(content, chunk_size, chunk_overlap, text_splitter)
+            for chunk in sub_chunks:
+                final_chunks.append(prefix + chunk)
+
+    return final_chunks
+
+
+# --- Benchmark ---
+
+def sentence(rnd: random.Random) -> str:
+    words = [rnd.choice(WORDS) for _ in range(rnd.randint(6, 18))]
+    if rnd.random() < 0.2:
+        words[rnd.randrange(len(words))] = f'`{rnd.choice(WORDS)}()`'
+    return ' '.join(words).capitalize() + '.'
+
+
+def generate_document(size: int, seed: int = 0) -> str:
+    """Synthetic documentation: nested headers, paragraphs, fenced code blocks and tables."""
+    rnd = random.Random(seed)
+    parts = []
+    total = 0
+    while total < size:
+        level = rnd.choice((1, 2, 2, 3, 3, 3, 4))
+        block = [f'{"#" * level} {rnd.choice(WORDS).capitalize()} {rnd.choice(WORDS)}', '']
+        for _ in range(rnd.randint(1, 6)):
+            kind = rnd.random()
+            if kind < 0.15:
+                block += ['```python'] + [f'    {rnd.choice(WORDS)} = {rnd.randint(0, 99)}'
+                                          for _ in range(rnd.randint(2, 30))] + ['```', '']
+            elif kind < 0.25:
+                block += ['| Name | Value |', '| ---- | ----- |'] + [f'| {rnd.choice(WORDS)} | {rnd.randint(0, 99)} |'
+                                                                  for _ in range(rnd.randint(2, 12))] + ['']
+            else:
+                block += [' '.join(sentence(rnd) for _ in range(rnd.randint(1, 12))), '']
+        text = '\n'.join(block)
+        parts.append(text)
+        total += len(text) + 1
+    return '\n'.join(parts)
+
+
+def measure(func, *args, repeat: int = 3) -> tuple[float, list]:
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    sizes = [float(value) for value in sys.argv[1:]] or [1, 4, 16]
+    for chunk_size, chunk_overlap in ((2000, 200), (1500, 150)):
+        print(f'chunk_size={chunk_size}, chunk_overlap={chunk_overlap}')
+        print('=' * 60)
+        for size_mb in sizes:
+            source_text = generate_document(int(size_mb * 1024 * 1024))
+            legacy_time, legacy_chunks = measure(legacy_split_markdown_docs, source_text, chunk_size, chunk_overlap)
+            new_time, new_chunks = measure(_split_markdown_docs, source_text, chunk_size, chunk_overlap)
+            print(f'{size_mb:6.1f} MB: previous {legacy_time:7.3f} s, single pass {new_time:7.3f} s '
+                  f'(x{legacy_time / new_time:.1f}), {len(new_chunks)} chunks, '
+                  f'same chunks: {new_chunks == legacy_chunks}')
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Benchmark of the video trim modes (main/lib_ffmpeg.py trim_video_segment).
+
+Creates an H.264 test video and trims segments with the cut points between keyframes
+in each mode, reporting the time and the number of frames in the output against
+the number of source frames between the start and end times.
+
+Usage:
+    python experiments/benchmark_smart_trim.py [duration] [width]x[height] [gop]
+"""
+
+import os
+import sys
+import subprocess
+import tempfile
+import time
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Setup Django settings
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+import django
+django.setup()
+
+from main.lib_ffmpeg import FFMPEG_PATH, FFPROBE_PATH, TRIM_MODES, trim_video_segment
+
+FPS = 25
+SEGMENTS_COUNT = 3
+
+
+def create_video(output_path, duration, size, gop):
+    cmd = [
+        FFMPEG_PATH, '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=s={size}:d={duration}:r={FPS}',
+        '-f', 'lavfi', '-i', f'sine=d={duration}',
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-g', str(gop),
+        '-c:a', 'aac', '-shortest', '-y', output_path
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def count_frames(video_path):
+    cmd = [FFPROBE_PATH, '-v', 'error', '-count_frames', '-select_streams', 'v:0',
+           '-show_entries', 'stream=nb_read_frames', '-of', 'csv=p=0', video_path]
+    return int(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout.strip())
+
+
+def main():
+    duration = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    size = sys.argv[2] if len(sys.argv) > 2 else '1280x720'
+    gop = int(sys.argv[3]) if len(sys.argv) > 3 else 250
+    gop_seconds = gop / FPS
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        video_path = os.path.join(temp_dir, 'video.mp4')
+        create_video(video_path, duration, size, gop)
+        # Segments of half the video starting and ending in the middle of GOPs
+        segments = []
+        for i in range(SEGMENTS_COUNT):
+            start = round((i + 0.37) * gop_seconds, 2)
+            segments.append((start, round(start + duration / 2 + 0.41 * gop_seconds, 2)))
+        print(f'{duration} s {size} video, keyframe every {gop_seconds:g} s, {SEGMENTS_COUNT} segments')
+        print(f'{"mode":<9} {"segment":>15} {"time s":>7} {"frames":>7} {"expected":>9}')
+
+        for mode in TRIM_MODES:
+            for start, end in segments:
+                output_path = os.path.join(temp_dir, f'{mode}.mp4')
+                started = time.perf_counter()
+                success, error_message, _ = trim_video_segment(video_path, output_path, start, end, mode=mode)
+                elapsed = time.perf_counter() - started
+                if not success:
+                    print(f'{mode:<9} {start:>7}-{end:<7} {error_message}')
+                    continue
+                expected = sum(1 for n in range(duration * FPS) if start <= n / FPS < end)
+                print(f'{mode:<9} {start:>7}-{end:<7} {elapsed:>7.2f} {count_frames(output_path):>7} {expected:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 import os.path
 from django.contrib import admin
 from app import settings
-from main.models import ProductModel, ImageModel, LogOwnerModel, LogItemModel
+from main.models import ProductModel, ImageModel, LogOwnerModel, LogItemModel, MediaJobModel, MediaUploadModel
 
 
 class LogsInline(admin.TabularInline):
@@ -63,3 +63,18 @@ class LogItemModelAdmin(admin.ModelAdmin):
     list_display = ('id', 'uuid', 'owner', 'date_created')
     list_display_links = ('id', 'uuid')
 
+
+@admin.register(MediaJobModel)
+class MediaJobModelAdmin(admin.ModelAdmin):
+    list_display = ('id', 'operation', 'status', 'user', 'date_created', 'date_finished')
+    list_display_links = ('id', 'operation')
+    list_filter = ('operation', 'status')
+    readonly_fields = ('uuid', 'date_created', 'date_started', 'date_finished')
+
+
+@admin.register(MediaUploadModel)
+class MediaUploadModelAdmin(admin.ModelAdmin):
+    list_display = ('id', 'file_name', 'status', 'size', 'offset', 'user', 'date_updated')
+    list_display_links = ('id', 'file_name')
+    list_filter = ('status',)
+    readonly_fields = ('uuid', 'date_created', 'date_updated')
@@ -1,34 +1,85 @@
+import copy
+import fcntl
+import hashlib
+import itertools
+import json
 import logging
 import os
+import random
 import re
+import shutil
 import sys
+import threading
+import time
 import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timezone
 
 from langchain.chains.combine_documents import create_stuff_documents_chain
+import numpy as np
 from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.retrievers import BaseRetriever
 from langchain_huggingface import HuggingFaceEndpointEmbeddings
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain.chains import create_retrieval_chain
-from langchain.text_splitter import RecursiveCharacterTextSplitter, MarkdownHeaderTextSplitter
+from langchain.text_splitter import RecursiveCharacterTextSplitter
 from openai import AuthenticationError, RateLimitError, APIError
+from pydantic import ConfigDict
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app.settings import BASE_DIR
+from app.settings import BASE_DIR, VECTOR_STORE_CACHE_MAX_BYTES, VECTOR_STORE_CACHE_MAX_ITEMS, EMBEDDINGS_BATCH_SIZE, EMBEDDINGS_MAX_CONCURRENCY, \
+    EMBEDDINGS_JOB_WORKERS, VECTOR_STORE_FORMAT, EMBEDDINGS_QUERY_CACHE_TTL, EMBEDDINGS_QUERY_CACHE_MAX_ITEMS, \
+    EMBEDDINGS_ANSWER_CACHE_TTL, EMBEDDINGS_ANSWER_CACHE_MAX_ITEMS, VECTOR_STORAGE_MAX_BYTES
+from main.faiss_index import build_ann_index, restore_flat_index, tune_index
+from main.lexical_index import LexicalIndex
+from main.local_embeddings import is_local_embeddings_model, get_local_embeddings_model
+from main.mmap_vector_store import MmapVectorStore
 
 logger = logging.getLogger(__name__)
 
 VECTOR_STORAGE_PATH = os.path.join(BASE_DIR, 'vector_stores')
 os.makedirs(VECTOR_STORAGE_PATH, exist_ok=True)
 
+EMBEDDINGS_CACHE_PATH = os.path.join(BASE_DIR, 'embeddings_cache')
+
 DEFAULT_HF_MODEL = 'sentence-transformers/all-mpnet-base-v2'
 
+STORE_META_FILE_NAME = 'store.json'
+
+# Storage formats: FAISS index with pickled docstore, or memory-mapped flat files (float32 / float16 vectors)
+STORAGE_FORMATS = ('faiss', 'mmap', 'mmap_fp16')
+
+STORE_STATUS_PENDING = 'pending'
+STORE_STATUS_PROCESSING = 'processing'
+STORE_STATUS_READY = 'ready'
+STORE_STATUS_ERROR = 'error'
+STORE_JOB_LOST_ERROR = 'Store creation was interrupted by a server restart. Please create the store again.'
+
+SEARCH_TYPES = ('mmr', 'similarity', 'hybrid')
+RRF_K = 60  # rank constant of the reciprocal rank fusion of vector and lexical results
+
+# The last access time of a store is the modification time of its directory (the files are left alone,
+# their modification time identifies the store version); it is updated at most once per this many seconds.
+STORE_ACCESS_RESOLUTION = 60
+# Seconds after which leftover *.tmp directories and unfinished stores are removed by the garbage collector
+STALE_TEMP_DIR_AGE = 3600
+
+EMBEDDINGS_MAX_RETRIES = 5
+EMBEDDINGS_RETRY_DELAY = 1.0  # seconds, doubled on every retry
+
 DEFAULT_PROMPT = ChatPromptTemplate.from_messages([
     ('human', 'Context:\n{context}\n\nQuestion: {input}'),
 ])
 
 
 def _build_embeddings_model(model, api_key, api_url_base, hf_api_token, hf_model):
+    if is_local_embeddings_model(model):
+        return get_local_embeddings_model(model)
     if hf_api_token:
         return HuggingFaceEndpointEmbeddings(
             model=hf_model,
@@ -38,20 +89,492 @@ def _build_embeddings_model(model, api_key, api_url_base, hf_api_token, hf_model
     return OpenAIEmbeddings(model=model, openai_api_base=api_url_base, openai_api_key=api_key)
 
 
-def create_and_store_embeddings(source_text, model='text-embedding-3-large', api_key=None,
-                                api_url_base=None, hf_api_token=None, hf_model=DEFAULT_HF_MODEL):
-    file_id = str(uuid.uuid4())
-    storage_path = os.path.join(VECTOR_STORAGE_PATH, file_id)
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len
+def _get_embeddings_namespace(model, hf_api_token, hf_model) -> str:
+    """Name of the embeddings model used to separate cached vectors of different models."""
+    if is_local_embeddings_model(model):
+        namespace = model
+    else:
+        namespace = f'hf_{hf_model}' if hf_api_token else f'openai_{model}'
+    return re.sub(r'[^a-zA-Z0-9_.\-]', '_', namespace)
+
+
+class ChunkEmbeddingsCache(Embeddings):
+    """
+    Embeddings wrapper that keeps document vectors in a persistent cache shared across stores.
+
+    Vectors are stored as float32 files keyed by (embedding model, SHA-256 of the chunk text),
+    so re-uploading the same content only embeds the chunks that have changed.
+    Query embeddings are not cached here.
+    """
+
+    def __init__(self, embeddings_model: Embeddings, namespace: str, root_path: str = None):
+        self.embeddings_model = embeddings_model
+        self.root_path = os.path.join(root_path or EMBEDDINGS_CACHE_PATH, namespace)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _get_path(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return os.path.join(self.root_path, digest[:2], f'{digest}.f32')
+
+    @staticmethod
+    def _read(path: str):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if not data or len(data) % 4:
+            return None
+        return np.frombuffer(data, dtype=np.float32).tolist()
+
+    @staticmethod
+    def _write(path: str, vector: list[float]):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(np.asarray(vector, dtype=np.float32).tobytes())
+        os.replace(temp_path, path)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        paths = [self._get_path(text) for text in texts]
+        vectors = [self._read(path) for path in paths]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+        if missing:
+            new_vectors = self.embeddings_model.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, new_vectors):
+                vectors[i] = vector
+                try:
+                    self._write(paths[i], vector)
+                except OSError as e:
+                    logger.warning('Failed to cache chunk embedding: %s', e)
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings_model.embed_query(text)
+
+
+def _embed_batch_with_retry(embeddings_model, texts: list[str], max_retries: int = EMBEDDINGS_MAX_RETRIES):
+    """Embed one batch of texts, retrying rate limit errors with exponential backoff and jitter."""
+    for attempt in range(max_retries + 1):
+        try:
+            return embeddings_model.embed_documents(texts)
+        except RateLimitError:
+            if attempt == max_retries:
+                raise
+            delay = EMBEDDINGS_RETRY_DELAY * 2 ** attempt
+            delay += random.uniform(0, delay / 2)
+            logger.warning('Embeddings rate limit exceeded, retry %d/%d in %.1f s', attempt + 1, max_retries, delay)
+            time.sleep(delay)
+
+
+def _new_vector_store(text_embeddings, embeddings_model, storage_format: str = 'faiss'):
+    if storage_format == 'mmap':
+        return MmapVectorStore.from_embeddings(text_embeddings, embeddings_model)
+    if storage_format == 'mmap_fp16':
+        return MmapVectorStore.from_embeddings(text_embeddings, embeddings_model, dtype='float16')
+    return FAISS.from_embeddings(text_embeddings, embeddings_model)
+
+
+def _read_vector_store(storage_path: str, embeddings_model):
+    """Load a store from disk in the format it was saved with, together with its lexical index if it has one."""
+    # The files are not replaced while they are read, so their metadata and data always match
+    with _store_files_lock(storage_path, exclusive=False):
+        if os.path.exists(os.path.join(storage_path, MmapVectorStore.META_FILE_NAME)):
+            vector_store = MmapVectorStore.load_local(storage_path, embeddings_model)
+        else:
+            vector_store = FAISS.load_local(storage_path, embeddings_model, allow_dangerous_deserialization=True)
+            tune_index(vector_store.index)
+        vector_store.lexical_index = LexicalIndex.load_local(storage_path)
+    return vector_store
+
+
+def _get_store_chunks(vector_store) -> list[tuple[str, str]]:
+    """Return (id, text) of every chunk in the store."""
+    if isinstance(vector_store, MmapVectorStore):
+        return list(vector_store.iter_chunks())
+    return [
+        (doc_id, vector_store.docstore.search(doc_id).page_content)
+        for doc_id in vector_store.index_to_docstore_id.values()
+    ]
+
+
+def _build_vector_store(texts: list[str], embeddings_model, batch_size: int = EMBEDDINGS_BATCH_SIZE,
+                        max_concurrency: int = EMBEDDINGS_MAX_CONCURRENCY, progress_callback=None,
+                        vector_store=None, storage_format: str = 'faiss'):
+    """
+    Build a FAISS vector store, embedding the texts in batches requested concurrently.
+
+    Batches are added to the index as soon as they arrive (in the original order of the
+    texts, so the result does not depend on the order in which the requests complete).
+    progress_callback(done, total) is called after every batch added to the index.
+    If vector_store is given, the texts are appended to it instead of a new store
+    (storage_format is then ignored).
+    """
+    if not texts:
+        if vector_store is not None:
+            return vector_store
+        raise ValueError('No text chunks to index.')
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    completed = {}
+    next_batch = 0
+    done = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(batches)))) as executor:
+        futures = {
+            executor.submit(_embed_batch_with_retry, embeddings_model, batch): index
+            for index, batch in enumerate(batches)
+        }
+        try:
+            for future in as_completed(futures):
+                completed[futures[future]] = future.result()
+                while next_batch in completed:
+                    text_embeddings = list(zip(batches[next_batch], completed.pop(next_batch)))
+                    if vector_store is None:
+                        vector_store = _new_vector_store(text_embeddings, embeddings_model, storage_format)
+                    else:
+                        vector_store.add_embeddings(text_embeddings)
+                    done += len(text_embeddings)
+                    next_batch += 1
+                    if progress_callback is not None:
+                        progress_callback(done, len(texts))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    return vector_store
+
+
+class VectorStoreCache:
+    """
+    Per-process LRU cache of loaded vector stores.
+
+    The cache is limited by the total on-disk size of the cached stores (a close
+    estimate of the memory they take once loaded) and by the number of stores, as
+    memory-mapped stores take little memory but keep their files open. An entry is
+    reloaded when the files in the store directory have been modified after it was cached.
+    """
+
+    def __init__(self, max_bytes: int, max_items: int = VECTOR_STORE_CACHE_MAX_ITEMS):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._items = OrderedDict()  # storage_path -> (mtime, size, vector_store)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stat_store(storage_path: str) -> tuple[float, int]:
+        mtime = 0.0
+        size = 0
+        with os.scandir(storage_path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    mtime = max(mtime, stat.st_mtime)
+                    size += stat.st_size
+        return mtime, size
+
+    def get(self, storage_path: str, loader):
+        """Return the cached store for storage_path, calling loader() on a miss."""
+        mtime, size = self._stat_store(storage_path)
+        with self._lock:
+            item = self._items.get(storage_path)
+            if item is not None and item[0] == mtime:
+                self._items.move_to_end(storage_path)
+                self.hits += 1
+                return item[2]
+            self.misses += 1
+
+        vector_store = loader()
+        # Memory-mapped stores report the (much smaller) size they actually keep in process memory
+        size = getattr(vector_store, 'memory_bytes', size)
+
+        with self._lock:
+            self._discard(storage_path)
+            if size <= self.max_bytes:
+                self._items[storage_path] = (mtime, size, vector_store)
+                self.current_bytes += size
+                while self.current_bytes > self.max_bytes or len(self._items) > self.max_items:
+                    _, (_, evicted_size, _) = self._items.popitem(last=False)
+                    self.current_bytes -= evicted_size
+                    self.evictions += 1
+        return vector_store
+
+    def invalidate(self, storage_path: str):
+        with self._lock:
+            self._discard(storage_path)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+    def _discard(self, storage_path: str):
+        item = self._items.pop(storage_path, None)
+        if item is not None:
+            self.current_bytes -= item[1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'pid': os.getpid(),
+                'items': len(self._items),
+                'current_bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'max_items': self.max_items,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+vector_store_cache = VectorStoreCache(VECTOR_STORE_CACHE_MAX_BYTES)
+
+
+def get_vector_store_cache_stats() -> dict:
+    """Return hit/miss counters of the loaded vector stores cache of this worker."""
+    return vector_store_cache.stats()
+
+
+class TTLCache:
+    """
+    Per-process cache of small values with a time to live.
+
+    Entries expire ttl seconds after they were stored; when max_items is reached
+    the least recently used entry is evicted. A ttl of 0 disables the cache.
+    """
+
+    def __init__(self, ttl: float, max_items: int):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value or None."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] > time.monotonic():
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'pid': os.getpid(),
+                'items': len(self._items),
+                'max_items': self.max_items,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+query_embeddings_cache = TTLCache(EMBEDDINGS_QUERY_CACHE_TTL, EMBEDDINGS_QUERY_CACHE_MAX_ITEMS)
+answers_cache = TTLCache(EMBEDDINGS_ANSWER_CACHE_TTL, EMBEDDINGS_ANSWER_CACHE_MAX_ITEMS)
+
+
+def get_query_cache_stats() -> dict:
+    """Return hit/miss counters of the question embeddings and answers caches of this worker."""
+    return {'query_embeddings': query_embeddings_cache.stats(), 'answers': answers_cache.stats()}
+
+
+def _normalize_question(question: str) -> str:
+    return ' '.join(question.split()).casefold()
+
+
+class QueryEmbeddingsCache(Embeddings):
+    """Embeddings wrapper that keeps question vectors in query_embeddings_cache."""
+
+    def __init__(self, embeddings_model: Embeddings, namespace: str):
+        self.embeddings_model = embeddings_model
+        self.namespace = namespace
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings_model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = (self.namespace, _normalize_question(text))
+        vector = query_embeddings_cache.get(key)
+        if vector is None:
+            vector = self.embeddings_model.embed_query(text)
+            query_embeddings_cache.set(key, vector)
+        return vector
+
+
+def _build_query_embeddings_model(model, api_key, api_url_base, hf_api_token, hf_model) -> QueryEmbeddingsCache:
+    return QueryEmbeddingsCache(
+        _build_embeddings_model(model, api_key, api_url_base, hf_api_token, hf_model),
+        f'{_get_embeddings_namespace(model, hf_api_token, hf_model)}:{api_url_base or ""}'
     )
-    docs = text_splitter.split_text(text=source_text)
+
+
+def _load_vector_store(storage_path, embeddings_model):
+    """
+    Load a vector store through the per-process cache.
+
+    The cached store is shared between requests, so each caller gets a shallow copy
+    bound to its own embeddings model (API keys may differ between requests).
+    """
+    cached_store = vector_store_cache.get(storage_path, lambda: _read_vector_store(storage_path, embeddings_model))
+    vector_store = copy.copy(cached_store)
+    vector_store.embedding_function = embeddings_model
+    return vector_store
+
+
+def _get_storage_path(file_uuid: str) -> str:
+    """Return the directory of an existing store, raising FileNotFoundError for unknown or invalid UUIDs."""
+    try:
+        file_uuid = str(uuid.UUID(str(file_uuid)))
+    except ValueError:
+        raise FileNotFoundError(f"Store with UUID '{file_uuid}' not found.")
+    storage_path = os.path.join(VECTOR_STORAGE_PATH, file_uuid)
+    if not os.path.exists(storage_path):
+        raise FileNotFoundError(f"Store with UUID '{file_uuid}' not found.")
+    return storage_path
+
+
+def _get_ready_storage_path(file_uuid: str) -> str:
+    """Same as _get_storage_path, but also checks that the store has been built."""
+    storage_path = _get_storage_path(file_uuid)
+    meta = _read_store_meta(storage_path)
+    status = meta.get('status', STORE_STATUS_READY)
+    if status == STORE_STATUS_ERROR:
+        raise RuntimeError(meta.get('error') or 'Failed to create vector store.')
+    if _is_store_job_lost(storage_path, meta):
+        raise RuntimeError(STORE_JOB_LOST_ERROR)
+    if status != STORE_STATUS_READY:
+        raise ValueError(f"Store with UUID '{file_uuid}' is not ready yet.")
+    return storage_path
+
+
+def _touch_store(storage_path: str):
+    """Record an access to the store for the garbage collector: one stat call, and a utime call once a minute."""
+    try:
+        now = time.time()
+        if now - os.stat(storage_path).st_mtime >= STORE_ACCESS_RESOLUTION:
+            os.utime(storage_path, (now, now))
+    except OSError as e:
+        logger.warning('Failed to update the last access time of %s: %s', storage_path, e)
+
+
+def _read_store_meta(storage_path: str) -> dict:
+    """Return store parameters saved at creation time (empty for stores created before they were saved)."""
+    try:
+        with open(os.path.join(storage_path, STORE_META_FILE_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _is_store_job_lost(storage_path: str, meta: dict) -> bool:
+    """
+    Whether the store is still pending or processing, but store.json was not updated for STALE_TEMP_DIR_AGE:
+    the job was lost with the worker process that ran it (jobs save their progress after every batch).
+    """
+    if meta.get('status') not in (STORE_STATUS_PENDING, STORE_STATUS_PROCESSING):
+        return False
     try:
-        embeddings_model = _build_embeddings_model(model, api_key, api_url_base, hf_api_token, hf_model)
-        vector_store = FAISS.from_texts(docs, embeddings_model)
-        vector_store.save_local(storage_path)
+        return time.time() - os.path.getmtime(os.path.join(storage_path, STORE_META_FILE_NAME)) > STALE_TEMP_DIR_AGE
+    except FileNotFoundError:
+        return False
+
+
+def _write_store_meta(storage_path: str, meta: dict):
+    os.makedirs(storage_path, exist_ok=True)
+    meta_path = os.path.join(storage_path, STORE_META_FILE_NAME)
+    temp_path = f'{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(temp_path, meta_path)
+
+
+def _save_vector_store(vector_store, storage_path: str, lexical_index: LexicalIndex = None):
+    """Save the store next to the existing files first, then replace them, so readers never see partial files."""
+    os.makedirs(storage_path, exist_ok=True)
+    temp_path = f'{storage_path}.{uuid.uuid4().hex}.tmp'
+    try:
+        vector_store.save_local(temp_path)
+        if lexical_index is not None:
+            lexical_index.save_local(temp_path)
+        # The mmap metadata (counts) goes last so it never describes data files that are not in place yet
+        with _store_files_lock(storage_path, exclusive=True):
+            for file_name in sorted(os.listdir(temp_path), key=lambda name: name == MmapVectorStore.META_FILE_NAME):
+                os.replace(os.path.join(temp_path, file_name), os.path.join(storage_path, file_name))
+    finally:
+        if os.path.isdir(temp_path):
+            for file_name in os.listdir(temp_path):
+                os.unlink(os.path.join(temp_path, file_name))
+            os.rmdir(temp_path)
+
+
+@contextmanager
+def _store_write_lock(storage_path: str):
+    """Exclusive lock on a store shared by all worker processes, held while the store is being modified."""
+    with open(os.path.join(storage_path, '.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def _store_files_lock(storage_path: str, exclusive: bool):
+    """
+    Lock on the store files, held exclusively while they are replaced and shared while they are loaded.
+
+    Unlike the write lock it is held for a moment, so stores are read during the whole update.
+    Loaded stores keep reading the files they opened (memory maps of the replaced files stay valid).
+    """
+    with open(os.path.join(storage_path, '.files.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def _embeddings_errors(message: str):
+    """Convert embeddings API errors into errors with messages that can be shown to the client."""
+    try:
+        yield
     except AuthenticationError as e:
         logger.exception(e)
         raise ValueError('Invalid API key or authentication error.') from e
@@ -63,27 +586,180 @@ def create_and_store_embeddings(source_text, model='text-embedding-3-large', api
         raise RuntimeError('OpenAI server error.') from e
     except Exception as e:
         logger.exception(e)
-        raise RuntimeError('Failed to create vector store.') from e
+        raise RuntimeError(message) from e
 
-    return file_id
 
+def _build_lexical_index(vector_store, meta: dict):
+    """Docs mode stores get a BM25 index of their chunks for hybrid retrieval."""
+    if meta.get('mode', 'docs') != 'docs':
+        return None
+    return LexicalIndex.build(_get_store_chunks(vector_store))
 
-def get_answer_with_embeddings(question, file_uuid, embedding_model='text-embedding-3-large', model='gpt-3.5-turbo',
-                               instructions='', api_key=None, api_url_base=None, hf_api_token=None,
-                               hf_model=DEFAULT_HF_MODEL):
-    storage_path = os.path.join(VECTOR_STORAGE_PATH, file_uuid)
 
-    if not os.path.exists(storage_path):
-        raise FileNotFoundError(f"Store with UUID '{file_uuid}' not found.")
+def _get_max_concurrency(model) -> int:
+    # In-process models already use all CPU cores for a batch, parallel batches would only compete for them
+    return 1 if is_local_embeddings_model(model) else EMBEDDINGS_MAX_CONCURRENCY
+
+
+def _get_store_embedding_model(storage_path: str, embedding_model: str) -> str:
+    """Stores built with an in-process model can only be queried with the same model."""
+    store_model = _read_store_meta(storage_path).get('embedding_model')
+    return store_model if is_local_embeddings_model(store_model) else embedding_model
+
+
+def _build_cached_embeddings_model(model, api_key, api_url_base, hf_api_token, hf_model) -> ChunkEmbeddingsCache:
+    return ChunkEmbeddingsCache(
+        _build_embeddings_model(model, api_key, api_url_base, hf_api_token, hf_model),
+        _get_embeddings_namespace(model, hf_api_token, hf_model)
+    )
 
-    embeddings_model = _build_embeddings_model(embedding_model, api_key, api_url_base, hf_api_token, hf_model)
 
-    vector_store = FAISS.load_local(
-        storage_path,
-        embeddings_model,
-        allow_dangerous_deserialization=True
+def _split_simple_text(source_text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> list[str]:
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len
     )
+    return text_splitter.split_text(text=source_text)
+
+
+def _split_source_text(source_text: str, mode: str, chunk_size: int, chunk_overlap: int) -> list[str]:
+    if mode == 'simple':
+        return _split_simple_text(source_text, chunk_size, chunk_overlap)
+    docs = _split_markdown_docs(source_text, chunk_size, chunk_overlap)
+    logger.info('Docs mode: %d chunks created from markdown source', len(docs))
+    return docs
+
 
+def _create_store(file_id: str, docs: list[str], meta: dict, model, api_key, api_url_base, hf_api_token, hf_model):
+    """Embed the chunks and save a new store, keeping its status and progress in store.json."""
+    storage_path = os.path.join(VECTOR_STORAGE_PATH, file_id)
+    meta = {
+        **meta,
+        'embedding_model': model,
+        'hf_model': hf_model if hf_api_token else None,
+        'status': STORE_STATUS_PROCESSING,
+        'chunks_total': len(docs),
+        'chunks_done': 0,
+    }
+    meta.setdefault('date_created', datetime.now(timezone.utc).isoformat())
+    _write_store_meta(storage_path, meta)
+
+    def progress_callback(done, total):
+        meta['chunks_done'] = done
+        _write_store_meta(storage_path, meta)
+
+    with _embeddings_errors('Failed to create vector store.'):
+        embeddings_model = _build_cached_embeddings_model(model, api_key, api_url_base, hf_api_token, hf_model)
+        vector_store = _build_vector_store(docs, embeddings_model, progress_callback=progress_callback,
+                                           max_concurrency=_get_max_concurrency(model),
+                                           storage_format=meta.get('storage_format') or VECTOR_STORE_FORMAT)
+        if isinstance(vector_store, FAISS):
+            meta['index_type'] = build_ann_index(vector_store)
+        _save_vector_store(vector_store, storage_path, _build_lexical_index(vector_store, meta))
+        logger.info('Embeddings cache: %d chunks reused, %d chunks embedded',
+                    embeddings_model.hits, embeddings_model.misses)
+
+    meta['status'] = STORE_STATUS_READY
+    _write_store_meta(storage_path, meta)
+
+
+def _create_store_or_cleanup(file_id: str, docs: list[str], meta: dict, *args):
+    try:
+        _create_store(file_id, docs, meta, *args)
+    except Exception:
+        shutil.rmtree(os.path.join(VECTOR_STORAGE_PATH, file_id), ignore_errors=True)
+        raise
+
+
+def _check_storage_format(storage_format: str = None) -> str:
+    storage_format = storage_format or VECTOR_STORE_FORMAT
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f'storage_format must be one of: {", ".join(STORAGE_FORMATS)}.')
+    return storage_format
+
+
+def create_and_store_embeddings(source_text, model='text-embedding-3-large', api_key=None,
+                                api_url_base=None, hf_api_token=None, hf_model=DEFAULT_HF_MODEL,
+                                storage_format=None):
+    file_id = str(uuid.uuid4())
+    docs = _split_simple_text(source_text)
+    meta = {'mode': 'simple', 'chunk_size': 1000, 'chunk_overlap': 200,
+            'storage_format': _check_storage_format(storage_format)}
+    _create_store_or_cleanup(file_id, docs, meta, model, api_key, api_url_base, hf_api_token, hf_model)
+
+    return file_id
+
+
+def _get_default_search_type(vector_store) -> str:
+    return 'hybrid' if getattr(vector_store, 'lexical_index', None) else 'mmr'
+
+
+def _rank_chunks(vector_store, question: str, embedding: list[float], k: int, fetch_k: int,
+                 search_type: str, with_scores: bool = True) -> list[dict]:
+    """
+    Select the k chunks for a question.
+
+    "similarity" takes the k nearest chunks, "mmr" chooses k of the fetch_k nearest by maximal
+    marginal relevance, "hybrid" fuses the MMR results with the k best BM25 matches of the
+    store lexical index by reciprocal rank fusion. With with_scores, every chunk has its distance
+    and rank among the fetch_k nearest chunks (None if it is not one of them) and its BM25 rank.
+    """
+    candidates = []
+    if with_scores or search_type == 'similarity':
+        candidates = vector_store.similarity_search_with_score_by_vector(embedding, k=fetch_k)
+    if search_type == 'similarity':
+        selected = [doc for doc, _ in candidates[:k]]
+    else:
+        selected = [doc for doc, _ in vector_store.max_marginal_relevance_search_with_score_by_vector(
+            embedding, k=k, fetch_k=fetch_k)]
+
+    lexical_ranks = {}
+    if search_type == 'hybrid':
+        lexical_ranks = {
+            chunk_id: rank
+            for rank, (chunk_id, _) in enumerate(vector_store.lexical_index.search(question, k=k), start=1)
+        }
+        scores = {doc.id: 1 / (RRF_K + rank) for rank, doc in enumerate(selected, start=1)}
+        for chunk_id, rank in lexical_ranks.items():
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1 / (RRF_K + rank)
+        documents = {doc.id: doc for doc in selected}
+        missing_ids = [chunk_id for chunk_id in lexical_ranks if chunk_id not in documents]
+        if missing_ids:
+            documents.update((doc.id, doc) for doc in vector_store.get_by_ids(missing_ids))
+        # sorted() is stable, so on equal scores vector results stay first
+        selected = [documents[chunk_id] for chunk_id in sorted(scores, key=scores.get, reverse=True)[:k]
+                    if chunk_id in documents]
+
+    similarity = {doc.id: (rank, float(score)) for rank, (doc, score) in enumerate(candidates, start=1)}
+    return [
+        {
+            'document': doc,
+            'score': similarity.get(doc.id, (None, None))[1],
+            'similarity_rank': similarity.get(doc.id, (None, None))[0],
+            'lexical_rank': lexical_ranks.get(doc.id),
+        }
+        for doc in selected
+    ]
+
+
+class StoreRetriever(BaseRetriever):
+    """Retriever of store_question: MMR search, fused with BM25 results for stores with a lexical index."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_store: object
+    k: int = 6
+    fetch_k: int = 20
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list[Document]:
+        embedding = self.vector_store.embedding_function.embed_query(query)
+        chunks = _rank_chunks(self.vector_store, query, embedding, self.k, self.fetch_k,
+                              _get_default_search_type(self.vector_store), with_scores=False)
+        return [chunk['document'] for chunk in chunks]
+
+
+def _build_answer_chain(model, instructions, api_key, api_url_base):
     llm = ChatOpenAI(model_name=model, temperature=0, openai_api_base=api_url_base, openai_api_key=api_key)
 
     prompt = ChatPromptTemplate.from_messages([
@@ -91,17 +767,106 @@ def get_answer_with_embeddings(question, file_uuid, embedding_model='text-embedd
         ('human', 'Context:\n{context}\n\nQuestion: {input}'),
     ]) if instructions else DEFAULT_PROMPT
 
-    question_answer_chain = create_stuff_documents_chain(llm, prompt)
-    retriever = vector_store.as_retriever(
-        search_type='mmr',
-        search_kwargs={'k': 6, 'fetch_k': 20},
-    )
+    return create_stuff_documents_chain(llm, prompt)
+
+
+def get_answer_with_embeddings(question, file_uuid, embedding_model='text-embedding-3-large', model='gpt-3.5-turbo',
+                               instructions='', api_key=None, api_url_base=None, hf_api_token=None,
+                               hf_model=DEFAULT_HF_MODEL):
+    storage_path = _get_ready_storage_path(file_uuid)
+    _touch_store(storage_path)
+
+    # The store files modification time is part of the key, so answers are invalidated when the store changes
+    answer_key = (storage_path, VectorStoreCache._stat_store(storage_path)[0], _normalize_question(question),
+                  instructions or '', model, embedding_model, api_url_base or '',
+                  hashlib.sha256((api_key or '').encode('utf-8')).hexdigest())
+    answer = answers_cache.get(answer_key)
+    if answer is not None:
+        return answer
+
+    embedding_model = _get_store_embedding_model(storage_path, embedding_model)
+    embeddings_model = _build_query_embeddings_model(embedding_model, api_key, api_url_base, hf_api_token, hf_model)
+
+    vector_store = _load_vector_store(storage_path, embeddings_model)
+
+    question_answer_chain = _build_answer_chain(model, instructions, api_key, api_url_base)
+    retriever = StoreRetriever(vector_store=vector_store, k=6, fetch_k=20)
     qa_chain = create_retrieval_chain(retriever, question_answer_chain)
     response = qa_chain.invoke({'input': question})
-    return response.get('answer')
+    answer = response.get('answer')
+    if answer:
+        answers_cache.set(answer_key, answer)
+    return answer
+
+
+def stream_answer_with_embeddings(question: str, chunks: list[str], model: str = 'gpt-3.5-turbo',
+                                  instructions: str = '', api_key: str = None, api_url_base: str = None):
+    """
+    Yield the answer in pieces as the LLM generates it.
+
+    chunks are the texts of the context chunks, as returned by search_store, so the caller
+    can send the retrieval results to the client before the first token is generated.
+    """
+    question_answer_chain = _build_answer_chain(model, instructions, api_key, api_url_base)
+    documents = [Document(page_content=chunk) for chunk in chunks]
+    yield from question_answer_chain.stream({'context': documents, 'input': question})
+
+
+def search_store(question: str, file_uuid: str, embedding_model: str = 'text-embedding-3-large',
+                 k: int = 6, fetch_k: int = 20, search_type: str = None, api_key: str = None,
+                 api_url_base: str = None, hf_api_token: str = None, hf_model: str = DEFAULT_HF_MODEL) -> dict:
+    """
+    Retrieval only: return the chunks get_answer_with_embeddings would pass to the LLM, without calling it.
+
+    The question is embedded once and the fetch_k nearest chunks are ranked by distance (squared L2,
+    lower is closer). With search_type "mmr" the k results are chosen from them by maximal marginal
+    relevance, with "similarity" they are simply the k nearest, with "hybrid" (docs mode stores)
+    the MMR results are fused with BM25 matches. By default the same type as store_question is used.
+    Each chunk has its ranks among the nearest candidates and the BM25 matches, so clients can see
+    what MMR and fusion changed. Timings are in milliseconds.
+    """
+    if search_type is not None and search_type not in SEARCH_TYPES:
+        raise ValueError('search_type must be "mmr", "similarity" or "hybrid".')
+    if k < 1 or fetch_k < 1:
+        raise ValueError('k and fetch_k must be positive.')
+    fetch_k = max(fetch_k, k)
+
+    started = time.perf_counter()
+    storage_path = _get_ready_storage_path(file_uuid)
+    _touch_store(storage_path)
+    embedding_model = _get_store_embedding_model(storage_path, embedding_model)
+    embeddings_model = _build_query_embeddings_model(embedding_model, api_key, api_url_base, hf_api_token, hf_model)
+    vector_store = _load_vector_store(storage_path, embeddings_model)
+    if search_type is None:
+        search_type = _get_default_search_type(vector_store)
+    elif search_type == 'hybrid' and not getattr(vector_store, 'lexical_index', None):
+        raise ValueError('Hybrid search is available for docs mode stores only.')
+    loaded = time.perf_counter()
+
+    with _embeddings_errors('Failed to embed the question.'):
+        embedding = embeddings_model.embed_query(question)
+    embedded = time.perf_counter()
+
+    chunks = [
+        {'content': chunk.pop('document').page_content, **chunk}
+        for chunk in _rank_chunks(vector_store, question, embedding, k, fetch_k, search_type)
+    ]
+    searched = time.perf_counter()
+
+    return {
+        'search_type': search_type,
+        'chunks': chunks,
+        'timing': {
+            'load_ms': round((loaded - started) * 1000, 2),
+            'embedding_ms': round((embedded - loaded) * 1000, 2),
+            'search_ms': round((searched - embedded) * 1000, 2),
+            'total_ms': round((searched - started) * 1000, 2),
+        },
+    }
 
 
 _CODE_BLOCK_RE = re.compile(
+    r'(?=[`|])'               # cheap first character check before trying the alternatives
     r'(```[\s\S]*?```'        # fenced code blocks
     r'|`[^`\n]+`'             # inline code
     r'|(?:^\|.+\|[ \t]*\n)+'  # consecutive markdown table rows
@@ -113,46 +878,54 @@ _CODE_BLOCK_RE = re.compile(
 def _split_preserving_code_blocks(text: str, chunk_size: int, chunk_overlap: int,
                                    splitter: RecursiveCharacterTextSplitter) -> list[str]:
     """Split text into chunks without ever breaking code blocks."""
-    if len(text) <= chunk_size or not _CODE_BLOCK_RE.search(text):
+    if len(text) <= chunk_size:
+        return splitter.split_text(text)
+    matches = _CODE_BLOCK_RE.finditer(text)
+    first_match = next(matches, None)
+    if first_match is None:
         return splitter.split_text(text)
-
-    # Tokenise: alternate between prose segments and code blocks
-    tokens = _CODE_BLOCK_RE.split(text)   # [prose, code, prose, code, ...]
-    code_blocks = _CODE_BLOCK_RE.findall(text)
 
     result: list[str] = []
-    buffer = ''
+    buffer: list[str] = []
+    buffer_size = 0
+    buffer_has_text = False
 
-    for i, prose in enumerate(tokens):
-        if len(buffer) + len(prose) <= chunk_size:
-            buffer += prose
-        else:
-            if buffer.strip():
-                result.extend(splitter.split_text(buffer))
-            buffer = prose
-
-        if i < len(code_blocks):
-            code = code_blocks[i]
-            if len(buffer) + len(code) <= chunk_size * 1.5:
-                buffer += code
+    def flush():
+        if buffer_has_text:
+            result.extend(splitter.split_text(''.join(buffer)))
+
+    # Prose segments alternate with code blocks: [prose, code, prose, code, ..., prose]
+    position = 0
+    for match in itertools.chain((first_match,), matches):
+        for segment, is_code in ((text[position:match.start()], False), (match.group(0), True)):
+            limit = chunk_size * 1.5 if is_code else chunk_size
+            if buffer_size + len(segment) <= limit:
+                buffer.append(segment)
+                buffer_size += len(segment)
+                buffer_has_text = buffer_has_text or not segment.isspace() and bool(segment)
+            elif is_code:
+                flush()
+                result.append(segment)   # code block becomes its own chunk even if large
+                buffer, buffer_size, buffer_has_text = [], 0, False
             else:
-                if buffer.strip():
-                    result.extend(splitter.split_text(buffer))
-                result.append(code)   # code block becomes its own chunk even if large
-                buffer = ''
+                flush()
+                buffer, buffer_size = [segment], len(segment)
+                buffer_has_text = not segment.isspace() and bool(segment)
+        position = match.end()
 
-    if buffer.strip():
-        result.extend(splitter.split_text(buffer))
+    segment = text[position:]
+    if buffer_size + len(segment) <= chunk_size:
+        buffer.append(segment)
+        buffer_has_text = buffer_has_text or not segment.isspace() and bool(segment)
+    else:
+        flush()
+        buffer = [segment]
+        buffer_has_text = not segment.isspace() and bool(segment)
+    flush()
 
     return result or [text]
 
 
-def _get_parent_breadcrumb(metadata: dict) -> str:
-    """Return the breadcrumb of the parent header (all levels except the deepest)."""
-    parts = [metadata[k] for k in ('h1', 'h2', 'h3', 'h4') if metadata.get(k)]
-    return ' > '.join(parts[:-1]) if len(parts) > 1 else ''
-
-
 def _build_summary_chunk(source_text: str) -> str:
     """Build a document overview chunk from h1/h2/h3 headings."""
     heading_re = re.compile(r'^(#{1,3})\s+(.+)$', re.MULTILINE)
@@ -166,6 +939,94 @@ def _build_summary_chunk(source_text: str) -> str:
     return '[Document Overview]\n\n' + '\n'.join(lines)
 
 
+_MARKDOWN_HEADER_LEVELS = 4  # headers from # to #### start new sections
+
+
+def _iter_markdown_sections(source_text: str):
+    """
+    Yield (headers, content) of the sections of a Markdown document in one pass over its lines.
+
+    headers is a tuple of the h1..h4 titles the section is under (None for missing levels).
+    Output is the same as MarkdownHeaderTextSplitter(strip_headers=False) with # - ####:
+    lines are stripped, paragraphs of a section are joined with "  \n", a header line
+    followed directly by a deeper header is kept in the deeper section, and lines
+    inside fenced code blocks are never treated as headers.
+    """
+    headers = [None] * _MARKDOWN_HEADER_LEVELS
+    current_headers = tuple(headers)
+    lines: list[str] = []
+    in_code_block = False
+    opening_fence = ''
+
+    section_headers = None
+    section_depth = 0
+    section_parts: list[str] = []
+    section_last_line = ''
+
+    def add_paragraph(content_lines: list[str], paragraph_headers: tuple):
+        """Add a paragraph to the current section, return the finished section if a new one starts."""
+        nonlocal section_headers, section_depth, section_parts, section_last_line
+        depth = _MARKDOWN_HEADER_LEVELS - paragraph_headers.count(None)
+        finished = None
+        if section_headers is not None and (
+            section_headers == paragraph_headers
+            or (section_depth < depth and section_last_line[:1] == '#')
+        ):
+            section_parts.append('\n'.join(content_lines))
+        else:
+            if section_headers is not None:
+                finished = (section_headers, '  \n'.join(section_parts))
+            section_parts = ['\n'.join(content_lines)]
+        section_headers, section_depth = paragraph_headers, depth
+        section_last_line = content_lines[-1]
+        return finished
+
+    for line in source_text.split('\n'):
+        stripped_line = line.strip()
+        if not stripped_line.isprintable():
+            stripped_line = ''.join(filter(str.isprintable, stripped_line))
+
+        if not in_code_block:
+            if stripped_line.startswith('```') and stripped_line.count('```') == 1:
+                in_code_block = True
+                opening_fence = '```'
+            elif stripped_line.startswith('~~~'):
+                in_code_block = True
+                opening_fence = '~~~'
+        elif stripped_line.startswith(opening_fence):
+            in_code_block = False
+            opening_fence = ''
+
+        if in_code_block:
+            lines.append(stripped_line)
+            continue
+
+        level = len(stripped_line) - len(stripped_line.lstrip('#')) if stripped_line[:1] == '#' else 0
+        if 0 < level <= _MARKDOWN_HEADER_LEVELS and (len(stripped_line) == level or stripped_line[level] == ' '):
+            headers[level - 1:] = [stripped_line[level:].strip()] + [None] * (_MARKDOWN_HEADER_LEVELS - level)
+            if lines:
+                finished = add_paragraph(lines, current_headers)
+                if finished:
+                    yield finished
+                lines = []
+            lines.append(stripped_line)
+            current_headers = tuple(headers)
+        elif stripped_line:
+            lines.append(stripped_line)
+        elif lines:
+            finished = add_paragraph(lines, current_headers)
+            if finished:
+                yield finished
+            lines = []
+
+    if lines:
+        finished = add_paragraph(lines, current_headers)
+        if finished:
+            yield finished
+    if section_headers is not None:
+        yield section_headers, '  \n'.join(section_parts)
+
+
 def _split_markdown_docs(source_text: str, chunk_size: int = 2000,
                          chunk_overlap: int = 200) -> list[str]:
     """
@@ -177,46 +1038,15 @@ def _split_markdown_docs(source_text: str, chunk_size: int = 2000,
     4. Oversized sections are split by paragraphs/lines while protecting code blocks.
     5. The breadcrumb is prepended to every chunk so the LLM always knows the context.
     6. A summary/index chunk is generated from h1/h2/h3 headings.
+
+    Sections are produced, merged and split in a single pass over the document.
     """
-    headers_to_split_on = [
-        ('#', 'h1'),
-        ('##', 'h2'),
-        ('###', 'h3'),
-        ('####', 'h4'),
-    ]
-    md_splitter = MarkdownHeaderTextSplitter(
-        headers_to_split_on=headers_to_split_on,
-        strip_headers=False,
-    )
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
         separators=['\n\n', '\n', ' '],
     )
 
-    header_docs = md_splitter.split_text(source_text)
-
-    # --- Merge small sibling sections ---
-    merged_docs = []
-    i = 0
-    while i < len(header_docs):
-        doc = header_docs[i]
-        content = doc.page_content.strip()
-        metadata = dict(doc.metadata)
-        parent = _get_parent_breadcrumb(metadata)
-
-        # Try merging with following siblings that share the same parent
-        while (i + 1 < len(header_docs)
-               and _get_parent_breadcrumb(header_docs[i + 1].metadata) == parent
-               and parent  # only merge if there IS a parent (not top-level)
-               and len(content) + len(header_docs[i + 1].page_content) + 2 < chunk_size):
-            i += 1
-            content = content + '\n\n' + header_docs[i].page_content.strip()
-
-        merged_docs.append((metadata, content))
-        i += 1
-
-    # --- Build final chunks ---
     final_chunks: list[str] = []
 
     # Summary chunk
@@ -224,32 +1054,47 @@ def _split_markdown_docs(source_text: str, chunk_size: int = 2000,
     if summary:
         final_chunks.append(summary)
 
-    for metadata, content in merged_docs:
+    def add_chunks(breadcrumb_parts: list[str], content_parts: list[str]):
+        content = '\n\n'.join(content_parts)
         if not content:
-            continue
-
-        breadcrumb_parts = [
-            metadata[k]
-            for k in ('h1', 'h2', 'h3', 'h4')
-            if metadata.get(k)
-        ]
+            return
         breadcrumb = ' > '.join(breadcrumb_parts)
         prefix = f'[{breadcrumb}]\n\n' if breadcrumb else ''
-
         if len(prefix) + len(content) <= chunk_size:
             final_chunks.append(prefix + content)
         else:
-            sub_chunks = _split_preserving_code_blocks(content, chunk_size, chunk_overlap, text_splitter)
-            for chunk in sub_chunks:
+            for chunk in _split_preserving_code_blocks(content, chunk_size, chunk_overlap, text_splitter):
                 final_chunks.append(prefix + chunk)
 
+    # Small sibling sections (same non-empty parent breadcrumb) are merged into the first one
+    breadcrumb_parts = None
+    parent = ''
+    content_parts: list[str] = []
+    content_size = 0
+    for headers, content in _iter_markdown_sections(source_text):
+        section_breadcrumb = [title for title in headers if title]
+        section_parent = ' > '.join(section_breadcrumb[:-1]) if len(section_breadcrumb) > 1 else ''
+        if parent and section_parent == parent and content_size + len(content) + 2 < chunk_size:
+            content = content.strip()
+            content_parts.append(content)
+            content_size += len(content) + 2
+            continue
+        if breadcrumb_parts is not None:
+            add_chunks(breadcrumb_parts, content_parts)
+        content = content.strip()
+        breadcrumb_parts, parent = section_breadcrumb, section_parent
+        content_parts, content_size = [content], len(content)
+
+    if breadcrumb_parts is not None:
+        add_chunks(breadcrumb_parts, content_parts)
+
     return final_chunks
 
 
 def create_docs_embeddings(source_text: str, model: str = 'text-embedding-3-large',
                            api_key: str = None, api_url_base: str = None,
                            hf_api_token: str = None, hf_model: str = DEFAULT_HF_MODEL,
-                           chunk_size: int = 2000, chunk_overlap: int = 200) -> str:
+                           chunk_size: int = 2000, chunk_overlap: int = 200, storage_format: str = None) -> str:
     """
     Docs mode: creates a vector store optimised for Markdown documentation.
 
@@ -262,31 +1107,251 @@ def create_docs_embeddings(source_text: str, model: str = 'text-embedding-3-larg
     Returns the UUID of the saved vector store.
     """
     file_id = str(uuid.uuid4())
-    storage_path = os.path.join(VECTOR_STORAGE_PATH, file_id)
+    docs = _split_source_text(source_text, 'docs', chunk_size, chunk_overlap)
+    meta = {'mode': 'docs', 'chunk_size': chunk_size, 'chunk_overlap': chunk_overlap,
+            'storage_format': _check_storage_format(storage_format)}
+    _create_store_or_cleanup(file_id, docs, meta, model, api_key, api_url_base, hf_api_token, hf_model)
 
-    docs = _split_markdown_docs(source_text, chunk_size, chunk_overlap)
-    logger.info('Docs mode: %d chunks created from markdown source', len(docs))
+    return file_id
+
+
+def update_store_embeddings(file_uuid: str, source_text: str, model: str = None,
+                            api_key: str = None, api_url_base: str = None,
+                            hf_api_token: str = None, hf_model: str = None) -> dict:
+    """
+    Replace the content of an existing vector store, keeping its UUID.
+
+    The new text is split with the same mode and chunk sizes the store was created with,
+    then diffed against the chunks already in the store: vectors of removed chunks are
+    deleted and only new or changed chunks are embedded, so the cost is proportional
+    to the size of the change.
+
+    Returns the numbers of added, removed and unchanged chunks.
+    """
+    storage_path = _get_ready_storage_path(file_uuid)
+    meta = _read_store_meta(storage_path)
+    mode = meta.get('mode', 'docs')
+    model = model or meta.get('embedding_model') or 'text-embedding-3-large'
+    model = _get_store_embedding_model(storage_path, model)
+    hf_model = hf_model or meta.get('hf_model') or DEFAULT_HF_MODEL
+
+    default_chunk_size, default_chunk_overlap = (1000, 200) if mode == 'simple' else (1500, 150)
+    docs = _split_source_text(source_text, mode, meta.get('chunk_size', default_chunk_size),
+                              meta.get('chunk_overlap', default_chunk_overlap))
 
+    with _embeddings_errors('Failed to update vector store.'), _store_write_lock(storage_path):
+        embeddings_model = _build_cached_embeddings_model(model, api_key, api_url_base, hf_api_token, hf_model)
+        vector_store = _read_vector_store(storage_path, embeddings_model)
+
+        # Multiset diff: every stored chunk is kept at most as many times as it occurs in the new text
+        wanted = Counter(docs)
+        removed_ids = []
+        for doc_id, content in _get_store_chunks(vector_store):
+            if wanted[content] > 0:
+                wanted[content] -= 1
+            else:
+                removed_ids.append(doc_id)
+        new_docs = []
+        for doc in docs:
+            if wanted[doc] > 0:
+                wanted[doc] -= 1
+                new_docs.append(doc)
+
+        # Approximate indexes are rebuilt: HNSW cannot delete vectors, IVF lists would drift from the new data
+        is_faiss = isinstance(vector_store, FAISS)
+        if is_faiss:
+            restore_flat_index(vector_store, embeddings_model)
+        if removed_ids:
+            vector_store.delete(removed_ids)
+        vector_store = _build_vector_store(new_docs, embeddings_model, max_concurrency=_get_max_concurrency(model),
+                                           vector_store=vector_store)
+        if is_faiss:
+            meta['index_type'] = build_ann_index(vector_store)
+        _save_vector_store(vector_store, storage_path, _build_lexical_index(vector_store, meta))
+        meta.update({
+            'mode': mode,
+            'embedding_model': model,
+            'chunks_total': len(docs),
+            'chunks_done': len(docs),
+            'date_updated': datetime.now(timezone.utc).isoformat(),
+        })
+        _write_store_meta(storage_path, meta)
+
+    result = {
+        'chunks_total': len(docs),
+        'chunks_added': len(new_docs),
+        'chunks_removed': len(removed_ids),
+        'chunks_unchanged': len(docs) - len(new_docs),
+    }
+    logger.info('Store %s updated: %s', file_uuid, result)
+    return result
+
+
+_store_jobs_executor = ThreadPoolExecutor(max_workers=EMBEDDINGS_JOB_WORKERS, thread_name_prefix='store-job')
+
+
+def _run_store_job(file_id: str, source_text: str, meta: dict, *args):
+    storage_path = os.path.join(VECTOR_STORAGE_PATH, file_id)
     try:
-        embeddings_model = _build_embeddings_model(model, api_key, api_url_base, hf_api_token, hf_model)
-        vector_store = FAISS.from_texts(docs, embeddings_model)
-        vector_store.save_local(storage_path)
-    except AuthenticationError as e:
-        logger.exception(e)
-        raise ValueError('Invalid API key or authentication error.') from e
-    except RateLimitError as e:
-        logger.exception(e)
-        raise RuntimeError('API rate limit exceeded, please try again later') from e
-    except APIError as e:
-        logger.exception(e)
-        raise RuntimeError('OpenAI server error.') from e
+        docs = _split_source_text(source_text, meta['mode'], meta['chunk_size'], meta['chunk_overlap'])
+        _create_store(file_id, docs, meta, *args)
     except Exception as e:
         logger.exception(e)
-        raise RuntimeError('Failed to create vector store.') from e
+        meta = _read_store_meta(storage_path)
+        meta.update({'status': STORE_STATUS_ERROR, 'error': str(e)})
+        _write_store_meta(storage_path, meta)
 
+
+def create_store_job(source_text: str, mode: str = 'docs', model: str = 'text-embedding-3-large',
+                     api_key: str = None, api_url_base: str = None,
+                     hf_api_token: str = None, hf_model: str = DEFAULT_HF_MODEL,
+                     chunk_size: int = 2000, chunk_overlap: int = 200, storage_format: str = None) -> str:
+    """
+    Start building a vector store in a background thread and return its UUID right away.
+
+    The store has the "pending" status until a job worker picks it up, then "processing"
+    with chunks_done/chunks_total progress, and finally "ready" or "error" (see get_store_status).
+    Jobs run in the worker process that accepted the request and are lost if it is restarted,
+    the status of their stores becomes "error" once they are not updated for STALE_TEMP_DIR_AGE.
+    """
+    if mode == 'simple':
+        chunk_size, chunk_overlap = 1000, 200
+    file_id = str(uuid.uuid4())
+    meta = {
+        'mode': mode,
+        'chunk_size': chunk_size,
+        'chunk_overlap': chunk_overlap,
+        'storage_format': _check_storage_format(storage_format),
+        'embedding_model': model,
+        'status': STORE_STATUS_PENDING,
+        'chunks_total': 0,
+        'chunks_done': 0,
+        'date_created': datetime.now(timezone.utc).isoformat(),
+    }
+    _write_store_meta(os.path.join(VECTOR_STORAGE_PATH, file_id), meta)
+    _store_jobs_executor.submit(_run_store_job, file_id, source_text, meta,
+                                model, api_key, api_url_base, hf_api_token, hf_model)
     return file_id
 
 
+def get_store_status(file_uuid: str) -> dict:
+    """Return the build status and progress of a store."""
+    storage_path = _get_storage_path(file_uuid)
+    meta = _read_store_meta(storage_path)
+    if _is_store_job_lost(storage_path, meta):
+        meta = {**meta, 'status': STORE_STATUS_ERROR, 'error': STORE_JOB_LOST_ERROR}
+    status = {
+        'status': meta.get('status', STORE_STATUS_READY),
+        'chunks_done': meta.get('chunks_done'),
+        'chunks_total': meta.get('chunks_total'),
+    }
+    if meta.get('error'):
+        status['detail'] = meta['error']
+    return status
+
+
+def _list_stores() -> list[dict]:
+    """Return the stores under VECTOR_STORAGE_PATH with their size and last access time (Unix time)."""
+    stores = []
+    with os.scandir(VECTOR_STORAGE_PATH) as entries:
+        for entry in entries:
+            if not entry.is_dir() or entry.name.endswith('.tmp'):
+                continue
+            try:
+                # Store files are written to temporary names and renamed, which updates the directory mtime too
+                last_access = entry.stat().st_mtime
+                size = VectorStoreCache._stat_store(entry.path)[1]
+            except FileNotFoundError:
+                continue  # deleted meanwhile
+            stores.append({'uuid': entry.name, 'path': entry.path, 'bytes': size, 'last_access': last_access})
+    return stores
+
+
+def get_storage_stats(largest: int = 10) -> dict:
+    """Return the number and total size of the stores on disk, and the largest of them."""
+    stores = _list_stores()
+    return {
+        'stores': len(stores),
+        'total_bytes': sum(store['bytes'] for store in stores),
+        'max_bytes': VECTOR_STORAGE_MAX_BYTES,
+        'largest': [
+            {
+                'uuid': store['uuid'],
+                'bytes': store['bytes'],
+                'last_access': datetime.fromtimestamp(store['last_access'], timezone.utc).isoformat(),
+            }
+            for store in sorted(stores, key=lambda store: store['bytes'], reverse=True)[:largest]
+        ],
+    }
+
+
+def _delete_store(storage_path: str) -> bool:
+    """
+    Delete a store unless it is being modified (its write lock is held).
+
+    The directory is renamed first, so requests see either the whole store or no store.
+    """
+    try:
+        lock_file = open(os.path.join(storage_path, '.lock'), 'a')
+    except FileNotFoundError:
+        return False
+    with lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        # Stores being built write their progress regularly, the ones left unfinished by a restart do not
+        if (_read_store_meta(storage_path).get('status') in (STORE_STATUS_PENDING, STORE_STATUS_PROCESSING)
+                and time.time() - VectorStoreCache._stat_store(storage_path)[0] < STALE_TEMP_DIR_AGE):
+            return False
+        deleted_path = f'{storage_path}.{uuid.uuid4().hex}.tmp'
+        os.rename(storage_path, deleted_path)
+    shutil.rmtree(deleted_path, ignore_errors=True)
+    vector_store_cache.invalidate(storage_path)
+    return True
+
+
+def collect_garbage(max_age_days: int = 0, max_store_bytes: int = 0, max_total_bytes: int = 0,
+                    dry_run: bool = False) -> dict:
+    """
+    Delete stores not accessed for max_age_days, stores larger than max_store_bytes, and then
+    the least recently used stores until the total size is within max_total_bytes (0 - no limit).
+
+    Stores being built or updated are skipped. Leftover temporary directories of interrupted
+    saves and deletions are removed as well. Returns the deleted stores and the remaining total size.
+    """
+    now = time.time()
+    stores = sorted(_list_stores(), key=lambda store: store['last_access'])
+    total_bytes = sum(store['bytes'] for store in stores)
+    deleted = []
+
+    for store in stores:
+        if max_age_days and now - store['last_access'] > max_age_days * 86400:
+            reason = 'age'
+        elif max_store_bytes and store['bytes'] > max_store_bytes:
+            reason = 'size'
+        elif max_total_bytes and total_bytes > max_total_bytes:
+            reason = 'quota'
+        else:
+            continue
+        if dry_run or _delete_store(store['path']):
+            total_bytes -= store['bytes']
+            deleted.append({'uuid': store['uuid'], 'bytes': store['bytes'], 'reason': reason})
+
+    if not dry_run:
+        with os.scandir(VECTOR_STORAGE_PATH) as entries:
+            for entry in entries:
+                try:
+                    is_stale = entry.name.endswith('.tmp') and now - entry.stat().st_mtime > STALE_TEMP_DIR_AGE
+                except FileNotFoundError:
+                    continue
+                if is_stale:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+
+    logger.info('Vector stores garbage collection: %d stores deleted, %d bytes left', len(deleted), total_bytes)
+    return {'deleted': deleted, 'total_bytes': total_bytes}
+
+
 if __name__ == '__main__':
     knowledge_base_text = """
     История компании "ТехноСферы".
@@ -0,0 +1,123 @@
+import math
+
+import faiss
+import numpy as np
+
+from app.settings import FAISS_INDEX_TYPE, FAISS_NPROBE, FAISS_EF_SEARCH
+
+INDEX_TYPES = ('flat', 'hnsw', 'ivf', 'ivfpq')
+
+# Index type chosen in the "auto" mode: the first one whose chunk count limit is not reached
+AUTO_INDEX_TYPES = (
+    (20_000, 'flat'),      # exact search is fast enough
+    (200_000, 'hnsw'),     # graph index: best recall/latency, memory of the flat index plus the graph
+    (1_000_000, 'ivf'),    # inverted lists: less memory than HNSW, nprobe trades recall for speed
+    (None, 'ivfpq'),       # product quantised vectors: a few dozen bytes per chunk instead of 4 per dimension
+)
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+IVF_TRAINING_POINTS_PER_LIST = 64
+PQ_BITS = 8
+PQ_TRAINING_POINTS_PER_CENTROID = 39  # the minimum FAISS k-means accepts without a warning
+
+
+def choose_index_type(count: int, index_type: str = None) -> str:
+    index_type = index_type or FAISS_INDEX_TYPE
+    if index_type != 'auto':
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f'FAISS index type must be "auto" or one of: {", ".join(INDEX_TYPES)}.')
+        return index_type
+    for max_count, auto_type in AUTO_INDEX_TYPES:
+        if max_count is None or count < max_count:
+            return auto_type
+
+
+def get_index_type(index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(index, faiss.IndexIVFPQ):
+        return 'ivfpq'
+    if isinstance(index, faiss.IndexIVF):
+        return 'ivf'
+    return 'flat'
+
+
+def _get_pq_subquantizers(dimensions: int) -> int:
+    """Largest number of sub-vectors (at most 64) that divides the dimensions."""
+    for m in range(min(64, dimensions), 0, -1):
+        if dimensions % m == 0:
+            return m
+    return 1
+
+
+def create_index(vectors: np.ndarray, index_type: str):
+    """Build a FAISS index of the given type (L2 metric) containing the vectors in their order."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dimensions = vectors.shape
+    if index_type == 'ivfpq' and count < 2 ** PQ_BITS * PQ_TRAINING_POINTS_PER_CENTROID:
+        index_type = 'ivf'  # too few vectors to train the quantiser codebooks
+    if index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimensions, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif index_type in ('ivf', 'ivfpq'):
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // IVF_TRAINING_POINTS_PER_LIST))
+        quantizer = faiss.IndexFlatL2(dimensions)
+        if index_type == 'ivf':
+            index = faiss.IndexIVFFlat(quantizer, dimensions, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dimensions, nlist, _get_pq_subquantizers(dimensions), PQ_BITS)
+        sample_size = min(count, max(nlist * IVF_TRAINING_POINTS_PER_LIST,
+                                     2 ** PQ_BITS * PQ_TRAINING_POINTS_PER_CENTROID))
+        sample = vectors[np.random.default_rng(0).choice(count, sample_size, replace=False)]
+        index.train(sample)
+    else:
+        index = faiss.IndexFlatL2(dimensions)
+    index.add(vectors)
+    tune_index(index)
+    return index
+
+
+def tune_index(index, nprobe: int = None, ef_search: int = None):
+    """Set the search parameters of an approximate index (no-op for the flat index)."""
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(nprobe or FAISS_NPROBE, index.nlist)
+        # MMR search reconstructs the candidate vectors by id
+        index.make_direct_map()
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search or FAISS_EF_SEARCH
+    return index
+
+
+def build_ann_index(vector_store, index_type: str = None) -> str:
+    """
+    Replace the flat index of a LangChain FAISS store with the index type chosen for its size.
+
+    Vectors keep their positions, so the store docstore mapping stays valid. Returns the index type.
+    """
+    index = vector_store.index
+    index_type = choose_index_type(index.ntotal, index_type)
+    if index_type != get_index_type(index) and index.ntotal:
+        vector_store.index = create_index(index.reconstruct_n(0, index.ntotal), index_type)
+    return get_index_type(vector_store.index)
+
+
+def restore_flat_index(vector_store, embeddings_model):
+    """
+    Replace an approximate index with the exact flat one, so chunks can be deleted and added.
+
+    Product quantised vectors cannot be restored exactly, they are embedded again
+    (embeddings_model is expected to serve them from the chunk embeddings cache).
+    """
+    index = vector_store.index
+    if get_index_type(index) == 'flat':
+        return
+    if isinstance(index, faiss.IndexIVFPQ):
+        texts = [vector_store.docstore.search(vector_store.index_to_docstore_id[i]).page_content
+                 for i in range(index.ntotal)]
+        vectors = np.asarray(embeddings_model.embed_documents(texts), dtype=np.float32).reshape(-1, index.d)
+    else:
+        if isinstance(index, faiss.IndexIVF):
+            index.make_direct_map()
+        vectors = index.reconstruct_n(0, index.ntotal)
+    vector_store.index = create_index(vectors, 'flat')
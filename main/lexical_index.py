@@ -0,0 +1,122 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+# Words, plus dotted / dashed / slashed identifiers kept whole (e.g. "os.path.join", "x-api-key")
+_TOKEN_RE = re.compile(r'\w+(?:[.\-:/]\w+)*', re.UNICODE)
+_PART_RE = re.compile(r'[.\-:/]')
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased words; compound identifiers produce the whole identifier and each of its parts."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.casefold()):
+        tokens.append(token)
+        if _PART_RE.search(token):
+            tokens.extend(part for part in _PART_RE.split(token) if part)
+    return tokens
+
+
+# Approximate memory taken by the Python objects of the index: a posting is two ints in lists
+# (and their numpy copy once the term is searched), a term its string, dict entry and lists
+POSTING_BYTES = 2 * (8 + 28) + 12
+TERM_BYTES = 300
+ID_BYTES = 60
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the chunks of a vector store.
+
+    Chunks are referenced by the ids they have in the vector store, so search results
+    can be fetched from it. Saved as JSON next to the vector store files.
+    """
+
+    FILE_NAME = 'lexical.json'
+
+    def __init__(self, ids: list[str], doc_lengths: list[int], postings: dict[str, list[list[int]]],
+                 k1: float = 1.5, b: float = 0.75):
+        self.ids = ids
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self.postings = postings  # term -> [[chunk index, ...], [term frequency, ...]]
+        self.k1 = k1
+        self.b = b
+        average_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+        self._norms = k1 * (1 - b + b * self.doc_lengths / max(average_length, 1.0))
+        self._arrays = {}
+        postings_count = sum(len(term_postings[0]) for term_postings in postings.values())
+        self.memory_bytes = (postings_count * POSTING_BYTES + len(postings) * TERM_BYTES
+                             + len(ids) * ID_BYTES + self.doc_lengths.nbytes + self._norms.nbytes)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, chunks) -> 'LexicalIndex':
+        """Build the index from (id, text) pairs."""
+        ids = []
+        doc_lengths = []
+        postings = {}
+        for index, (chunk_id, text) in enumerate(chunks):
+            tokens = tokenize(text)
+            ids.append(chunk_id)
+            doc_lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                term_postings = postings.setdefault(term, [[], []])
+                term_postings[0].append(index)
+                term_postings[1].append(frequency)
+        return cls(ids, doc_lengths, postings)
+
+    def save_local(self, folder_path: str):
+        data = {
+            'k1': self.k1,
+            'b': self.b,
+            'ids': self.ids,
+            'doc_lengths': self.doc_lengths.astype(int).tolist(),
+            'postings': self.postings,
+        }
+        with open(os.path.join(folder_path, self.FILE_NAME), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load_local(cls, folder_path: str):
+        """Return the saved index or None if the store has none."""
+        try:
+            with open(os.path.join(folder_path, cls.FILE_NAME), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        return cls(data['ids'], data['doc_lengths'], data['postings'], data['k1'], data['b'])
+
+    def _get_arrays(self, term: str):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            indices, frequencies = self.postings[term]
+            arrays = (np.asarray(indices, dtype=np.int64), np.asarray(frequencies, dtype=np.float32))
+            self._arrays[term] = arrays
+        return arrays
+
+    def search(self, query: str, k: int = 20) -> list[tuple[str, float]]:
+        """Return up to k (chunk id, BM25 score) pairs, best first."""
+        count = len(self.ids)
+        terms = [term for term in set(tokenize(query)) if term in self.postings]
+        if not count or not terms:
+            return []
+
+        scores = np.zeros(count, dtype=np.float32)
+        for term in terms:
+            indices, frequencies = self._get_arrays(term)
+            idf = math.log(1 + (count - len(indices) + 0.5) / (len(indices) + 0.5))
+            scores[indices] += idf * frequencies * (self.k1 + 1) / (frequencies + self._norms[indices])
+
+        matched = np.flatnonzero(scores)
+        k = min(k, len(matched))
+        if k <= 0:
+            return []
+        top = np.sort(matched[np.argpartition(-scores[matched], k - 1)[:k]])
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(self.ids[i], float(scores[i])) for i in top]
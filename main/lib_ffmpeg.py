@@ -1,53 +1,337 @@
+import json
 import os
+import select
+import shutil
+import stat
 import subprocess
 import tempfile
+import threading
+import time
 import logging
-from typing import Tuple, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, Tuple, Optional
+
+from django.core.cache import cache
 
 logger = logging.getLogger('django')
 
 FFMPEG_PATH = '/usr/bin/ffmpeg'
+FFPROBE_PATH = '/usr/bin/ffprobe'
+
+PROBE_CACHE_TTL = 7 * 24 * 3600  # seconds
+CONTENT_HASHES_MAX_ITEMS = 1000
+
+# CPU cores available to this process
+CPU_COUNT = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+
+
+def _parse_rate(rate: Optional[str]) -> Optional[float]:
+    """Convert an ffprobe rate such as "30000/1001" to a number (None for "0/0" or missing values)."""
+    try:
+        numerator, _, denominator = (rate or '').partition('/')
+        value = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return round(value, 3) if value > 0 else None
+
+
+def _parse_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Content hashes computed while the files were uploaded, by path
+_content_hashes = OrderedDict()
+_content_hashes_lock = threading.Lock()
+
+
+def _get_file_identity(file_path: str) -> tuple:
+    file_stat = os.stat(file_path)
+    return file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns
+
+
+def remember_content_hash(file_path: str, content_hash: str):
+    """Remember the hash of the whole file content, so probe_media results of the file are cached under it."""
+    try:
+        identity = _get_file_identity(file_path)
+    except OSError:
+        return
+    with _content_hashes_lock:
+        _content_hashes[file_path] = (identity, content_hash)
+        _content_hashes.move_to_end(file_path)
+        while len(_content_hashes) > CONTENT_HASHES_MAX_ITEMS:
+            _content_hashes.popitem(last=False)
+
+
+def _get_content_hash(file_path: str) -> Optional[str]:
+    """Remembered content hash of the file, if the file has not been replaced or changed since."""
+    with _content_hashes_lock:
+        item = _content_hashes.get(file_path)
+    if item is None:
+        return None
+    try:
+        identity = _get_file_identity(file_path)
+    except OSError:
+        return None
+    return item[1] if item[0] == identity else None
+
+
+def _run_ffprobe(file_path: str, timeout: int) -> Optional[dict]:
+    probe_cmd = [
+        FFPROBE_PATH,
+        '-v', 'error',
+        '-print_format', 'json',
+        '-show_format',
+        '-show_streams',
+        file_path
+    ]
+    probe_result = subprocess.run(
+        probe_cmd,
+        capture_output=True,
+        text=True,
+        timeout=timeout
+    )
+    if probe_result.returncode != 0:
+        logger.error(f'FFprobe error: {probe_result.stderr}')
+        return None
+
+    data = json.loads(probe_result.stdout or '{}')
+    streams = []
+    for stream in data.get('streams', []):
+        streams.append({
+            'index': stream.get('index'),
+            'codec_type': stream.get('codec_type'),
+            'codec_name': stream.get('codec_name'),
+            'profile': stream.get('profile'),
+            'width': stream.get('width'),
+            'height': stream.get('height'),
+            'pix_fmt': stream.get('pix_fmt'),
+            'sample_aspect_ratio': stream.get('sample_aspect_ratio'),
+            'fps': _parse_rate(stream.get('avg_frame_rate')) or _parse_rate(stream.get('r_frame_rate')),
+            'time_base': stream.get('time_base'),
+            'sample_rate': int(stream['sample_rate']) if stream.get('sample_rate') else None,
+            'channels': stream.get('channels'),
+            'channel_layout': stream.get('channel_layout'),
+            'duration': _parse_float(stream.get('duration')),
+        })
+    format_info = data.get('format', {})
+    video = next((stream for stream in streams if stream['codec_type'] == 'video'), None)
+    audio = next((stream for stream in streams if stream['codec_type'] == 'audio'), None)
+    return {
+        'duration': _parse_float(format_info.get('duration')),
+        'format_name': format_info.get('format_name'),
+        'bit_rate': int(format_info['bit_rate']) if format_info.get('bit_rate') else None,
+        'streams': streams,
+        'video': video,
+        'audio': audio,
+        'width': video['width'] if video else None,
+        'height': video['height'] if video else None,
+        'fps': video['fps'] if video else None,
+    }
+
+
+def probe_media(file_path: str, content_hash: Optional[str] = None, timeout: int = 30) -> Optional[dict]:
+    """
+    Get media file information with a single ffprobe call.
+
+    Results are kept in the Django cache (shared by all workers) under the content hash of the file,
+    so repeated uploads of the same file are not probed again. Files with no known content hash
+    are probed every time.
+
+    Args:
+        file_path: Path to the media file
+        content_hash: Hash of the whole file content if already known (the hash remembered when the file
+            was uploaded is used otherwise)
+        timeout: Timeout in seconds for the ffprobe command
+
+    Returns:
+        Dictionary with duration, format_name, bit_rate, streams (codec, dimensions, fps, audio layout),
+        the first video and audio streams, width, height and fps, or None if the file can not be probed
+    """
+    try:
+        content_hash = content_hash or _get_content_hash(file_path)
+        if not content_hash:
+            return _run_ffprobe(file_path, timeout)
+        cache_key = f'media_probe:{content_hash}'
+        info = cache.get(cache_key)
+        if info is None:
+            info = _run_ffprobe(file_path, timeout)
+            if info is None:
+                return None
+            cache.set(cache_key, info, PROBE_CACHE_TTL)
+        return info
+
+    except subprocess.TimeoutExpired:
+        logger.error(f'FFprobe timeout probing media file {file_path}')
+        return None
+    except Exception as e:
+        logger.error(f'Error probing media file: {str(e)}')
+        return None
 
 
 def get_video_duration(video_path: str, timeout: int = 30) -> Optional[float]:
     """
-    Get video duration in seconds using ffmpeg.
+    Get video duration in seconds.
 
     Args:
         video_path: Path to the video file
-        timeout: Timeout in seconds for the ffmpeg command
+        timeout: Timeout in seconds for the ffprobe command
 
     Returns:
         Video duration in seconds, or None if unable to determine
     """
-    probe_cmd = [
-        FFMPEG_PATH,
-        '-i', video_path,
-        '-hide_banner'
-    ]
+    info = probe_media(video_path, timeout=timeout)
+    return info['duration'] if info else None
 
+
+class ProcessCancelled(Exception):
+    pass
+
+
+class FFmpegProcessGroup:
+    """
+    FFmpeg processes of one operation sharing a deadline.
+
+    When one of them fails, cancel() kills the running ones and prevents new ones from starting.
+    """
+
+    def __init__(self, timeout: float):
+        self.deadline = time.monotonic() + timeout
+        self._processes = set()
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    def run(self, cmd: list) -> subprocess.CompletedProcess:
+        """Same as subprocess.run(cmd, capture_output=True, text=True) with the time left until the deadline."""
+        with self._lock:
+            if self._cancelled:
+                raise ProcessCancelled()
+            timeout = self.deadline - time.monotonic()
+            if timeout <= 0:
+                raise subprocess.TimeoutExpired(cmd, 0)
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            self._processes.add(process)
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise
+        finally:
+            with self._lock:
+                self._processes.discard(process)
+        if self._cancelled:
+            raise ProcessCancelled()
+        return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled = True
+            for process in self._processes:
+                process.kill()
+
+
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_POLL_INTERVAL = 0.2  # seconds
+
+
+def _is_pipe(output_path: str) -> bool:
     try:
-        probe_result = subprocess.run(
-            probe_cmd,
-            capture_output=True,
-            text=True,
-            timeout=timeout
-        )
+        return stat.S_ISFIFO(os.stat(output_path).st_mode)
+    except FileNotFoundError:
+        return False
 
-        # Parse duration from ffmpeg output
-        for line in probe_result.stderr.split('\n'):
-            if 'Duration:' in line:
-                duration_str = line.split('Duration:')[1].split(',')[0].strip()
-                # Convert duration to seconds
-                time_parts = duration_str.split(':')
-                duration = float(time_parts[0]) * 3600 + float(time_parts[1]) * 60 + float(time_parts[2])
-                return duration
 
-        return None
+def _mp4_output_args(output_path: str) -> list:
+    """Fragmented MP4 muxing when the output is a named pipe (it can not seek back to write the index)."""
+    return ['-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov'] if _is_pipe(output_path) else []
 
-    except (subprocess.TimeoutExpired, Exception) as e:
-        logger.error(f'Error getting video duration: {str(e)}')
-        return None
+
+def stream_video_operation(
+    operation,
+    cleanup_paths: Optional[list] = None,
+    first_chunk_timeout: Optional[int] = None,
+    **kwargs
+) -> Tuple[bool, Optional[str], Optional[Iterator[bytes]]]:
+    """
+    Run a video operation (trim_video_segment, replace_audio_in_video, concatenate_videos)
+    with its output written to a named pipe, and stream the fragmented MP4 while ffmpeg is running.
+
+    Waits for the first output bytes, so errors raised before the output is started
+    (invalid parameters, unreadable inputs) are returned as usual. A failure after that
+    ends the stream early.
+
+    Args:
+        operation: Video operation function taking the output_path argument
+        cleanup_paths: Files deleted when the operation ends (input temporary files)
+        first_chunk_timeout: Timeout in seconds to wait for the first output bytes
+            (the timeout argument of the operation, or 180 seconds, by default)
+        **kwargs: Arguments of the operation, except output_path
+
+    Returns:
+        Tuple of (success: bool, error_message: Optional[str], chunks: Optional[Iterator[bytes]])
+    """
+    temp_dir = tempfile.mkdtemp()
+    pipe_path = os.path.join(temp_dir, 'output.mp4')
+    os.mkfifo(pipe_path)
+    # Opened before the operation starts, so ffmpeg opening the pipe for writing never blocks
+    fd = os.open(pipe_path, os.O_RDONLY | os.O_NONBLOCK)
+    result = {}
+
+    def run_operation():
+        try:
+            result['value'] = operation(output_path=pipe_path, **kwargs)
+        except Exception as e:
+            logger.error(f'Error processing streamed video: {str(e)}')
+            result['value'] = (False, f'Error: {str(e)}')
+        finally:
+            for path in (cleanup_paths or []):
+                if path and os.path.exists(path):
+                    os.unlink(path)
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    thread = threading.Thread(target=run_operation, name='ffmpeg-stream', daemon=True)
+    thread.start()
+
+    # Wait for the first output bytes or the end of the operation
+    poller = select.poll()
+    poller.register(fd, select.POLLIN)
+    deadline = time.monotonic() + (first_chunk_timeout or kwargs.get('timeout', 180))
+    first_chunk = b''
+    while not first_chunk:
+        if poller.poll(STREAM_POLL_INTERVAL * 1000):
+            try:
+                first_chunk = os.read(fd, STREAM_CHUNK_SIZE)
+            except BlockingIOError:
+                continue
+            if first_chunk:
+                break
+        if not thread.is_alive() or time.monotonic() > deadline:
+            thread.join(STREAM_POLL_INTERVAL)
+            os.close(fd)
+            success, error_message = result.get('value', (False, 'Video processing timeout.'))[:2]
+            return False, error_message or 'Video processing failed.', None
+
+    def chunks():
+        try:
+            os.set_blocking(fd, True)
+            yield first_chunk
+            while True:
+                chunk = os.read(fd, STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+            thread.join()
+            if not result['value'][0]:
+                logger.error(f'Streamed video processing failed: {result["value"][1]}')
+        finally:
+            # Closing the pipe early (client disconnected) stops ffmpeg with a broken pipe error
+            os.close(fd)
+
+    return True, None, chunks()
 
 
 def extract_frame_from_video(
@@ -75,7 +359,8 @@ def extract_frame_from_video(
     try:
         if is_last:
             # Get video duration to extract the last frame
-            duration = get_video_duration(video_path, timeout=30)
+            info = probe_media(video_path, timeout=30)
+            duration = info['duration'] if info else None
 
             if duration is not None:
                 # Seek to a moment slightly before the end to ensure we get a frame
@@ -137,6 +422,173 @@ def extract_frame_from_video(
         return False, f'Error: {str(e)}'
 
 
+MAX_BATCH_FRAMES = 100
+SPRITE_COLUMNS = 10
+SPRITE_TILE_WIDTH = 160
+# Frames requested at or past the end are taken slightly before it (as for the last frame)
+LAST_FRAME_OFFSET = 0.1
+
+
+def get_frame_timestamps(
+    duration: float,
+    timestamps: Optional[list] = None,
+    interval: Optional[float] = None,
+    count: Optional[int] = None
+) -> Tuple[Optional[list], Optional[str]]:
+    """
+    Times of the frames to extract: the given timestamps, one frame every interval seconds
+    from the start, or count frames evenly spaced over the video (in the middle of equal parts).
+
+    Returns:
+        Tuple of (sorted unique timestamps: Optional[list], error_message: Optional[str])
+    """
+    last_time = max(0.0, duration - LAST_FRAME_OFFSET)
+    if timestamps:
+        if any(t < 0 for t in timestamps):
+            return None, 'Timestamps must be non-negative.'
+        result = [min(float(t), last_time) for t in timestamps]
+    elif interval:
+        if interval <= 0:
+            return None, 'Interval must be positive.'
+        if duration / interval > MAX_BATCH_FRAMES:
+            return None, f'Too many frames, maximum is {MAX_BATCH_FRAMES}.'
+        result = [i * interval for i in range(int(duration / interval) + 1) if i * interval <= last_time]
+    elif count:
+        if count < 1:
+            return None, 'Frames count must be positive.'
+        result = [(i + 0.5) * duration / count for i in range(count)]
+    else:
+        return None, 'Timestamps, interval or frames count is required.'
+    result = sorted(set(round(t, 3) for t in result))
+    if len(result) > MAX_BATCH_FRAMES:
+        return None, f'Too many frames, maximum is {MAX_BATCH_FRAMES}.'
+    return result, None
+
+
+def _format_vtt_time(seconds: float) -> str:
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    return f'{hours:02d}:{minutes:02d}:{milliseconds / 1000:06.3f}'
+
+
+def create_sprite_vtt(timestamps: list, duration: float, sprite_name: str,
+                      tile_width: int, tile_height: int, columns: int) -> str:
+    """
+    WebVTT thumbnails index of a sprite sheet: the tile of each timestamp is shown
+    from it (from the start for the first one) until the next timestamp.
+    """
+    lines = ['WEBVTT', '']
+    for i, t in enumerate(timestamps):
+        start = 0 if i == 0 else t
+        end = timestamps[i + 1] if i + 1 < len(timestamps) else duration
+        x, y = (i % columns) * tile_width, (i // columns) * tile_height
+        lines += [
+            f'{_format_vtt_time(start)} --> {_format_vtt_time(end)}',
+            f'{sprite_name}#xywh={x},{y},{tile_width},{tile_height}',
+            ''
+        ]
+    return '\n'.join(lines)
+
+
+def extract_frames_from_video(
+    video_path: str,
+    output_dir: str,
+    name: str,
+    timestamps: Optional[list] = None,
+    interval: Optional[float] = None,
+    count: Optional[int] = None,
+    sprite: bool = False,
+    width: Optional[int] = None,
+    quality: int = 2,
+    timeout: int = 120
+) -> Tuple[bool, Optional[str], Optional[dict]]:
+    """
+    Extract many frames from a video file with one ffmpeg command.
+
+    The video is opened once per frame with a fast (keyframe index) seek, so only the frames
+    from the keyframe before each timestamp are decoded, not the whole video. The frames are
+    saved as separate JPEG files, or tiled into one sprite sheet with a WebVTT index.
+
+    Args:
+        video_path: Path to the input video file
+        output_dir: Directory of the output files
+        name: Base name of the output files: {name}_{i}.jpg, or {name}_sprite.jpg and {name}.vtt
+        timestamps: Times of the frames in seconds
+        interval: Extract a frame every interval seconds (if timestamps are not given)
+        count: Extract count evenly spaced frames (if timestamps and interval are not given)
+        sprite: Tile the frames into a sprite sheet
+        width: Width of the frames (the original size by default, SPRITE_TILE_WIDTH for sprites)
+        quality: JPEG quality for the output (2-5, lower is better, default: 2)
+        timeout: Timeout in seconds for the ffmpeg command
+
+    Returns:
+        Tuple of (success: bool, error_message: Optional[str], result: Optional[dict]),
+        result is {'frames': [{'time', 'file'}]} or {'sprite': file, 'vtt': file, 'timestamps': [...]}
+    """
+    try:
+        info = probe_media(video_path, timeout=30)
+        if not info or not info['video'] or info['duration'] is None:
+            return False, 'Could not determine video duration.', None
+
+        timestamps, error_message = get_frame_timestamps(info['duration'], timestamps, interval, count)
+        if error_message:
+            return False, error_message, None
+
+        width = width or (SPRITE_TILE_WIDTH if sprite else info['width'])
+        # Even height with the aspect ratio of the video
+        height = max(2, round(width * info['height'] / info['width'] / 2) * 2)
+
+        cmd = [FFMPEG_PATH]
+        for t in timestamps:
+            cmd += ['-ss', str(t), '-i', video_path]
+        filters = [f'[{i}:v:0]trim=end_frame=1,scale={width}:{height},setsar=1[f{i}]'
+                   for i in range(len(timestamps))]
+
+        if sprite:
+            columns = min(len(timestamps), SPRITE_COLUMNS)
+            rows = -(-len(timestamps) // columns)
+            inputs = ''.join(f'[f{i}]' for i in range(len(timestamps)))
+            filters.append(f'{inputs}concat=n={len(timestamps)}:v=1:a=0,tile={columns}x{rows}[sprite]')
+            sprite_name = f'{name}_sprite.jpg'
+            outputs = {sprite_name: '[sprite]'}
+        else:
+            outputs = {f'{name}_{i}.jpg': f'[f{i}]' for i in range(len(timestamps))}
+
+        cmd += ['-filter_complex', ';'.join(filters)]
+        for file_name, label in outputs.items():
+            cmd += ['-map', label, '-frames:v', '1', '-q:v', str(quality), '-y', os.path.join(output_dir, file_name)]
+
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            timeout=timeout
+        )
+
+        if result.returncode != 0:
+            logger.error(f'FFmpeg error: {result.stderr}')
+            return False, 'Failed to extract frames from video.', None
+
+        if not all(os.path.exists(os.path.join(output_dir, file_name)) for file_name in outputs):
+            return False, 'Frames extraction failed.', None
+
+        if not sprite:
+            return True, None, {'frames': [{'time': t, 'file': file_name}
+                                           for t, file_name in zip(timestamps, outputs)]}
+
+        vtt_name = f'{name}.vtt'
+        with open(os.path.join(output_dir, vtt_name), 'w') as f:
+            f.write(create_sprite_vtt(timestamps, info['duration'], sprite_name, width, height, columns))
+        return True, None, {'sprite': sprite_name, 'vtt': vtt_name, 'timestamps': timestamps}
+
+    except subprocess.TimeoutExpired:
+        return False, 'Video processing timeout.', None
+    except Exception as e:
+        logger.error(f'Error extracting video frames: {str(e)}')
+        return False, f'Error: {str(e)}', None
+
+
 def replace_audio_in_video(
     video_path: str,
     audio_path: str,
@@ -163,8 +615,10 @@ def replace_audio_in_video(
     """
     try:
         # Get video and audio durations
-        video_duration = get_video_duration(video_path, timeout=30)
-        audio_duration = get_video_duration(audio_path, timeout=30)
+        video_info = probe_media(video_path, timeout=30)
+        audio_info = probe_media(audio_path, timeout=30)
+        video_duration = video_info['duration'] if video_info else None
+        audio_duration = audio_info['duration'] if audio_info else None
 
         # Check if we need to apply fade-out
         apply_fade_out = (
@@ -190,6 +644,7 @@ def replace_audio_in_video(
                 '-b:a', audio_bitrate,
                 '-af', f'afade=t=out:st={fade_start}:d={fade_duration}',
                 '-shortest',     # Use shortest duration
+                *_mp4_output_args(output_path),
                 '-y',
                 output_path
             ]
@@ -205,6 +660,7 @@ def replace_audio_in_video(
                 '-c:a', 'aac',
                 '-b:a', audio_bitrate,
                 '-shortest',
+                *_mp4_output_args(output_path),
                 '-y',
                 output_path
             ]
@@ -234,22 +690,165 @@ def replace_audio_in_video(
         return False, f'Error: {str(e)}'
 
 
+TRIM_MODES = ('copy', 'smart', 'reencode')
+
+# Encoders of the codecs that smart trimming can re-encode at the cut points
+SMART_TRIM_ENCODERS = {'h264': 'libx264'}
+TRIM_ENCODER_ARGS = ['-preset', 'veryfast', '-crf', '18']
+# Packets are listed past the end time, frames shown before it may come later in decoding order
+PACKETS_READ_MARGIN = 1
+
+
+def _get_video_packets(video_path: str, start_time: float, end_time: float,
+                       process_group: FFmpegProcessGroup) -> list:
+    """Return (pts, is_keyframe) of the video packets around the interval, sorted by presentation time."""
+    cmd = [
+        FFPROBE_PATH,
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-read_intervals', f'{start_time}%{end_time + PACKETS_READ_MARGIN}',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        video_path
+    ]
+    result = process_group.run(cmd)
+    if result.returncode != 0:
+        logger.error(f'FFprobe error: {result.stderr}')
+        return []
+    packets = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        pts = _parse_float(pts_time)
+        if pts is not None:
+            packets.append((pts, flags.startswith('K')))
+    return sorted(packets)
+
+
+def _run_trim_command(cmd: list, process_group: FFmpegProcessGroup) -> bool:
+    result = process_group.run(cmd)
+    if result.returncode != 0:
+        logger.error(f'FFmpeg error: {result.stderr}')
+        return False
+    return True
+
+
+def _reencode_segment(video_path: str, output_path: str, start_time: float, end_time: float,
+                      process_group: FFmpegProcessGroup) -> bool:
+    """Frame-accurate trim re-encoding the whole segment."""
+    cmd = [
+        FFMPEG_PATH,
+        '-ss', str(start_time),
+        '-i', video_path,
+        '-t', str(end_time - start_time),
+        '-c:v', 'libx264',
+        *TRIM_ENCODER_ARGS,
+        '-c:a', 'aac',
+        '-b:a', '192k',
+        *_mp4_output_args(output_path),
+        '-y',
+        output_path
+    ]
+    return _run_trim_command(cmd, process_group)
+
+
+def _smart_trim_segment(video_path: str, output_path: str, start_time: float, end_time: float,
+                        video_info: dict, process_group: FFmpegProcessGroup) -> bool:
+    """
+    Frame-accurate trim re-encoding only the partial GOPs at both ends of the segment.
+
+    The video between the first and the last keyframe inside the segment is stream-copied,
+    the frames before the first keyframe and from the last keyframe to the end are re-encoded
+    with the same codec, and the parts are joined by the concat demuxer (it converts H.264
+    to Annex B, so every part keeps its own parameter sets). Audio is re-encoded in one piece,
+    so there are no gaps at the joins. Falls back to the full re-encode when the codec is not
+    supported or there is no keyframe inside the segment.
+    """
+    video_stream = video_info['video']
+    encoder = SMART_TRIM_ENCODERS.get(video_stream['codec_name']) if video_stream else None
+    packets = _get_video_packets(video_path, start_time, end_time, process_group) if encoder else []
+    frames = [(pts, is_key) for pts, is_key in packets if start_time <= pts < end_time]
+    keyframes = [pts for pts, is_key in frames if is_key]
+    if not keyframes:
+        return _reencode_segment(video_path, output_path, start_time, end_time, process_group)
+    frame_duration = 1 / (video_stream['fps'] or 25)
+    first_keyframe, last_keyframe = keyframes[0], keyframes[-1]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        parts = []
+        part_specs = [
+            (start_time, first_keyframe, False),
+            (first_keyframe, last_keyframe, True),
+            (last_keyframe, end_time, False),
+        ]
+        for i, (part_start, part_end, copy) in enumerate(part_specs):
+            part_frames = [pts for pts, _ in frames if part_start <= pts < part_end]
+            if not part_frames:
+                continue
+            part_path = os.path.join(temp_dir, f'part_{i}.mp4')
+            if copy:
+                # Seek half a frame past the keyframe, so rounded times never select the GOP before it
+                codec_args = ['-c:v', 'copy', '-avoid_negative_ts', 'make_zero']
+                seek_time = part_start + frame_duration / 2
+            else:
+                codec_args = ['-c:v', encoder, *TRIM_ENCODER_ARGS, '-pix_fmt', video_stream['pix_fmt'] or 'yuv420p']
+                seek_time = part_start
+            cmd = [
+                FFMPEG_PATH,
+                '-ss', str(seek_time),
+                '-i', video_path,
+                '-map', '0:v:0',
+                '-frames:v', str(len(part_frames)),
+                *codec_args,
+                '-y',
+                part_path
+            ]
+            if not _run_trim_command(cmd, process_group):
+                return False
+            # Up to the first frame of the next part, the duration of the last frame is not kept by the muxer
+            next_frame = part_end if part_end < end_time else part_frames[-1] + frame_duration
+            parts.append((part_path, next_frame - part_frames[0]))
+
+        concat_list_path = os.path.join(temp_dir, 'concat_list.txt')
+        with open(concat_list_path, 'w') as f:
+            for part_path, duration in parts:
+                f.write(f"file '{part_path}'\nduration {duration:.6f}\n")
+
+        cmd = [
+            FFMPEG_PATH,
+            '-f', 'concat',
+            '-safe', '0',
+            '-i', concat_list_path,
+        ]
+        if video_info['audio']:
+            cmd += ['-ss', str(start_time), '-t', str(end_time - start_time), '-i', video_path,
+                    '-map', '0:v:0', '-map', '1:a:0', '-c:a', 'aac', '-b:a', '192k']
+        cmd += ['-c:v', 'copy', *_mp4_output_args(output_path), '-y', output_path]
+        return _run_trim_command(cmd, process_group)
+
+
 def trim_video_segment(
     video_path: str,
     output_path: str,
     start_time: float,
     end_time: float,
-    timeout: int = 180
+    timeout: int = 180,
+    mode: str = 'copy'
 ) -> Tuple[bool, Optional[str], Optional[float]]:
     """
     Trim a video file to extract a segment between start and end times.
 
+    Modes:
+        copy: stream copy, fastest, but the cuts snap to keyframes
+        smart: frame-accurate cuts, only the partial GOPs at both ends are re-encoded
+        reencode: frame-accurate cuts, the whole segment is re-encoded
+
     Args:
         video_path: Path to the input video file
         output_path: Path where the trimmed video should be saved
         start_time: Start time in seconds
         end_time: End time in seconds
-        timeout: Timeout in seconds for the ffmpeg command
+        timeout: Timeout in seconds for the whole operation
+        mode: Trim mode, one of TRIM_MODES (default: 'copy')
 
     Returns:
         Tuple of (success: bool, error_message: Optional[str], video_duration: Optional[float])
@@ -262,8 +861,12 @@ def trim_video_segment(
         if end_time <= start_time:
             return False, 'End time must be greater than start time.', None
 
+        if mode not in TRIM_MODES:
+            return False, f'Trim mode must be one of: {", ".join(TRIM_MODES)}.', None
+
         # Get video duration to validate parameters
-        video_duration = get_video_duration(video_path, timeout=30)
+        video_info = probe_media(video_path, timeout=30)
+        video_duration = video_info['duration'] if video_info else None
 
         if video_duration is None:
             return False, 'Could not determine video duration.', None
@@ -271,30 +874,31 @@ def trim_video_segment(
         if end_time > video_duration:
             return False, f'End time ({end_time}) exceeds video duration ({video_duration:.2f} seconds).', video_duration
 
-        # Calculate trim duration
-        trim_duration = end_time - start_time
+        process_group = FFmpegProcessGroup(timeout)
 
-        # Build ffmpeg command to trim video
-        cmd = [
-            FFMPEG_PATH,
-            '-ss', str(start_time),
-            '-i', video_path,
-            '-t', str(trim_duration),
-            '-c', 'copy',  # Copy codec without re-encoding
-            '-y',
-            output_path
-        ]
+        if mode == 'smart':
+            success = _smart_trim_segment(video_path, output_path, start_time, end_time, video_info, process_group)
+        elif mode == 'reencode':
+            success = _reencode_segment(video_path, output_path, start_time, end_time, process_group)
+        else:
+            # Calculate trim duration
+            trim_duration = end_time - start_time
 
-        # Execute ffmpeg command
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=timeout
-        )
+            # Build ffmpeg command to trim video
+            cmd = [
+                FFMPEG_PATH,
+                '-ss', str(start_time),
+                '-i', video_path,
+                '-t', str(trim_duration),
+                '-c', 'copy',  # Copy codec without re-encoding
+                *_mp4_output_args(output_path),
+                '-y',
+                output_path
+            ]
 
-        if result.returncode != 0:
-            logger.error(f'FFmpeg error: {result.stderr}')
+            success = _run_trim_command(cmd, process_group)
+
+        if not success:
             return False, 'Failed to trim video.', video_duration
 
         # Check if output file was created
@@ -327,62 +931,277 @@ def save_uploaded_file_to_temp(uploaded_file, suffix: str = '') -> str:
         return temp_file.name
 
 
+def get_uploaded_file_path(uploaded_file, suffix: str = '') -> str:
+    """
+    Get a path of an uploaded file that ffmpeg can read.
+
+    Files written to disk by the upload handler (TemporaryUploadedFile) are used in place,
+    without copying; other files are saved to a temporary file. The caller may delete the
+    returned file when done (Django ignores upload temporary files deleted before the request ends).
+
+    Args:
+        uploaded_file: Django UploadedFile object
+        suffix: File extension suffix of the temporary file if a copy is needed (e.g., '.mp4', '.mp3')
+
+    Returns:
+        Path to the file
+    """
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        file_path = uploaded_file.temporary_file_path()
+    else:
+        file_path = save_uploaded_file_to_temp(uploaded_file, suffix=suffix)
+    if getattr(uploaded_file, 'content_hash', None):
+        remember_content_hash(file_path, uploaded_file.content_hash)
+    return file_path
+
+
+def link_uploaded_file(uploaded_file, target_path: str):
+    """
+    Make an uploaded file available at target_path after the request ends.
+
+    Upload temporary files are hard-linked (no data is copied); the file is copied
+    only if it is in memory or on another file system.
+    """
+    linked = False
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        try:
+            os.link(uploaded_file.temporary_file_path(), target_path)
+            linked = True
+        except OSError as e:
+            logger.warning(f'Could not link uploaded file, copying it: {str(e)}')
+    if not linked:
+        with open(target_path, 'wb') as f:
+            for chunk in uploaded_file.chunks():
+                f.write(chunk)
+    if getattr(uploaded_file, 'content_hash', None):
+        remember_content_hash(target_path, uploaded_file.content_hash)
+
+
 def get_video_dimensions(video_path: str, timeout: int = 30) -> Optional[Tuple[int, int]]:
     """
-    Get video dimensions (width, height) using ffmpeg.
+    Get video dimensions (width, height).
 
     Args:
         video_path: Path to the video file
-        timeout: Timeout in seconds for the ffmpeg command
+        timeout: Timeout in seconds for the ffprobe command
 
     Returns:
         Tuple of (width, height), or None if unable to determine
     """
-    probe_cmd = [
+    info = probe_media(video_path, timeout=timeout)
+    if not info or not info['width'] or not info['height']:
+        return None
+    return info['width'], info['height']
+
+
+# Codecs that can be stream-copied from the inputs into the MP4 output
+STREAM_COPY_VIDEO_CODECS = ('h264', 'hevc')
+STREAM_COPY_AUDIO_CODECS = ('aac', 'mp3')
+
+
+def _stream_copy_signature(info: Optional[dict]) -> Optional[tuple]:
+    """
+    Parameters that must be equal in all inputs to join them without re-encoding,
+    or None if the file can not be stream-copied into an MP4 file.
+    """
+    if not info or not info['video'] or info['video']['codec_name'] not in STREAM_COPY_VIDEO_CODECS:
+        return None
+    signature = []
+    for stream in info['streams']:
+        if stream['codec_type'] == 'video':
+            signature.append(('video', stream['codec_name'], stream['profile'], stream['width'], stream['height'],
+                              stream['pix_fmt'], stream['sample_aspect_ratio'], stream['fps'], stream['time_base']))
+        elif stream['codec_type'] == 'audio':
+            if stream['codec_name'] not in STREAM_COPY_AUDIO_CODECS:
+                return None
+            signature.append(('audio', stream['codec_name'], stream['sample_rate'], stream['channels'],
+                              stream['channel_layout']))
+    return tuple(signature)
+
+
+def can_concatenate_without_reencoding(media_infos: list) -> bool:
+    """Check that all inputs share codecs, resolution, fps and audio layout, so they can be joined as they are."""
+    signatures = [_stream_copy_signature(info) for info in media_infos]
+    return signatures[0] is not None and all(signature == signatures[0] for signature in signatures)
+
+
+def _concat_demuxer(video_paths: list, output_path: str, temp_dir: str,
+                    process_group: FFmpegProcessGroup) -> Tuple[bool, Optional[str]]:
+    """Join files with identical stream parameters using the concat demuxer without re-encoding."""
+    # Create concat file list for ffmpeg
+    concat_list_path = os.path.join(temp_dir, 'concat_list.txt')
+    with open(concat_list_path, 'w') as f:
+        for video_path in video_paths:
+            # Escape single quotes in absolute paths (relative ones are resolved from the list directory)
+            escaped_path = os.path.abspath(video_path).replace("'", "'\\''")
+            f.write(f"file '{escaped_path}'\n")
+
+    # Concatenate videos using concat demuxer
+    concat_cmd = [
+        FFMPEG_PATH,
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', concat_list_path,
+        '-c', 'copy',
+        *_mp4_output_args(output_path),
+        '-y',
+        output_path
+    ]
+
+    # Execute concatenation command
+    concat_result = process_group.run(concat_cmd)
+
+    if concat_result.returncode != 0:
+        logger.error(f'FFmpeg concat error: {concat_result.stderr}')
+        return False, 'Failed to concatenate videos.'
+
+    # Check if output file was created
+    if not os.path.exists(output_path):
+        return False, 'Video concatenation failed.'
+
+    return True, None
+
+
+# Speed/quality profiles of the videos re-encoded for concatenation (libx264 preset and CRF, AAC bitrate)
+ENCODER_PRESETS = {
+    'fast': {'preset': 'veryfast', 'crf': 23, 'audio_bitrate': '128k'},
+    'balanced': {'preset': 'medium', 'crf': 23, 'audio_bitrate': '192k'},
+    'archive': {'preset': 'slow', 'crf': 18, 'audio_bitrate': '256k'},
+}
+ENCODER_PRESET_NAMES = ('auto', *ENCODER_PRESETS)
+# Output pixels encoded per second by one core (scaling included): about half of the rates measured
+# with experiments/benchmark_encoder_presets.py (test pattern video), camera footage is slower to encode
+ENCODER_PIXEL_RATES = {
+    'fast': 24_000_000,
+    'balanced': 12_000_000,
+    'archive': 7_000_000,
+}
+# Presets chosen by the auto mode, by quality (archive makes larger files, so it is only used when requested)
+AUTO_ENCODER_PRESETS = ('balanced', 'fast')
+# Part of the time left until the deadline the encoding may take (the rest is for the join and estimate errors)
+AUTO_PRESET_TIME_SHARE = 0.6
+
+
+def get_encoding_threads(jobs: int) -> Tuple[int, int]:
+    """Number of ffmpeg processes run in parallel and encoder threads of each, to use all CPU cores."""
+    workers = max(1, min(jobs, CPU_COUNT))
+    return workers, max(1, CPU_COUNT // workers)
+
+
+def estimate_encoding_time(media_infos: list, width: int, height: int, preset: str) -> Optional[float]:
+    """
+    Estimate the time in seconds to re-encode the videos to the given dimensions with the preset
+    on the available cores, from their durations and frame rates. None if the durations are unknown.
+    """
+    frame_counts = []
+    for info in media_infos:
+        if not info or not info.get('duration'):
+            return None
+        frame_counts.append(info['duration'] * (info.get('fps') or 30))
+    workers, threads = get_encoding_threads(len(media_infos))
+    # The videos are encoded in parallel, the longest one by a single process at least
+    frames = max(sum(frame_counts) / workers, max(frame_counts))
+    return frames * width * height / (ENCODER_PIXEL_RATES[preset] * threads)
+
+
+def choose_encoder_preset(media_infos: list, width: int, height: int, time_left: float) -> str:
+    """
+    Choose the best quality preset that is expected to re-encode the videos in the given time
+    (the fastest one if none is).
+    """
+    for preset in AUTO_ENCODER_PRESETS:
+        estimate = estimate_encoding_time(media_infos, width, height, preset)
+        if estimate is not None and estimate <= time_left * AUTO_PRESET_TIME_SHARE:
+            return preset
+    return AUTO_ENCODER_PRESETS[-1]
+
+
+def _scale_video(video_path: str, output_path: str, width: int, height: int,
+                 process_group: FFmpegProcessGroup, threads: int = 0, preset: str = 'balanced') -> bool:
+    """Re-encode a video scaled to fit the given dimensions, padded to keep its aspect ratio."""
+    # Using scale filter with pad to maintain aspect ratio
+    # Formula: scale to fit within reference dimensions, then pad to exact size
+    scale_filter = (
+        f"scale=w={width}:h={height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2"
+    )
+
+    cmd = [
         FFMPEG_PATH,
         '-i', video_path,
-        '-hide_banner'
+        '-vf', scale_filter,
+        '-c:v', 'libx264',
+        '-preset', ENCODER_PRESETS[preset]['preset'],
+        '-crf', str(ENCODER_PRESETS[preset]['crf']),
+        '-c:a', 'aac',
+        '-b:a', ENCODER_PRESETS[preset]['audio_bitrate'],
+        '-threads', str(threads),
+        '-y',
+        output_path
     ]
 
-    try:
-        probe_result = subprocess.run(
-            probe_cmd,
-            capture_output=True,
-            text=True,
-            timeout=timeout
-        )
+    # Execute scaling command
+    result = process_group.run(cmd)
 
-        # Parse dimensions from ffmpeg output
-        for line in probe_result.stderr.split('\n'):
-            if 'Stream' in line and 'Video:' in line:
-                # Look for pattern like "1920x1080" or "1280x720"
-                import re
-                match = re.search(r'(\d{2,5})x(\d{2,5})', line)
-                if match:
-                    width = int(match.group(1))
-                    height = int(match.group(2))
-                    return (width, height)
+    if result.returncode != 0:
+        logger.error(f'FFmpeg scaling error for {video_path}: {result.stderr}')
+        return False
 
-        return None
+    return os.path.exists(output_path)
 
-    except (subprocess.TimeoutExpired, Exception) as e:
-        logger.error(f'Error getting video dimensions: {str(e)}')
-        return None
+
+def _scale_videos(video_paths: list, temp_dir: str, width: int, height: int,
+                  process_group: FFmpegProcessGroup, preset: str = 'balanced') -> Tuple[Optional[list], Optional[str]]:
+    """
+    Scale the videos in parallel, one ffmpeg process per input and at most one per CPU core.
+
+    The first failure cancels the remaining work. Returns the paths of the scaled videos or an error message.
+    """
+    workers, threads = get_encoding_threads(len(video_paths))
+    scaled_video_paths = [os.path.join(temp_dir, f'scaled_{i}.mp4') for i in range(len(video_paths))]
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ffmpeg-scale')
+    try:
+        futures = {
+            executor.submit(_scale_video, video_path, scaled_video_path, width, height, process_group, threads,
+                            preset): i
+            for i, (video_path, scaled_video_path) in enumerate(zip(video_paths, scaled_video_paths))
+        }
+        for future in as_completed(futures):
+            try:
+                success = future.result()
+            except BaseException:
+                process_group.cancel()
+                raise
+            if not success:
+                process_group.cancel()
+                return None, f'Failed to scale video {futures[future] + 1}.'
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return scaled_video_paths, None
 
 
 def concatenate_videos(
     video_paths: list,
     output_path: str,
-    timeout: int = 300
+    timeout: int = 300,
+    preset: str = 'balanced'
 ) -> Tuple[bool, Optional[str]]:
     """
     Concatenate multiple video files into one, scaling all videos to match
     the first video's dimensions while preserving aspect ratio.
 
+    When all videos share codecs, resolution, fps and audio layout they are joined
+    without re-encoding (stream copy), which is much faster and lossless.
+    Otherwise the videos are scaled in parallel, one ffmpeg process per CPU core.
+
     Args:
         video_paths: List of paths to input video files
         output_path: Path where the output video should be saved
-        timeout: Timeout in seconds for the ffmpeg command
+        timeout: Timeout in seconds for the whole operation (all ffmpeg commands)
+        preset: Encoder profile of the re-encoded videos: 'fast', 'balanced', 'archive', or 'auto'
+            to choose it from the durations and the output resolution so the encoding ends before the timeout
 
     Returns:
         Tuple of (success: bool, error_message: Optional[str])
@@ -391,101 +1210,55 @@ def concatenate_videos(
         if not video_paths or len(video_paths) == 0:
             return False, 'No video files provided.'
 
+        if preset not in ENCODER_PRESET_NAMES:
+            return False, f'Invalid preset: {preset}.'
+
+        process_group = FFmpegProcessGroup(timeout)
+
         if len(video_paths) == 1:
-            # If only one video, just copy it
-            import shutil
-            shutil.copy(video_paths[0], output_path)
+            if not _is_pipe(output_path):
+                # If only one video, just copy it
+                shutil.copy(video_paths[0], output_path)
+                return True, None
+            # A streamed output is remuxed to fragmented MP4
+            copy_result = process_group.run([
+                FFMPEG_PATH, '-i', video_paths[0], '-c', 'copy', *_mp4_output_args(output_path), '-y', output_path
+            ])
+            if copy_result.returncode != 0:
+                logger.error(f'FFmpeg copy error: {copy_result.stderr}')
+                return False, 'Failed to copy video.'
             return True, None
+        media_infos = [probe_media(video_path, timeout=30) for video_path in video_paths]
 
         # Get dimensions of the first video (reference dimensions)
-        reference_dimensions = get_video_dimensions(video_paths[0], timeout=30)
-        if reference_dimensions is None:
+        reference_info = media_infos[0]
+        if not reference_info or not reference_info['width'] or not reference_info['height']:
             return False, 'Could not determine dimensions of the first video.'
 
-        ref_width, ref_height = reference_dimensions
+        ref_width, ref_height = reference_info['width'], reference_info['height']
 
         # Create a temporary directory for scaled videos
         with tempfile.TemporaryDirectory() as temp_dir:
-            scaled_video_paths = []
+            if can_concatenate_without_reencoding(media_infos):
+                success, error_message = _concat_demuxer(video_paths, output_path, temp_dir, process_group)
+                if success:
+                    return True, None
+                if _is_pipe(output_path):
+                    # Part of the output may have been streamed already, another one can not follow it
+                    return False, error_message
+                logger.warning('Stream copy concatenation failed, re-encoding the videos.')
+
+            if preset == 'auto':
+                preset = choose_encoder_preset(media_infos, ref_width, ref_height,
+                                               process_group.deadline - time.monotonic())
 
             # Scale all videos to match the first video's dimensions
-            for i, video_path in enumerate(video_paths):
-                scaled_video_path = os.path.join(temp_dir, f'scaled_{i}.mp4')
-
-                # Build ffmpeg command to scale video
-                # Using scale filter with pad to maintain aspect ratio
-                # Formula: scale to fit within reference dimensions, then pad to exact size
-                scale_filter = (
-                    f"scale=w={ref_width}:h={ref_height}:force_original_aspect_ratio=decrease,"
-                    f"pad={ref_width}:{ref_height}:(ow-iw)/2:(oh-ih)/2"
-                )
+            scaled_video_paths, error_message = _scale_videos(video_paths, temp_dir, ref_width, ref_height,
+                                                              process_group, preset)
+            if scaled_video_paths is None:
+                return False, error_message
 
-                cmd = [
-                    FFMPEG_PATH,
-                    '-i', video_path,
-                    '-vf', scale_filter,
-                    '-c:v', 'libx264',
-                    '-preset', 'medium',
-                    '-crf', '23',
-                    '-c:a', 'aac',
-                    '-b:a', '192k',
-                    '-y',
-                    scaled_video_path
-                ]
-
-                # Execute scaling command
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=timeout
-                )
-
-                if result.returncode != 0:
-                    logger.error(f'FFmpeg scaling error for video {i}: {result.stderr}')
-                    return False, f'Failed to scale video {i + 1}.'
-
-                if not os.path.exists(scaled_video_path):
-                    return False, f'Scaling failed for video {i + 1}.'
-
-                scaled_video_paths.append(scaled_video_path)
-
-            # Create concat file list for ffmpeg
-            concat_list_path = os.path.join(temp_dir, 'concat_list.txt')
-            with open(concat_list_path, 'w') as f:
-                for scaled_path in scaled_video_paths:
-                    # Escape single quotes in paths
-                    escaped_path = scaled_path.replace("'", "'\\''")
-                    f.write(f"file '{escaped_path}'\n")
-
-            # Concatenate videos using concat demuxer
-            concat_cmd = [
-                FFMPEG_PATH,
-                '-f', 'concat',
-                '-safe', '0',
-                '-i', concat_list_path,
-                '-c', 'copy',
-                '-y',
-                output_path
-            ]
-
-            # Execute concatenation command
-            concat_result = subprocess.run(
-                concat_cmd,
-                capture_output=True,
-                text=True,
-                timeout=timeout
-            )
-
-            if concat_result.returncode != 0:
-                logger.error(f'FFmpeg concat error: {concat_result.stderr}')
-                return False, 'Failed to concatenate videos.'
-
-            # Check if output file was created
-            if not os.path.exists(output_path):
-                return False, 'Video concatenation failed.'
-
-        return True, None
+            return _concat_demuxer(scaled_video_paths, output_path, temp_dir, process_group)
 
     except subprocess.TimeoutExpired:
         return False, 'Video processing timeout.'
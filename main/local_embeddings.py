@@ -0,0 +1,94 @@
+import hashlib
+import re
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.settings import LOCAL_EMBEDDINGS_BATCH_SIZE, LOCAL_EMBEDDINGS_RUNTIME
+
+# Embedding model names with these prefixes are computed in the worker process instead of a remote API:
+# "local:<sentence-transformers model>" (e.g. "local:sentence-transformers/all-MiniLM-L6-v2"),
+# "hashing" or "hashing:<dimensions>" (deterministic, for tests and benchmarks).
+LOCAL_MODEL_PREFIX = 'local:'
+HASHING_MODEL_PREFIX = 'hashing'
+HASHING_DEFAULT_DIMENSIONS = 256
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_local_embeddings_model(model: str) -> bool:
+    return bool(model) and (model.startswith(LOCAL_MODEL_PREFIX) or model.startswith(HASHING_MODEL_PREFIX))
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic embeddings without a model: word unigrams and bigrams are hashed
+    into a fixed number of signed buckets and the vector is L2-normalised.
+
+    Texts sharing words get close vectors, so search results are meaningful enough
+    for tests and benchmarks, and the vectors are the same on every run and machine.
+    """
+
+    def __init__(self, dimensions: int = HASHING_DEFAULT_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> list[float]:
+        tokens = _TOKEN_RE.findall(text.casefold())
+        features = tokens + [f'{first} {second}' for first, second in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in features:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+            vector[digest % self.dimensions] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def _load_sentence_transformer(model_name: str) -> Embeddings:
+    try:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        model_kwargs = {'device': 'cpu'}
+        if LOCAL_EMBEDDINGS_RUNTIME == 'onnx':
+            model_kwargs['backend'] = 'onnx'
+        return HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs=model_kwargs,
+            encode_kwargs={'batch_size': LOCAL_EMBEDDINGS_BATCH_SIZE, 'normalize_embeddings': True},
+        )
+    except ImportError as e:
+        raise ValueError('Local embeddings require the "sentence-transformers" package to be installed.') from e
+
+
+def get_local_embeddings_model(model: str) -> Embeddings:
+    """
+    Return the in-process embeddings model for a "local:..." or "hashing..." model name.
+
+    Loaded models are kept for the lifetime of the worker process, so only the first
+    request in each worker pays for loading the model.
+    """
+    if model.startswith(HASHING_MODEL_PREFIX):
+        dimensions = model[len(HASHING_MODEL_PREFIX):].lstrip(':')
+        try:
+            return HashingEmbeddings(int(dimensions) if dimensions else HASHING_DEFAULT_DIMENSIONS)
+        except ValueError:
+            raise ValueError(f'Invalid hashing embeddings model name: "{model}".')
+
+    model_name = model[len(LOCAL_MODEL_PREFIX):]
+    if not model_name:
+        raise ValueError('Local embeddings model name is required, e.g. "local:sentence-transformers/all-MiniLM-L6-v2".')
+    with _models_lock:
+        if model_name not in _models:
+            _models[model_name] = _load_sentence_transformer(model_name)
+        return _models[model_name]
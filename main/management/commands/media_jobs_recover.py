@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main.media_jobs import recover_media_jobs
+
+
+class Command(BaseCommand):
+    help = 'Re-queue (run) or fail media jobs left by stopped worker processes and delete their input files'
+
+    def handle(self, *args, **options):
+        result = recover_media_jobs()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Requeued {result['requeued']} jobs, failed {result['failed']} jobs, "
+            f"deleted {result['deleted_dirs']} input directories."))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from app.settings import VECTOR_STORAGE_MAX_BYTES, VECTOR_STORE_MAX_BYTES, VECTOR_STORE_MAX_AGE_DAYS
+from main.embeddings import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Delete vector stores by age, size and LRU under the total storage quota'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-days', type=int, default=VECTOR_STORE_MAX_AGE_DAYS,
+                            help='Delete stores not accessed for this many days (0 - no limit)')
+        parser.add_argument('--max-store-bytes', type=int, default=VECTOR_STORE_MAX_BYTES,
+                            help='Delete stores larger than this (0 - no limit)')
+        parser.add_argument('--max-total-bytes', type=int, default=VECTOR_STORAGE_MAX_BYTES,
+                            help='Delete least recently used stores until the total size fits (0 - no limit)')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the stores that would be deleted')
+
+    def handle(self, *args, **options):
+        result = collect_garbage(max_age_days=options['max_age_days'], max_store_bytes=options['max_store_bytes'],
+                                 max_total_bytes=options['max_total_bytes'], dry_run=options['dry_run'])
+
+        for store in result['deleted']:
+            self.stdout.write(f"{store['uuid']} {store['bytes']} bytes ({store['reason']})")
+        action = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {len(result['deleted'])} stores, total size: {result['total_bytes']} bytes."))
@@ -0,0 +1,316 @@
+import fcntl
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from app.settings import BASE_DIR, MEDIA_ROOT, MEDIA_JOB_WORKERS, MEDIA_JOBS_HOST_CONCURRENCY
+from main.lib_ffmpeg import extract_frame_from_video, replace_audio_in_video, trim_video_segment, concatenate_videos, \
+    link_uploaded_file
+from main.models import MediaJobModel
+
+logger = logging.getLogger(__name__)
+
+# Input files of queued jobs (uploaded files are deleted by Django when the request ends)
+MEDIA_JOBS_PATH = os.path.join(BASE_DIR, 'media_jobs')
+
+SLOT_WAIT_INTERVAL = 0.5  # seconds between attempts to get a free host slot
+JOB_LOCK_FILE_NAME = 'job.lock'
+# Jobs created less than this many seconds ago may not hold their lock yet
+STALE_JOB_GRACE_SECONDS = 60
+# Seconds between the checks for jobs left by stopped worker processes in each process
+RECOVERY_INTERVAL = 300
+
+
+class MediaOperationError(Exception):
+    pass
+
+
+def _new_output_path(directory: str, extension: str) -> tuple[str, str]:
+    """Return the absolute path and the path relative to MEDIA_ROOT of a new output file."""
+    output_dir = os.path.join(MEDIA_ROOT, directory)
+    os.makedirs(output_dir, exist_ok=True)
+    file_name = f'{uuid.uuid1()}.{extension}'
+    return os.path.join(output_dir, file_name), f'{directory}/{file_name}'
+
+
+def _extract_frame(input_paths: list, params: dict) -> dict:
+    output_path, media_path = _new_output_path('frames', 'jpg')
+    success, error_message = extract_frame_from_video(
+        video_path=input_paths[0],
+        output_path=output_path,
+        second=params.get('second', 0),
+        is_last=params.get('is_last', False),
+        quality=2,
+        timeout=60
+    )
+    if not success:
+        raise MediaOperationError(error_message)
+    return {'image_url': media_path}
+
+
+def _replace_audio(input_paths: list, params: dict) -> dict:
+    output_path, media_path = _new_output_path('video', 'mp4')
+    success, error_message = replace_audio_in_video(
+        video_path=input_paths[0],
+        audio_path=input_paths[1],
+        output_path=output_path,
+        use_fade_out=params.get('use_fade_out', False),
+        fade_duration=3.0,
+        audio_bitrate='192k',
+        timeout=180
+    )
+    if not success:
+        raise MediaOperationError(error_message)
+    return {'video_url': media_path}
+
+
+def _trim(input_paths: list, params: dict) -> dict:
+    output_path, media_path = _new_output_path('video', 'mp4')
+    success, error_message, video_duration = trim_video_segment(
+        video_path=input_paths[0],
+        output_path=output_path,
+        start_time=params['second_start'],
+        end_time=params['second_end'],
+        timeout=180,
+        mode=params.get('mode', 'copy')
+    )
+    if not success:
+        raise MediaOperationError(error_message)
+    return {'video_url': media_path}
+
+
+def _concatenate(input_paths: list, params: dict) -> dict:
+    output_path, media_path = _new_output_path('video', 'mp4')
+    success, error_message = concatenate_videos(
+        video_paths=input_paths,
+        output_path=output_path,
+        timeout=300,
+        preset=params.get('preset', 'balanced')
+    )
+    if not success:
+        raise MediaOperationError(error_message)
+    return {'video_url': media_path}
+
+
+# Operation name -> function(input_paths, params) returning output file paths relative to MEDIA_ROOT
+MEDIA_OPERATIONS = {
+    'extract_frame': _extract_frame,
+    'replace_audio': _replace_audio,
+    'trim': _trim,
+    'concatenate': _concatenate,
+}
+
+
+@contextmanager
+def _host_slot():
+    """
+    Wait for one of MEDIA_JOBS_HOST_CONCURRENCY slots shared by all worker processes of the host.
+
+    Slots are lock files: a slot is taken while its exclusive lock is held, and released
+    by the operating system if the process dies.
+    """
+    os.makedirs(MEDIA_JOBS_PATH, exist_ok=True)
+    while True:
+        for i in range(max(1, MEDIA_JOBS_HOST_CONCURRENCY)):
+            lock_file = open(os.path.join(MEDIA_JOBS_PATH, f'slot_{i}.lock'), 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+            return
+        time.sleep(SLOT_WAIT_INTERVAL)
+
+
+def _run_media_job(job_id: int):
+    try:
+        with _host_slot():
+            # Claim the job, so it is processed once even if it was submitted again
+            claimed = MediaJobModel.objects.filter(id=job_id, status='pending').update(
+                status='processing', date_started=timezone.now())
+            if not claimed:
+                return
+            job = MediaJobModel.objects.get(id=job_id)
+            try:
+                result = MEDIA_OPERATIONS[job.operation](job.input_paths, job.params or {})
+            except MediaOperationError as e:
+                job.status, job.error = 'error', str(e)
+            except Exception as e:
+                logger.exception(e)
+                job.status, job.error = 'error', f'Error: {str(e)}'
+            else:
+                job.status, job.result = 'done', result
+            job.date_finished = timezone.now()
+            job.save(update_fields=['status', 'result', 'error', 'date_finished'])
+    except Exception as e:
+        logger.exception(e)
+    finally:
+        shutil.rmtree(os.path.join(MEDIA_JOBS_PATH, str(job_id)), ignore_errors=True)
+        _release_job_lock(job_id)
+
+
+def _media_job_thread(job_id: int):
+    try:
+        _run_media_job(job_id)
+    finally:
+        connection.close()  # each worker thread has its own database connection
+
+
+_media_jobs_executor = ThreadPoolExecutor(max_workers=MEDIA_JOB_WORKERS, thread_name_prefix='media-job')
+
+# Lock files of the input directories of the jobs queued in this process, by job ID
+_job_locks = {}
+_job_locks_lock = threading.Lock()
+_last_recovery = 0.0
+
+
+def _lock_job(job_id: int) -> bool:
+    """
+    Take the lock of the job input directory, held by the process the job is queued in until it ends
+    (the operating system releases it if the process dies). False if another process holds it.
+    """
+    try:
+        lock_file = open(os.path.join(MEDIA_JOBS_PATH, str(job_id), JOB_LOCK_FILE_NAME), 'a')
+    except FileNotFoundError:
+        return True  # no input directory, no process can run the job
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return False
+    with _job_locks_lock:
+        _job_locks[job_id] = lock_file
+    return True
+
+
+def _release_job_lock(job_id: int):
+    with _job_locks_lock:
+        lock_file = _job_locks.pop(job_id, None)
+    if lock_file is not None:
+        lock_file.close()
+
+
+def recover_media_jobs() -> dict:
+    """
+    Re-queue or fail the jobs left pending or processing by worker processes that stopped
+    (restart or crash), and delete their input directories.
+
+    A job belongs to the process holding the lock of its input directory. Pending jobs with
+    their input files are re-queued in this process; processing jobs are failed, as the operation
+    may be what stopped the process. Input directories of jobs that are not queued are deleted.
+    Returns the numbers of requeued and failed jobs and of deleted directories.
+    """
+    result = {'requeued': 0, 'failed': 0, 'deleted_dirs': 0}
+    stale_before = timezone.now() - timedelta(seconds=STALE_JOB_GRACE_SECONDS)
+    stale_jobs = MediaJobModel.objects.filter(status__in=('pending', 'processing'), date_created__lt=stale_before)
+    for job_id in stale_jobs.values_list('id', flat=True):
+        with _job_locks_lock:
+            if job_id in _job_locks:
+                continue  # queued in this process
+        if not _lock_job(job_id):
+            continue
+        job = MediaJobModel.objects.filter(id=job_id).first()
+        if job is None or job.status not in ('pending', 'processing'):
+            _release_job_lock(job_id)  # finished while it was being checked
+            continue
+        if job.status == 'pending' and job.input_paths and all(os.path.isfile(path) for path in job.input_paths):
+            logger.warning(f'Requeueing media job {job.uuid} left by a stopped worker process.')
+            _media_jobs_executor.submit(_media_job_thread, job.id)
+            result['requeued'] += 1
+            continue
+        logger.warning(f'Media job {job.uuid} was interrupted by a stopped worker process.')
+        MediaJobModel.objects.filter(id=job.id, status=job.status).update(
+            status='error', error='Job was interrupted by a worker restart.', date_finished=timezone.now())
+        shutil.rmtree(os.path.join(MEDIA_JOBS_PATH, str(job.id)), ignore_errors=True)
+        _release_job_lock(job.id)
+        result['failed'] += 1
+
+    # Input directories of finished or deleted jobs left by a process stopped before it deleted them
+    if os.path.isdir(MEDIA_JOBS_PATH):
+        active_ids = set(MediaJobModel.objects.filter(status__in=('pending', 'processing'))
+                         .values_list('id', flat=True))
+        for entry in os.scandir(MEDIA_JOBS_PATH):
+            if not entry.is_dir() or not entry.name.isdigit() or int(entry.name) in active_ids:
+                continue
+            if time.time() - entry.stat().st_mtime < STALE_JOB_GRACE_SECONDS:
+                continue  # a job being submitted
+            job_id = int(entry.name)
+            with _job_locks_lock:
+                if job_id in _job_locks:
+                    continue
+            if _lock_job(job_id):
+                shutil.rmtree(entry.path, ignore_errors=True)
+                _release_job_lock(job_id)
+                result['deleted_dirs'] += 1
+    return result
+
+
+def _recover_media_jobs_periodically():
+    """Run recover_media_jobs once in RECOVERY_INTERVAL in each process (with the first job request)."""
+    global _last_recovery
+    with _job_locks_lock:
+        if _last_recovery and time.monotonic() - _last_recovery < RECOVERY_INTERVAL:
+            return
+        _last_recovery = time.monotonic()
+    try:
+        recover_media_jobs()
+    except Exception as e:
+        logger.exception(e)
+
+
+def submit_media_job(operation: str, uploaded_files: list, params: dict, user=None) -> MediaJobModel:
+    """
+    Queue a video processing operation and return its job right away.
+
+    The uploaded files are hard-linked out of the request first. The job has the "pending" status
+    until a worker thread gets a host slot, then "processing", and finally "done" with the
+    output paths in result, or "error". Jobs run in the worker process that accepted the request;
+    jobs left by a stopped process are taken over or failed by recover_media_jobs().
+    """
+    if operation not in MEDIA_OPERATIONS:
+        raise ValueError(f'Unknown media operation: {operation}.')
+    _recover_media_jobs_periodically()
+    job = MediaJobModel.objects.create(operation=operation, params=params, user=user)
+    job_dir = os.path.join(MEDIA_JOBS_PATH, str(job.id))
+    os.makedirs(job_dir, exist_ok=True)
+    _lock_job(job.id)
+    input_paths = []
+    try:
+        for i, uploaded_file in enumerate(uploaded_files):
+            input_path = os.path.join(job_dir, f'{i}{os.path.splitext(uploaded_file.name)[1]}')
+            link_uploaded_file(uploaded_file, input_path)
+            input_paths.append(input_path)
+            # Deletes the upload temporary file (or the chunked upload), the job has its own link
+            uploaded_file.close()
+        job.input_paths = input_paths
+        job.save(update_fields=['input_paths'])
+    except BaseException:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        _release_job_lock(job.id)
+        job.delete()
+        raise
+    _media_jobs_executor.submit(_media_job_thread, job.id)
+    return job
+
+
+def get_media_job(job_uuid: str, user=None) -> MediaJobModel:
+    """Return the job of the user, raising FileNotFoundError for unknown jobs."""
+    _recover_media_jobs_periodically()
+    try:
+        return MediaJobModel.objects.get(uuid=job_uuid, user=user)
+    except (MediaJobModel.DoesNotExist, ValueError):
+        raise FileNotFoundError(f"Job with UUID '{job_uuid}' not found.")
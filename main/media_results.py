@@ -0,0 +1,48 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+from django.core.cache import cache
+
+from app.settings import MEDIA_ROOT
+
+# Outputs are deleted by the video endpoints an hour after they were written (or returned from the cache)
+MEDIA_RESULT_CACHE_TTL = 3600
+
+
+def get_media_result_key(operation: str, uploaded_files: list, params: dict) -> Optional[str]:
+    """
+    Cache key of the output of a deterministic media operation: the content hashes of the input
+    files (computed while they were uploaded), the operation and its parameters.
+    None if the content hash of an input is not known.
+    """
+    content_hashes = [getattr(uploaded_file, 'content_hash', None) for uploaded_file in uploaded_files]
+    if not all(content_hashes):
+        return None
+    data = json.dumps([operation, content_hashes, params], sort_keys=True)
+    return f"media_result:{hashlib.blake2b(data.encode('utf-8'), digest_size=20).hexdigest()}"
+
+
+def get_cached_media_result(key: Optional[str]) -> Optional[str]:
+    """
+    Path (relative to MEDIA_ROOT) of the output of the same operation if the file is still present.
+    The file modification time is updated, so it is kept for another hour.
+    """
+    if key is None:
+        return None
+    media_path = cache.get(key)
+    if media_path is None:
+        return None
+    try:
+        os.utime(os.path.join(MEDIA_ROOT, media_path))
+    except FileNotFoundError:
+        cache.delete(key)
+        return None
+    cache.touch(key, MEDIA_RESULT_CACHE_TTL)
+    return media_path
+
+
+def cache_media_result(key: Optional[str], media_path: str):
+    if key is not None:
+        cache.set(key, media_path, MEDIA_RESULT_CACHE_TTL)
@@ -0,0 +1,151 @@
+import fcntl
+import logging
+import os
+from datetime import timedelta
+from typing import Optional
+
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+
+from app.settings import BASE_DIR, MEDIA_UPLOAD_MAX_BYTES, MEDIA_UPLOAD_EXPIRE_HOURS
+from main.models import MediaUploadModel
+from main.upload_handlers import get_file_content_hash
+
+logger = logging.getLogger(__name__)
+
+# Data of the resumable uploads, one file per upload growing with every appended chunk
+MEDIA_UPLOADS_PATH = os.path.join(BASE_DIR, 'media_uploads')
+
+UPLOAD_READ_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadOffsetConflict(UploadError):
+    pass
+
+
+class UploadTooLarge(UploadError):
+    pass
+
+
+class ChunkedUploadedFile(UploadedFile):
+    """
+    Completed chunked upload used in place of a multipart file field.
+
+    Like an upload temporary file, it is read in place by temporary_file_path(),
+    deleted by the code that processed it, or by close(). An upload can be used by one request.
+    """
+
+    def __init__(self, upload: MediaUploadModel):
+        self.upload = upload
+        self.content_hash = upload.content_hash
+        super().__init__(open(get_upload_path(upload), 'rb'), upload.file_name, upload.content_type, upload.size)
+
+    def temporary_file_path(self):
+        return get_upload_path(self.upload)
+
+    def close(self):
+        try:
+            return self.file.close()
+        finally:
+            delete_upload(self.upload)
+
+
+def get_upload_path(upload: MediaUploadModel) -> str:
+    return os.path.join(MEDIA_UPLOADS_PATH, f'{upload.uuid}.upload')
+
+
+def delete_upload(upload: MediaUploadModel):
+    try:
+        os.unlink(get_upload_path(upload))
+    except FileNotFoundError:
+        pass
+    MediaUploadModel.objects.filter(id=upload.id).delete()
+
+
+def delete_expired_uploads() -> int:
+    """Delete uploads (incomplete or not used) with no chunk appended for MEDIA_UPLOAD_EXPIRE_HOURS."""
+    expired = MediaUploadModel.objects.filter(
+        date_updated__lt=timezone.now() - timedelta(hours=MEDIA_UPLOAD_EXPIRE_HOURS))
+    deleted = 0
+    for upload in expired:
+        delete_upload(upload)
+        deleted += 1
+    return deleted
+
+
+def create_upload(file_name: str, content_type: str, size: int, user=None) -> MediaUploadModel:
+    """Start a resumable upload of a file of the given size, the data is appended with append_upload_chunk()."""
+    if size <= 0:
+        raise UploadError('Upload size must be positive.')
+    if size > MEDIA_UPLOAD_MAX_BYTES:
+        raise UploadTooLarge(f'Upload is too large. Maximum size is {MEDIA_UPLOAD_MAX_BYTES} bytes.')
+    delete_expired_uploads()
+    os.makedirs(MEDIA_UPLOADS_PATH, exist_ok=True)
+    upload = MediaUploadModel.objects.create(file_name=os.path.basename(file_name), content_type=content_type,
+                                             size=size, user=user)
+    open(get_upload_path(upload), 'wb').close()
+    return upload
+
+
+def get_upload(upload_id: str, user=None) -> MediaUploadModel:
+    """Return the upload of the user, raising FileNotFoundError for unknown, expired or used uploads."""
+    try:
+        upload = MediaUploadModel.objects.get(uuid=upload_id, user=user)
+    except (MediaUploadModel.DoesNotExist, ValueError):
+        raise FileNotFoundError(f"Upload with ID '{upload_id}' not found.")
+    if not os.path.isfile(get_upload_path(upload)):
+        raise FileNotFoundError(f"Upload with ID '{upload_id}' not found.")
+    return upload
+
+
+def get_upload_file(upload_id: str, user=None) -> ChunkedUploadedFile:
+    """Return the completed upload as an uploaded file."""
+    upload = get_upload(upload_id, user=user)
+    if upload.status != 'complete':
+        raise UploadError(f"Upload with ID '{upload_id}' is not complete ({upload.offset} of {upload.size} bytes).")
+    return ChunkedUploadedFile(upload)
+
+
+def append_upload_chunk(upload: MediaUploadModel, offset: int, stream, length: Optional[int]) -> int:
+    """
+    Append a chunk read from the stream to the upload and return the new offset.
+
+    The offset must be the size of the data received so far (the chunks are appended in order,
+    one at a time). Data read before a dropped connection is kept, so the client can resume
+    from the offset returned by the upload status.
+
+    The content hash of the file is computed once the last chunk is written, the same as for
+    files uploaded at once whatever the sizes of the chunks.
+    """
+    with open(get_upload_path(upload), 'ab') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadOffsetConflict('Another chunk of the upload is being written.')
+        current_offset = os.fstat(f.fileno()).st_size
+        if offset != current_offset:
+            raise UploadOffsetConflict(f'Upload offset is {current_offset}, not {offset}.')
+        remaining = upload.size - current_offset
+        if length is not None and length > remaining:
+            raise UploadTooLarge(f'Chunk exceeds the upload size by {length - remaining} bytes.')
+        if length is not None:
+            remaining = length
+        try:
+            while remaining > 0:
+                data = stream.read(min(UPLOAD_READ_BLOCK_SIZE, remaining))
+                if not data:
+                    break
+                f.write(data)
+                remaining -= len(data)
+        finally:
+            f.flush()
+            upload.offset = os.fstat(f.fileno()).st_size
+            upload.status = 'complete' if upload.offset == upload.size else 'uploading'
+            if upload.status == 'complete':
+                upload.content_hash = get_file_content_hash(get_upload_path(upload))
+            upload.save(update_fields=['offset', 'content_hash', 'status', 'date_updated'])
+    return upload.offset
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_mediauploadmodel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediauploadmodel',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
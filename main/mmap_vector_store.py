@@ -0,0 +1,233 @@
+import json
+import os
+from typing import Iterable, Optional
+
+import numpy as np
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+class MmapVectorStore(VectorStore):
+    """
+    Vector store kept in flat files without pickle.
+
+    Files in the store directory:
+    - vectors.bin: float32 (or float16) matrix of shape (count, dimensions), row-major;
+    - norms.bin: float32 squared L2 norms of the vectors;
+    - texts.bin: UTF-8 chunk texts one after another;
+    - offsets.bin: uint64 offsets of the texts in texts.bin (count + 1 values);
+    - mmap.json: dtype, dimensions and count.
+
+    Loaded stores memory-map the files read-only, so loading takes milliseconds and
+    all worker processes share the same page cache. Distances are squared L2, the same
+    as the flat FAISS index. Modifying a loaded store copies its data into memory.
+    """
+
+    META_FILE_NAME = 'mmap.json'
+    VECTORS_FILE_NAME = 'vectors.bin'
+    NORMS_FILE_NAME = 'norms.bin'
+    TEXTS_FILE_NAME = 'texts.bin'
+    OFFSETS_FILE_NAME = 'offsets.bin'
+
+    SEARCH_BLOCK_SIZE = 65536  # rows converted to float32 at once when searching fp16 vectors
+
+    def __init__(self, embedding_function: Embeddings, vectors: np.ndarray, norms: np.ndarray,
+                 texts_data, offsets: np.ndarray, dtype: str = 'float32'):
+        self.embedding_function = embedding_function
+        self.vectors = vectors
+        self.norms = norms
+        self.texts_data = texts_data
+        self.offsets = offsets
+        self.dtype = dtype
+        self._pending = []  # (vectors, norms, encoded texts) added since the last materialisation
+        self.lexical_index = None  # BM25 index of the chunks attached when the store is loaded
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding_function
+
+    @property
+    def memory_bytes(self) -> int:
+        """Size of the data held in process memory (memory-mapped files are not counted), lexical index included."""
+        self._materialize()
+        return sum(
+            array.nbytes for array in (self.vectors, self.norms, self.offsets)
+            if not isinstance(array, np.memmap)
+        ) + (0 if isinstance(self.texts_data, np.memmap) else len(self.texts_data)) + (
+            self.lexical_index.memory_bytes if self.lexical_index is not None else 0)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1 + sum(len(batch[2]) for batch in self._pending)
+
+    def get_text(self, i: int) -> str:
+        self._materialize()
+        return bytes(self.texts_data[int(self.offsets[i]):int(self.offsets[i + 1])]).decode('utf-8')
+
+    def iter_chunks(self):
+        """Yield (id, text) of every chunk in the store."""
+        for i in range(len(self)):
+            yield str(i), self.get_text(i)
+
+    @classmethod
+    def _empty(cls, embedding: Embeddings, dtype: str = 'float32') -> 'MmapVectorStore':
+        return cls(embedding, np.zeros((0, 0), dtype=dtype), np.zeros(0, dtype=np.float32),
+                   b'', np.zeros(1, dtype=np.uint64), dtype)
+
+    @classmethod
+    def from_embeddings(cls, text_embeddings: Iterable[tuple[str, list[float]]], embedding: Embeddings,
+                        dtype: str = 'float32', **kwargs) -> 'MmapVectorStore':
+        vector_store = cls._empty(embedding, dtype)
+        vector_store.add_embeddings(text_embeddings)
+        return vector_store
+
+    @classmethod
+    def from_texts(cls, texts: list[str], embedding: Embeddings, metadatas: Optional[list[dict]] = None,
+                   dtype: str = 'float32', **kwargs) -> 'MmapVectorStore':
+        return cls.from_embeddings(zip(texts, embedding.embed_documents(texts)), embedding, dtype)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[list[dict]] = None, **kwargs) -> list[str]:
+        texts = list(texts)
+        return self.add_embeddings(zip(texts, self.embedding_function.embed_documents(texts)))
+
+    def add_embeddings(self, text_embeddings: Iterable[tuple[str, list[float]]], **kwargs) -> list[str]:
+        text_embeddings = list(text_embeddings)
+        if not text_embeddings:
+            return []
+        start = len(self)
+        stored_vectors = np.asarray([vector for _, vector in text_embeddings], dtype=np.float32).astype(self.dtype)
+        rounded_vectors = stored_vectors.astype(np.float32)
+        norms = np.einsum('ij,ij->i', rounded_vectors, rounded_vectors)
+        encoded = [text.encode('utf-8') for text, _ in text_embeddings]
+        self._pending.append((stored_vectors, norms, encoded))
+        return [str(i) for i in range(start, start + len(text_embeddings))]
+
+    def _materialize(self):
+        """Merge the embeddings added since the last call into the arrays (one copy for many batches)."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        vectors = [batch[0] for batch in pending]
+        if len(self.offsets) > 1:
+            vectors.insert(0, np.asarray(self.vectors))
+        encoded = [text for batch in pending for text in batch[2]]
+        lengths = np.fromiter((len(text) for text in encoded), dtype=np.uint64, count=len(encoded))
+
+        self.vectors = np.concatenate(vectors)
+        self.norms = np.concatenate([np.asarray(self.norms)] + [batch[1] for batch in pending])
+        self.offsets = np.concatenate([np.asarray(self.offsets), self.offsets[-1] + np.cumsum(lengths)])
+        self.texts_data = bytes(self.texts_data) + b''.join(encoded)
+
+    def delete(self, ids: Optional[list[str]] = None, **kwargs) -> Optional[bool]:
+        if not ids:
+            return False
+        self._materialize()
+        keep = np.ones(len(self), dtype=bool)
+        keep[[int(i) for i in ids]] = False
+        kept_texts = [self.get_text(i).encode('utf-8') for i in np.flatnonzero(keep)]
+        lengths = np.fromiter((len(text) for text in kept_texts), dtype=np.uint64, count=len(kept_texts))
+
+        self.vectors = np.asarray(self.vectors)[keep]
+        self.norms = np.asarray(self.norms)[keep]
+        self.offsets = np.concatenate([np.zeros(1, dtype=np.uint64), np.cumsum(lengths)])
+        self.texts_data = b''.join(kept_texts)
+        return True
+
+    def save_local(self, folder_path: str):
+        self._materialize()
+        os.makedirs(folder_path, exist_ok=True)
+        count = len(self)
+        dimensions = self.vectors.shape[1] if count else 0
+        np.ascontiguousarray(self.vectors, dtype=self.dtype).tofile(os.path.join(folder_path, self.VECTORS_FILE_NAME))
+        np.ascontiguousarray(self.norms, dtype=np.float32).tofile(os.path.join(folder_path, self.NORMS_FILE_NAME))
+        np.ascontiguousarray(self.offsets, dtype=np.uint64).tofile(os.path.join(folder_path, self.OFFSETS_FILE_NAME))
+        with open(os.path.join(folder_path, self.TEXTS_FILE_NAME), 'wb') as f:
+            f.write(bytes(self.texts_data))
+        with open(os.path.join(folder_path, self.META_FILE_NAME), 'w', encoding='utf-8') as f:
+            json.dump({'dtype': self.dtype, 'dimensions': dimensions, 'count': count}, f)
+
+    @classmethod
+    def load_local(cls, folder_path: str, embeddings: Embeddings, **kwargs) -> 'MmapVectorStore':
+        with open(os.path.join(folder_path, cls.META_FILE_NAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        count, dimensions, dtype = meta['count'], meta['dimensions'], meta['dtype']
+        if not count:
+            return cls._empty(embeddings, dtype)
+
+        texts_path = os.path.join(folder_path, cls.TEXTS_FILE_NAME)
+        vectors = np.memmap(os.path.join(folder_path, cls.VECTORS_FILE_NAME), dtype=dtype, mode='r',
+                            shape=(count, dimensions))
+        norms = np.memmap(os.path.join(folder_path, cls.NORMS_FILE_NAME), dtype=np.float32, mode='r',
+                          shape=(count,))
+        offsets = np.memmap(os.path.join(folder_path, cls.OFFSETS_FILE_NAME), dtype=np.uint64, mode='r',
+                            shape=(count + 1,))
+        texts_data = np.memmap(texts_path, dtype=np.uint8, mode='r') if os.path.getsize(texts_path) else b''
+        return cls(embeddings, vectors, norms, texts_data, offsets, dtype)
+
+    def _distances(self, embedding: list[float]) -> np.ndarray:
+        """Squared L2 distances from the query to every vector, computed block by block."""
+        self._materialize()
+        query = np.asarray(embedding, dtype=np.float32)
+        count = len(self)
+        dots = np.empty(count, dtype=np.float32)
+        for start in range(0, count, self.SEARCH_BLOCK_SIZE):
+            block = self.vectors[start:start + self.SEARCH_BLOCK_SIZE]
+            dots[start:start + len(block)] = block.astype(np.float32, copy=False) @ query
+        return self.norms - 2 * dots + query @ query
+
+    def _nearest(self, embedding: list[float], k: int) -> tuple[np.ndarray, np.ndarray]:
+        distances = self._distances(embedding)
+        k = min(k, len(distances))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), distances
+        indices = np.argpartition(distances, k - 1)[:k]
+        return indices[np.argsort(distances[indices], kind='stable')], distances
+
+    def _document(self, i: int) -> Document:
+        return Document(page_content=self.get_text(int(i)), id=str(int(i)))
+
+    def get_by_ids(self, ids: list[str], /) -> list[Document]:
+        return [self._document(int(i)) for i in ids if 0 <= int(i) < len(self)]
+
+    def similarity_search_with_score_by_vector(self, embedding: list[float], k: int = 4,
+                                               **kwargs) -> list[tuple[Document, float]]:
+        indices, distances = self._nearest(embedding, k)
+        return [(self._document(i), float(distances[i])) for i in indices]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> list[tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding_function.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list[Document]:
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k)
+
+    def max_marginal_relevance_search_with_score_by_vector(self, embedding: list[float], *, k: int = 4,
+                                                            fetch_k: int = 20, lambda_mult: float = 0.5,
+                                                            **kwargs) -> list[tuple[Document, float]]:
+        indices, distances = self._nearest(embedding, fetch_k)
+        if not len(indices):
+            return []
+        candidates = np.asarray(self.vectors[indices], dtype=np.float32)
+        selected = maximal_marginal_relevance(
+            np.array([embedding], dtype=np.float32),
+            list(candidates),
+            k=min(k, len(indices)),
+            lambda_mult=lambda_mult,
+        )
+        return [(self._document(indices[i]), float(distances[indices[i]])) for i in selected]
+
+    def max_marginal_relevance_search_by_vector(self, embedding: list[float], k: int = 4, fetch_k: int = 20,
+                                                lambda_mult: float = 0.5, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.max_marginal_relevance_search_with_score_by_vector(
+            embedding, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult)]
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20,
+                                      lambda_mult: float = 0.5, **kwargs) -> list[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding_function.embed_query(query), k=k, fetch_k=fetch_k, lambda_mult=lambda_mult)
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
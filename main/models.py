@@ -91,3 +91,63 @@ class LogItemModel(models.Model):
     def __str__(self):
         return "%s-%s" % (self.owner.name, self.id)
 
+
+class MediaJobModel(models.Model):
+    OPERATION_CHOICES = (
+        ('extract_frame', 'Extract frame from video'),
+        ('replace_audio', 'Replace video audio'),
+        ('trim', 'Trim video'),
+        ('concatenate', 'Concatenate videos'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('error', 'Error'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    user = models.ForeignKey(User, related_name='media_jobs', on_delete=models.CASCADE, blank=True, null=True)
+    operation = models.CharField(max_length=30, choices=OPERATION_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    params = models.JSONField(blank=True, null=True)
+    input_paths = models.JSONField(blank=True, null=True)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_started = models.DateTimeField(blank=True, null=True)
+    date_finished = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'media_jobs'
+        verbose_name = 'Media job'
+
+    def __str__(self):
+        return "%s-%s" % (self.operation, self.uuid)
+
+
+class MediaUploadModel(models.Model):
+    STATUS_CHOICES = (
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    user = models.ForeignKey(User, related_name='media_uploads', on_delete=models.CASCADE, blank=True, null=True)
+    file_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        db_table = 'media_uploads'
+        verbose_name = 'Media upload'
+
+    def __str__(self):
+        return "%s-%s" % (self.file_name, self.uuid)
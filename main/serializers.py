@@ -258,6 +258,43 @@ class OpenAIEmbeddingsQuestionResponseSerializer(serializers.Serializer):
     success = serializers.BooleanField()
     answer = serializers.CharField()
 
+class OpenAIEmbeddingsSearchChunkSerializer(serializers.Serializer):
+    content = serializers.CharField()
+    score = serializers.FloatField(allow_null=True,
+                                   help_text='Squared L2 distance to the question, lower is closer.')
+    similarity_rank = serializers.IntegerField(allow_null=True,
+                                               help_text='Position among the fetch_k nearest chunks.')
+    lexical_rank = serializers.IntegerField(allow_null=True, help_text='Position among the BM25 matches (hybrid).')
+
+class OpenAIEmbeddingsSearchResponseSerializer(serializers.Serializer):
+    success = serializers.BooleanField()
+    search_type = serializers.ChoiceField(choices=['mmr', 'similarity', 'hybrid'])
+    chunks = OpenAIEmbeddingsSearchChunkSerializer(many=True)
+    timing = serializers.DictField(child=serializers.FloatField())
+
+class OpenAIEmbeddingsUpdateResponseSerializer(serializers.Serializer):
+    success = serializers.BooleanField()
+    store_uuid = serializers.CharField()
+    chunks_total = serializers.IntegerField()
+    chunks_added = serializers.IntegerField()
+    chunks_removed = serializers.IntegerField()
+    chunks_unchanged = serializers.IntegerField()
+
+class OpenAIEmbeddingsStoreStatusResponseSerializer(serializers.Serializer):
+    success = serializers.BooleanField()
+    store_uuid = serializers.CharField()
+    status = serializers.ChoiceField(choices=['pending', 'processing', 'ready', 'error'])
+    chunks_done = serializers.IntegerField(allow_null=True)
+    chunks_total = serializers.IntegerField(allow_null=True)
+    detail = serializers.CharField(required=False)
+
+class OpenAIEmbeddingsStoreStatsResponseSerializer(serializers.Serializer):
+    success = serializers.BooleanField()
+    cache = serializers.DictField()
+    query_embeddings = serializers.DictField()
+    answers = serializers.DictField()
+    storage = serializers.DictField()
+
 class VideoFrameExtractionRequestSerializer(serializers.Serializer):
     second = serializers.FloatField(default=0, required=False)
     is_last = serializers.BooleanField(default=False, required=False)
@@ -270,6 +307,17 @@ class VideoFrameExtractionErrorSerializer(serializers.Serializer):
     success = serializers.BooleanField()
     message = serializers.CharField()
 
+class VideoFramesExtractionResponseSerializer(serializers.Serializer):
+    success = serializers.BooleanField()
+    frames = serializers.ListField(child=serializers.DictField(), required=False)
+    sprite_url = serializers.CharField(required=False)
+    vtt_url = serializers.CharField(required=False)
+    timestamps = serializers.ListField(child=serializers.FloatField(), required=False)
+
+class VideoFramesExtractionErrorSerializer(serializers.Serializer):
+    success = serializers.BooleanField()
+    message = serializers.CharField()
+
 class VideoAudioReplacementRequestSerializer(serializers.Serializer):
     pass  # Files are handled via multipart/form-data
 
@@ -304,6 +352,44 @@ class VideoConcatenationErrorSerializer(serializers.Serializer):
     success = serializers.BooleanField()
     message = serializers.CharField()
 
+class MediaJobSubmitResponseSerializer(serializers.Serializer):
+    success = serializers.BooleanField()
+    job_uuid = serializers.UUIDField()
+    status = serializers.ChoiceField(choices=['pending', 'processing', 'done', 'error'])
+
+class MediaJobStatusResponseSerializer(serializers.Serializer):
+    success = serializers.BooleanField()
+    job_uuid = serializers.UUIDField()
+    operation = serializers.CharField(required=False)
+    status = serializers.ChoiceField(choices=['pending', 'processing', 'done', 'error'])
+    date_created = serializers.DateTimeField(required=False)
+    date_started = serializers.DateTimeField(required=False, allow_null=True)
+    date_finished = serializers.DateTimeField(required=False, allow_null=True)
+    message = serializers.CharField(required=False)
+
+class MediaJobResultResponseSerializer(serializers.Serializer):
+    success = serializers.BooleanField()
+    video_url = serializers.CharField(required=False)
+    image_url = serializers.CharField(required=False)
+
+class MediaUploadCreateRequestSerializer(serializers.Serializer):
+    file_name = serializers.CharField(max_length=255)
+    content_type = serializers.CharField(max_length=100)
+    size = serializers.IntegerField(min_value=1, help_text='File size in bytes (or the Upload-Length header).')
+
+class MediaUploadResponseSerializer(serializers.Serializer):
+    success = serializers.BooleanField()
+    upload_id = serializers.UUIDField()
+    file_name = serializers.CharField(required=False)
+    size = serializers.IntegerField(required=False)
+    offset = serializers.IntegerField(required=False)
+    status = serializers.ChoiceField(choices=['uploading', 'complete'], required=False)
+
+class MediaUploadErrorSerializer(serializers.Serializer):
+    success = serializers.BooleanField()
+    message = serializers.CharField()
+    offset = serializers.IntegerField(required=False)
+
 class WebsiteScreenshotRequestSerializer(serializers.Serializer):
     url = serializers.URLField(required=True)
     width = serializers.IntegerField(required=True, min_value=1, max_value=3840)
@@ -0,0 +1,661 @@
+"""
+Unit tests for vector store helpers (main/embeddings.py)
+"""
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import httpx
+import numpy as np
+from django.test import SimpleTestCase
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import FakeStreamingListLLM
+from openai import RateLimitError
+
+from main import embeddings, faiss_index
+from main.embeddings import VectorStoreCache, ChunkEmbeddingsCache, TTLCache
+from main.lexical_index import LexicalIndex
+from main.local_embeddings import HashingEmbeddings, get_local_embeddings_model
+from main.mmap_vector_store import MmapVectorStore
+
+
+class CountingEmbeddings(Embeddings):
+    """Fake embeddings model that records the texts it was asked to embed"""
+
+    def __init__(self):
+        self.embedded = []
+        self.queries = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text)), 1.0, 0.5]
+
+
+class VectorStoreCacheTestCase(SimpleTestCase):
+    """Test cases for the per-process loaded vector stores cache"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def create_store_dir(self, name, size):
+        """Helper method to create a fake store directory with a file of given size"""
+        storage_path = os.path.join(self.temp_dir.name, name)
+        os.makedirs(storage_path)
+        with open(os.path.join(storage_path, 'index.faiss'), 'wb') as f:
+            f.write(b'0' * size)
+        return storage_path
+
+    def test_hit_and_miss(self):
+        """Test that the second load of the same store is served from the cache"""
+        cache = VectorStoreCache(max_bytes=1000)
+        storage_path = self.create_store_dir('store', 100)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return object()
+
+        first = cache.get(storage_path, loader)
+        second = cache.get(storage_path, loader)
+
+        self.assertIs(first, second)
+        self.assertEqual(len(calls), 1)
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['current_bytes'], 100)
+
+    def test_lru_eviction_by_size(self):
+        """Test that the least recently used store is evicted when the size limit is exceeded"""
+        cache = VectorStoreCache(max_bytes=250)
+        path_a = self.create_store_dir('a', 100)
+        path_b = self.create_store_dir('b', 100)
+        path_c = self.create_store_dir('c', 100)
+
+        cache.get(path_a, object)
+        cache.get(path_b, object)
+        cache.get(path_a, object)
+        cache.get(path_c, object)
+
+        stats = cache.stats()
+        self.assertEqual(stats['items'], 2)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['current_bytes'], 200)
+
+        cache.get(path_a, object)
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def test_lru_eviction_by_count(self):
+        """Test that the number of cached stores is limited whatever their size"""
+        cache = VectorStoreCache(max_bytes=1000, max_items=2)
+        paths = [self.create_store_dir(name, 10) for name in 'abc']
+
+        for storage_path in paths:
+            cache.get(storage_path, object)
+
+        stats = cache.stats()
+        self.assertEqual(stats['items'], 2)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['current_bytes'], 20)
+
+    def test_store_larger_than_limit_is_not_cached(self):
+        """Test that a store larger than the whole cache is loaded but not kept"""
+        cache = VectorStoreCache(max_bytes=50)
+        storage_path = self.create_store_dir('big', 100)
+
+        cache.get(storage_path, object)
+
+        self.assertEqual(cache.stats()['items'], 0)
+        self.assertEqual(cache.stats()['current_bytes'], 0)
+
+    def test_mtime_invalidation(self):
+        """Test that a modified store is reloaded"""
+        cache = VectorStoreCache(max_bytes=1000)
+        storage_path = self.create_store_dir('store', 100)
+
+        first = cache.get(storage_path, object)
+        file_path = os.path.join(storage_path, 'index.faiss')
+        mtime = time.time() + 10
+        os.utime(file_path, (mtime, mtime))
+        second = cache.get(storage_path, object)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(cache.stats()['misses'], 2)
+        self.assertEqual(cache.stats()['items'], 1)
+
+
+class ChunkEmbeddingsCacheTestCase(SimpleTestCase):
+    """Test cases for the persistent chunk embeddings cache"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def test_unchanged_chunks_are_not_embedded_again(self):
+        """Test that only new chunks are sent to the embeddings model"""
+        model = CountingEmbeddings()
+        ChunkEmbeddingsCache(model, 'openai_test', self.temp_dir.name).embed_documents(['one', 'two'])
+
+        cache = ChunkEmbeddingsCache(model, 'openai_test', self.temp_dir.name)
+        vectors = cache.embed_documents(['one', 'three', 'two'])
+
+        self.assertEqual(model.embedded, ['one', 'two', 'three'])
+        self.assertEqual(vectors, [[3.0, 1.0, 0.5], [5.0, 1.0, 0.5], [3.0, 1.0, 0.5]])
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(cache.misses, 1)
+
+    def test_namespaces_are_separated(self):
+        """Test that vectors of different embedding models are not shared"""
+        model = CountingEmbeddings()
+        ChunkEmbeddingsCache(model, 'openai_model-a', self.temp_dir.name).embed_documents(['one'])
+        ChunkEmbeddingsCache(model, 'openai_model-b', self.temp_dir.name).embed_documents(['one'])
+
+        self.assertEqual(model.embedded, ['one', 'one'])
+
+
+class SlowFirstEmbeddings(CountingEmbeddings):
+    """Fake embeddings model answering the first requests last"""
+
+    def __init__(self):
+        super().__init__()
+        self.delays = [0.2, 0.1, 0.0]
+
+    def embed_documents(self, texts):
+        time.sleep(self.delays.pop(0) if self.delays else 0.0)
+        return super().embed_documents(texts)
+
+
+def create_rate_limit_error():
+    request = httpx.Request('POST', 'https://api.openai.com/v1/embeddings')
+    return RateLimitError('Rate limit exceeded', response=httpx.Response(429, request=request), body=None)
+
+
+class BuildVectorStoreTestCase(SimpleTestCase):
+    """Test cases for the batched and concurrent embedding of the chunks of a new store"""
+
+    def test_batches_are_added_in_order(self):
+        """Test that the vectors of batches completed out of order are added in the order of the texts"""
+        texts = ['a' * length for length in range(1, 8)]
+        progress = []
+
+        vector_store = embeddings._build_vector_store(
+            texts, SlowFirstEmbeddings(), batch_size=3, max_concurrency=3,
+            progress_callback=lambda done, total: progress.append((done, total)))
+
+        self.assertEqual([text for _, text in embeddings._get_store_chunks(vector_store)], texts)
+        vectors = vector_store.index.reconstruct_n(0, len(texts))
+        self.assertEqual(vectors[:, 0].tolist(), [float(len(text)) for text in texts])
+        self.assertEqual(progress, [(3, 7), (6, 7), (7, 7)])
+
+    def test_rate_limit_is_retried(self):
+        """Test that a batch is retried after a rate limit error"""
+        model = CountingEmbeddings()
+        errors = [create_rate_limit_error(), create_rate_limit_error()]
+        embed_documents = model.embed_documents
+
+        def rate_limited_embed_documents(texts):
+            if errors:
+                raise errors.pop()
+            return embed_documents(texts)
+
+        with mock.patch.object(model, 'embed_documents', side_effect=rate_limited_embed_documents), \
+                mock.patch.object(embeddings.time, 'sleep') as sleep:
+            vectors = embeddings._embed_batch_with_retry(model, ['one', 'three'], max_retries=2)
+
+        self.assertEqual(vectors, [[3.0, 1.0, 0.5], [5.0, 1.0, 0.5]])
+        self.assertEqual(sleep.call_count, 2)
+        # Exponential backoff
+        self.assertGreaterEqual(sleep.call_args_list[1].args[0], 2 * embeddings.EMBEDDINGS_RETRY_DELAY)
+
+    def test_rate_limit_error_after_retries(self):
+        """Test that the rate limit error is raised once the retries are exhausted"""
+        model = CountingEmbeddings()
+        with mock.patch.object(model, 'embed_documents', side_effect=create_rate_limit_error()) as embed_documents, \
+                mock.patch.object(embeddings.time, 'sleep') as sleep:
+            with self.assertRaises(RateLimitError):
+                embeddings._embed_batch_with_retry(model, ['one'], max_retries=2)
+
+        self.assertEqual(embed_documents.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+
+class TTLCacheTestCase(SimpleTestCase):
+    """Test cases for the question embeddings and answers caches"""
+
+    def test_expiration_and_size_limit(self):
+        """Test that entries expire after ttl and the least recently used entry is evicted"""
+        cache = TTLCache(ttl=60, max_items=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        with mock.patch.object(embeddings.time, 'monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['items'], 1)
+
+    def test_disabled(self):
+        """Test that nothing is stored with zero ttl"""
+        cache = TTLCache(ttl=0, max_items=10)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+    def test_repeated_question_is_embedded_once(self):
+        """Test that the same question with different case and spaces is embedded only once"""
+        model = CountingEmbeddings()
+        cache = TTLCache(ttl=60, max_items=10)
+        with mock.patch.object(embeddings, 'query_embeddings_cache', cache):
+            query_model = embeddings.QueryEmbeddingsCache(model, 'openai_test')
+            first = query_model.embed_query('What are your opening hours?')
+            second = query_model.embed_query('  what are your   opening hours? ')
+
+        self.assertEqual(first, second)
+        self.assertEqual(model.queries, ['What are your opening hours?'])
+
+
+class HashingEmbeddingsTestCase(SimpleTestCase):
+    """Test cases for the deterministic hashing embeddings"""
+
+    def test_vectors(self):
+        """Test that vectors are deterministic, normalised and closer for texts sharing words"""
+        model = get_local_embeddings_model('hashing:64')
+        query, related, other = model.embed_documents([
+            'What are your opening hours?', 'Our opening hours are 9 to 5.', 'Delivery costs nothing.'
+        ])
+
+        self.assertEqual(len(query), 64)
+        self.assertEqual(query, HashingEmbeddings(64).embed_query('What are your opening hours?'))
+        self.assertAlmostEqual(float(np.linalg.norm(query)), 1.0, places=5)
+        self.assertGreater(np.dot(query, related), np.dot(query, other))
+
+    def test_store_is_queried_with_its_model(self):
+        """Test that a store built with a local model is searched with the same model"""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        source = '# Shop\n\n## Hours\n\nOur opening hours are 9 to 5.\n\n## Delivery\n\nDelivery costs nothing.\n'
+        with mock.patch.object(embeddings, 'VECTOR_STORAGE_PATH', os.path.join(temp_dir.name, 'stores')), \
+                mock.patch.object(embeddings, 'EMBEDDINGS_CACHE_PATH', os.path.join(temp_dir.name, 'cache')):
+            store_uuid = embeddings.create_docs_embeddings(source, model='hashing')
+            result = embeddings.search_store('opening hours', store_uuid, k=1, search_type='similarity')
+
+        self.assertIn('opening hours', result['chunks'][0]['content'])
+
+    def test_hybrid_search_finds_exact_identifiers(self):
+        """Test that docs mode stores fuse BM25 matches of exact identifiers into the results"""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        sections = ''.join(f'## Method {i}\n\nReturns the value number {i} of the list.\n\n' for i in range(30))
+        source = '# API\n\n' + sections + '## Other\n\nCall `get_store_status_v2` to poll the job.\n'
+        with mock.patch.object(embeddings, 'VECTOR_STORAGE_PATH', os.path.join(temp_dir.name, 'stores')), \
+                mock.patch.object(embeddings, 'EMBEDDINGS_CACHE_PATH', os.path.join(temp_dir.name, 'cache')):
+            store_uuid = embeddings.create_docs_embeddings(source, model='hashing', chunk_size=60, chunk_overlap=0,
+                                                           storage_format='mmap')
+            question = 'How to use get_store_status_v2?'
+            result = embeddings.search_store(question, store_uuid, k=3)
+            vector_only = embeddings.search_store(question, store_uuid, k=3, search_type='mmr')
+
+        self.assertEqual(result['search_type'], 'hybrid')
+        self.assertTrue(any('get_store_status_v2' in chunk['content'] and chunk['lexical_rank'] == 1
+                            for chunk in result['chunks']))
+        self.assertEqual(len(result['chunks']), 3)
+        self.assertIsNone(vector_only['chunks'][0]['lexical_rank'])
+
+    def test_invalid_model_name(self):
+        """Test that a malformed model name raises ValueError"""
+        with self.assertRaises(ValueError):
+            get_local_embeddings_model('hashing:many')
+
+
+class MarkdownChunkerTestCase(SimpleTestCase):
+    """Test cases for the docs mode markdown chunker"""
+
+    def test_sections_and_breadcrumbs(self):
+        """Test that small sibling sections are merged and every chunk starts with its breadcrumb"""
+        source = '# Guide\n\n## Install\n\nRun pip.\n\n## Usage\n\nCall it.\n\n# API\n\n## Methods\n\nGet.\n'
+
+        chunks = embeddings._split_markdown_docs(source, 2000, 200)
+
+        self.assertEqual(chunks, [
+            '[Document Overview]\n\n- Guide\n  - Install\n  - Usage\n- API\n  - Methods',
+            '[Guide > Install]\n\n# Guide  \n## Install  \nRun pip.\n\n## Usage  \nCall it.',
+            '[API > Methods]\n\n# API  \n## Methods  \nGet.',
+        ])
+
+    def test_code_blocks_in_oversized_section(self):
+        """Test that code blocks of a long section are kept whole, once and in order"""
+        code_blocks = [f'```\nblock_{i} = {i}\n```' for i in range(3)]
+        source = '## Long\n\n' + '\n\n'.join(f'{"Text. " * 20}\n\n{code}' for code in code_blocks)
+
+        chunks = embeddings._split_markdown_docs(source, 200, 20)
+        text = '\n'.join(chunks)
+
+        for code in code_blocks:
+            self.assertEqual(text.count(code), 1)
+        self.assertLess(text.index('block_0'), text.index('block_1'))
+        self.assertLess(text.index('block_1'), text.index('block_2'))
+
+
+class UpdateStoreEmbeddingsTestCase(SimpleTestCase):
+    """Test cases for the incremental update of an existing store"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.model = CountingEmbeddings()
+        for patcher in (
+            mock.patch.object(embeddings, 'VECTOR_STORAGE_PATH', os.path.join(self.temp_dir.name, 'stores')),
+            mock.patch.object(embeddings, 'EMBEDDINGS_CACHE_PATH', os.path.join(self.temp_dir.name, 'cache')),
+            mock.patch.object(embeddings, '_build_embeddings_model', return_value=self.model),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_only_changed_chunks_are_embedded(self):
+        """Test that the update embeds new chunks and deletes removed ones"""
+        source = '# Title\n\n## One\n\nFirst section.\n\n# Other\n\n## Two\n\nSecond section.\n'
+        store_uuid = embeddings.create_docs_embeddings(source, api_key='test')
+        embedded_before = len(self.model.embedded)
+
+        updated = source.replace('Second section.', 'Second section, changed.')
+        result = embeddings.update_store_embeddings(store_uuid, updated, api_key='test')
+
+        self.assertEqual(result['chunks_added'], 1)
+        self.assertEqual(result['chunks_removed'], 1)
+        self.assertEqual(result['chunks_unchanged'], result['chunks_total'] - 1)
+        new_texts = self.model.embedded[embedded_before:]
+        self.assertEqual(len(new_texts), 1)
+        self.assertIn('Second section, changed.', new_texts[0])
+
+        vector_store = embeddings._load_vector_store(embeddings._get_storage_path(store_uuid), self.model)
+        contents = [vector_store.docstore.search(doc_id).page_content
+                    for doc_id in vector_store.index_to_docstore_id.values()]
+        self.assertEqual(sorted(contents), sorted(embeddings._split_markdown_docs(updated, 2000, 200)))
+
+    def test_update_mmap_store(self):
+        """Test that stores in the memory-mapped format are updated in place"""
+        source = '# Title\n\n## One\n\nFirst section.\n\n# Other\n\n## Two\n\nSecond section.\n'
+        store_uuid = embeddings.create_docs_embeddings(source, api_key='test', storage_format='mmap')
+        updated = source.replace('Second section.', 'Second section, changed.')
+
+        result = embeddings.update_store_embeddings(store_uuid, updated, api_key='test')
+
+        self.assertEqual(result['chunks_added'], 1)
+        vector_store = embeddings._load_vector_store(embeddings._get_storage_path(store_uuid), self.model)
+        self.assertIsInstance(vector_store, MmapVectorStore)
+        contents = [text for _, text in vector_store.iter_chunks()]
+        self.assertEqual(sorted(contents), sorted(embeddings._split_markdown_docs(updated, 2000, 200)))
+
+    def test_store_is_not_read_while_files_are_replaced(self):
+        """Test that loading a store waits until all its files have been replaced"""
+        store_uuid = embeddings.create_docs_embeddings('# Title\n\nSome text.\n', api_key='test',
+                                                       storage_format='mmap')
+        storage_path = embeddings._get_storage_path(store_uuid)
+        loaded = []
+        reader = threading.Thread(target=lambda: loaded.append(embeddings._read_vector_store(storage_path, self.model)))
+
+        with embeddings._store_files_lock(storage_path, exclusive=True):
+            reader.start()
+            reader.join(0.2)
+            self.assertEqual(loaded, [])
+        reader.join(5)
+
+        self.assertIsInstance(loaded[0], MmapVectorStore)
+        self.assertEqual(loaded[0].get_text(len(loaded[0]) - 1).strip()[-10:], 'Some text.')
+
+    def test_search_store(self):
+        """Test that the search returns ranked chunks with scores and timing"""
+        source = '# Title\n\n## One\n\nFirst section.\n\n## Two\n\nSecond, much longer section text.\n'
+        store_uuid = embeddings.create_docs_embeddings(source, api_key='test')
+
+        result = embeddings.search_store('question', store_uuid, k=2, search_type='similarity', api_key='test')
+
+        self.assertEqual(len(result['chunks']), 2)
+        self.assertEqual([chunk['similarity_rank'] for chunk in result['chunks']], [1, 2])
+        scores = [chunk['score'] for chunk in result['chunks']]
+        self.assertEqual(scores, sorted(scores))
+        self.assertGreaterEqual(result['timing']['total_ms'], result['timing']['search_ms'])
+
+        mmr = embeddings.search_store('question', store_uuid, k=2, search_type='mmr', api_key='test')
+        self.assertEqual(mmr['search_type'], 'mmr')
+        self.assertEqual(len(mmr['chunks']), 2)
+        with self.assertRaises(ValueError):
+            embeddings.search_store('question', store_uuid, search_type='unknown', api_key='test')
+
+    def test_answer_cache_is_invalidated_on_update(self):
+        """Test that a repeated question is answered from the cache until the store changes"""
+        source = '# Title\n\n## One\n\nFirst section.\n'
+        store_uuid = embeddings.create_docs_embeddings(source, api_key='test')
+        qa_chain = mock.Mock()
+        qa_chain.invoke.return_value = {'answer': 'Answer'}
+
+        with mock.patch.object(embeddings, 'answers_cache', TTLCache(ttl=60, max_items=10)), \
+                mock.patch.object(embeddings, 'ChatOpenAI'), \
+                mock.patch.object(embeddings, 'create_stuff_documents_chain'), \
+                mock.patch.object(embeddings, 'create_retrieval_chain', return_value=qa_chain):
+            for _ in range(2):
+                answer = embeddings.get_answer_with_embeddings('Question?', store_uuid, api_key='test')
+            self.assertEqual(answer, 'Answer')
+            self.assertEqual(qa_chain.invoke.call_count, 1)
+
+            storage_path = embeddings._get_storage_path(store_uuid)
+            mtime = time.time() + 10
+            os.utime(os.path.join(storage_path, 'store.json'), (mtime, mtime))
+            embeddings.get_answer_with_embeddings('question? ', store_uuid, api_key='test')
+            self.assertEqual(qa_chain.invoke.call_count, 2)
+
+    def test_stream_answer(self):
+        """Test that the answer is streamed in pieces"""
+        chat_model = FakeStreamingListLLM(responses=['Streamed answer'])
+        with mock.patch.object(embeddings, 'ChatOpenAI', return_value=chat_model):
+            tokens = list(embeddings.stream_answer_with_embeddings('Question?', ['Context'], api_key='test'))
+
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual(''.join(tokens), 'Streamed answer')
+
+    def test_store_job(self):
+        """Test that a store built in background reports progress and becomes ready"""
+        source = '# Title\n\n## One\n\nFirst section.\n\n## Two\n\nSecond section.\n'
+        store_uuid = embeddings.create_store_job(source, api_key='test')
+
+        for _ in range(100):
+            store_status = embeddings.get_store_status(store_uuid)
+            if store_status['status'] in ('ready', 'error'):
+                break
+            time.sleep(0.05)
+
+        self.assertEqual(store_status['status'], 'ready')
+        self.assertEqual(store_status['chunks_done'], store_status['chunks_total'])
+        self.assertGreater(store_status['chunks_total'], 0)
+
+    def test_lost_store_job(self):
+        """Test that a store left processing by a restarted worker reports an error"""
+        store_uuid = embeddings.create_store_job('# Title\n\nSome text.\n', api_key='test')
+        for _ in range(100):
+            if embeddings.get_store_status(store_uuid)['status'] == 'ready':
+                break
+            time.sleep(0.05)
+        storage_path = os.path.join(embeddings.VECTOR_STORAGE_PATH, store_uuid)
+        meta = embeddings._read_store_meta(storage_path)
+        embeddings._write_store_meta(storage_path, {**meta, 'status': 'processing'})
+        self.assertEqual(embeddings.get_store_status(store_uuid)['status'], 'processing')
+
+        stale_time = time.time() - embeddings.STALE_TEMP_DIR_AGE - 1
+        os.utime(os.path.join(storage_path, embeddings.STORE_META_FILE_NAME), (stale_time, stale_time))
+        store_status = embeddings.get_store_status(store_uuid)
+
+        self.assertEqual(store_status['status'], 'error')
+        self.assertEqual(store_status['detail'], embeddings.STORE_JOB_LOST_ERROR)
+        with self.assertRaisesMessage(RuntimeError, embeddings.STORE_JOB_LOST_ERROR):
+            embeddings.search_store('Title', store_uuid, api_key='test')
+
+    def test_unknown_store(self):
+        """Test that updating a missing store raises FileNotFoundError"""
+        with self.assertRaises(FileNotFoundError):
+            embeddings.update_store_embeddings('../../etc', 'text', api_key='test')
+
+
+class MmapVectorStoreTestCase(SimpleTestCase):
+    """Test cases for the memory-mapped vector store format"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        rnd = np.random.default_rng(0)
+        self.texts = [f'Chunk {i} текст' for i in range(50)]
+        self.vectors = rnd.standard_normal((50, 8)).astype(np.float32)
+        self.model = CountingEmbeddings()
+
+    def test_save_load_and_search(self):
+        """Test that a loaded store returns the same neighbours as the FAISS flat index"""
+        text_embeddings = list(zip(self.texts, self.vectors.tolist()))
+        MmapVectorStore.from_embeddings(text_embeddings, self.model).save_local(self.temp_dir.name)
+        vector_store = MmapVectorStore.load_local(self.temp_dir.name, self.model)
+        faiss_store = FAISS.from_embeddings(text_embeddings, self.model)
+
+        self.assertIsInstance(vector_store.vectors, np.memmap)
+        self.assertEqual(vector_store.memory_bytes, 0)
+        self.assertEqual(len(vector_store), 50)
+        self.assertEqual(vector_store.get_text(3), 'Chunk 3 текст')
+
+        query = self.vectors[7].tolist()
+        expected = faiss_store.similarity_search_with_score_by_vector(query, k=5)
+        result = vector_store.similarity_search_with_score_by_vector(query, k=5)
+        self.assertEqual([doc.page_content for doc, _ in result], [doc.page_content for doc, _ in expected])
+        for (_, score), (_, expected_score) in zip(result, expected):
+            self.assertAlmostEqual(score, expected_score, places=3)
+
+        mmr_docs = vector_store.max_marginal_relevance_search_by_vector(query, k=3, fetch_k=10)
+        self.assertEqual(len(mmr_docs), 3)
+        self.assertEqual(mmr_docs[0].page_content, 'Chunk 7 текст')
+
+        # The lexical index is held in process memory
+        vector_store.lexical_index = LexicalIndex.build(vector_store.iter_chunks())
+        self.assertEqual(vector_store.memory_bytes, vector_store.lexical_index.memory_bytes)
+        self.assertGreater(vector_store.memory_bytes, 50 * 60)
+
+    def test_fp16_and_delete(self):
+        """Test that float16 stores keep the order of neighbours and deleted chunks are not returned"""
+        vector_store = MmapVectorStore.from_embeddings(zip(self.texts, self.vectors.tolist()), self.model,
+                                                       dtype='float16')
+        vector_store.delete(['7'])
+        vector_store.save_local(self.temp_dir.name)
+        vector_store = MmapVectorStore.load_local(self.temp_dir.name, self.model)
+
+        self.assertEqual(vector_store.vectors.dtype, np.float16)
+        self.assertEqual(len(vector_store), 49)
+        self.assertNotIn('Chunk 7 текст', [text for _, text in vector_store.iter_chunks()])
+        result = vector_store.similarity_search_by_vector(self.vectors[8].tolist(), k=1)
+        self.assertEqual(result[0].page_content, 'Chunk 8 текст')
+
+
+class FaissIndexTestCase(SimpleTestCase):
+    """Test cases for the approximate nearest neighbour indexes of FAISS stores"""
+
+    def test_index_types(self):
+        """Test that every index type finds the nearest vectors"""
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(20, 32))
+        vectors = (centers[rng.integers(0, 20, 10000)] + rng.normal(scale=0.1, size=(10000, 32))).astype(np.float32)
+        queries = vectors[:50] + rng.normal(scale=0.01, size=(50, 32)).astype(np.float32)
+
+        self.assertEqual(faiss_index.choose_index_type(1000, 'auto'), 'flat')
+        self.assertEqual(faiss_index.choose_index_type(2_000_000, 'auto'), 'ivfpq')
+        for index_type in faiss_index.INDEX_TYPES:
+            index = faiss_index.create_index(vectors, index_type)
+            self.assertEqual(faiss_index.get_index_type(index), index_type)
+            _, ids = index.search(queries, 1)
+            recall = float(np.mean(ids[:, 0] == np.arange(50)))
+            self.assertGreaterEqual(recall, 0.9 if index_type == 'ivfpq' else 0.98, index_type)
+        with self.assertRaises(ValueError):
+            faiss_index.choose_index_type(10, 'unknown')
+
+    def test_update_hnsw_store(self):
+        """Test that a store with an approximate index is saved, loaded and updated"""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        model = CountingEmbeddings()
+        source = '# Title\n\n## One\n\nFirst section.\n\n# Other\n\n## Two\n\nSecond section.\n'
+        updated = source.replace('Second section.', 'Second section, changed.')
+        with mock.patch.object(embeddings, 'VECTOR_STORAGE_PATH', os.path.join(temp_dir.name, 'stores')), \
+                mock.patch.object(embeddings, 'EMBEDDINGS_CACHE_PATH', os.path.join(temp_dir.name, 'cache')), \
+                mock.patch.object(embeddings, '_build_embeddings_model', return_value=model), \
+                mock.patch.object(faiss_index, 'FAISS_INDEX_TYPE', 'hnsw'):
+            store_uuid = embeddings.create_docs_embeddings(source, api_key='test')
+            storage_path = embeddings._get_storage_path(store_uuid)
+            self.assertEqual(embeddings._read_store_meta(storage_path)['index_type'], 'hnsw')
+
+            result = embeddings.update_store_embeddings(store_uuid, updated, api_key='test')
+
+            self.assertEqual(result['chunks_added'], 1)
+            vector_store = embeddings._load_vector_store(storage_path, model)
+            self.assertEqual(faiss_index.get_index_type(vector_store.index), 'hnsw')
+            self.assertEqual(vector_store.index.hnsw.efSearch, faiss_index.FAISS_EF_SEARCH)
+            contents = [vector_store.docstore.search(doc_id).page_content
+                        for doc_id in vector_store.index_to_docstore_id.values()]
+            self.assertEqual(sorted(contents), sorted(embeddings._split_markdown_docs(updated, 2000, 200)))
+            changed = next(content for content in contents if 'changed' in content)
+            found = embeddings.search_store(changed, store_uuid, k=1, search_type='similarity', api_key='test')
+            self.assertEqual(found['chunks'][0]['content'], changed)
+
+
+class StoreGarbageCollectionTestCase(SimpleTestCase):
+    """Test cases for the last access tracking and eviction of stores"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.model = CountingEmbeddings()
+        for patcher in (
+            mock.patch.object(embeddings, 'VECTOR_STORAGE_PATH', os.path.join(self.temp_dir.name, 'stores')),
+            mock.patch.object(embeddings, 'EMBEDDINGS_CACHE_PATH', os.path.join(self.temp_dir.name, 'cache')),
+            mock.patch.object(embeddings, '_build_embeddings_model', return_value=self.model),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def create_store(self, text, age_days):
+        store_uuid = embeddings.create_and_store_embeddings(text, api_key='test')
+        accessed = time.time() - age_days * 86400
+        os.utime(embeddings._get_storage_path(store_uuid), (accessed, accessed))
+        return store_uuid
+
+    def test_question_updates_last_access_only(self):
+        """Test that a question marks the store as accessed without changing its files"""
+        store_uuid = self.create_store('Some text.', age_days=10)
+        storage_path = embeddings._get_storage_path(store_uuid)
+        files_mtime = embeddings.VectorStoreCache._stat_store(storage_path)[0]
+
+        embeddings.search_store('question', store_uuid, search_type='similarity', api_key='test')
+
+        self.assertAlmostEqual(os.stat(storage_path).st_mtime, time.time(), delta=5)
+        self.assertEqual(embeddings.VectorStoreCache._stat_store(storage_path)[0], files_mtime)
+
+    def test_eviction(self):
+        """Test eviction by age, then by LRU order under the total size quota"""
+        old_uuid = self.create_store('Old store.', age_days=100)
+        lru_uuid = self.create_store('Least recently used store.', age_days=5)
+        recent_uuid = self.create_store('Recently used store.', age_days=1)
+        os.makedirs(os.path.join(embeddings.VECTOR_STORAGE_PATH, f'{recent_uuid}.abc.tmp'))
+        stats = embeddings.get_storage_stats()
+        self.assertEqual(stats['stores'], 3)
+        store_bytes = stats['largest'][0]['bytes']
+
+        result = embeddings.collect_garbage(max_age_days=30, max_total_bytes=store_bytes + 1, dry_run=True)
+        self.assertEqual([(store['uuid'], store['reason']) for store in result['deleted']],
+                         [(old_uuid, 'age'), (lru_uuid, 'quota')])
+        self.assertEqual(embeddings.get_storage_stats()['stores'], 3)
+
+        embeddings.collect_garbage(max_age_days=30, max_total_bytes=store_bytes + 1)
+        self.assertEqual(sorted(os.listdir(embeddings.VECTOR_STORAGE_PATH)), [recent_uuid, f'{recent_uuid}.abc.tmp'])
+        with self.assertRaises(FileNotFoundError):
+            embeddings.search_store('question', old_uuid, api_key='test')
@@ -0,0 +1,589 @@
+"""
+Unit tests for video processing helpers (main/lib_ffmpeg.py)
+"""
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from main import lib_ffmpeg, media_jobs, media_results, media_uploads
+from main.upload_handlers import HashingTemporaryFileUploadHandler
+
+HAS_FFMPEG = os.path.exists(lib_ffmpeg.FFMPEG_PATH) and os.path.exists(lib_ffmpeg.FFPROBE_PATH)
+
+
+def create_test_video(output_path: str, width: int = 320, height: int = 240, duration: float = 2,
+                      fps: int = 25, gop: int = 25, with_audio: bool = True):
+    """Create a test video (test pattern and sine tone) using ffmpeg."""
+    cmd = [lib_ffmpeg.FFMPEG_PATH, '-v', 'error', '-f', 'lavfi', '-i', f'testsrc=s={width}x{height}:d={duration}:r={fps}']
+    if with_audio:
+        cmd += ['-f', 'lavfi', '-i', f'sine=d={duration}', '-c:a', 'aac', '-shortest']
+    cmd += ['-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-g', str(gop), '-y', output_path]
+    subprocess.run(cmd, check=True, capture_output=True)
+    return output_path
+
+
+@skipUnless(HAS_FFMPEG, 'ffmpeg is not installed')
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ProbeMediaTestCase(SimpleTestCase):
+    """Test cases for media probing"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.video_path = create_test_video(os.path.join(cls.temp_dir, 'video.mp4'))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_probe_media(self):
+        """Test that a single probe returns the container and stream information"""
+        info = lib_ffmpeg.probe_media(self.video_path)
+
+        self.assertAlmostEqual(info['duration'], 2.0, delta=0.1)
+        self.assertEqual((info['width'], info['height'], info['fps']), (320, 240, 25.0))
+        self.assertEqual(info['video']['codec_name'], 'h264')
+        self.assertEqual(info['audio']['codec_name'], 'aac')
+        self.assertEqual(lib_ffmpeg.get_video_dimensions(self.video_path), (320, 240))
+        self.assertIsNone(lib_ffmpeg.probe_media(os.path.join(self.temp_dir, 'missing.mp4')))
+
+    def test_same_content_is_probed_once(self):
+        """Test that a file with an already probed content hash is served from the cache"""
+        copy_path = os.path.join(self.temp_dir, 'copy.mp4')
+        shutil.copy(self.video_path, copy_path)
+        lib_ffmpeg.probe_media(self.video_path, content_hash='same')
+
+        with mock.patch.object(lib_ffmpeg, '_run_ffprobe', wraps=lib_ffmpeg._run_ffprobe) as run_ffprobe:
+            info = lib_ffmpeg.probe_media(copy_path, content_hash='same')
+            lib_ffmpeg.probe_media(copy_path, content_hash='other')
+            # Files with no known content hash are not cached
+            lib_ffmpeg.probe_media(copy_path)
+            lib_ffmpeg.probe_media(copy_path)
+
+        self.assertEqual(info['width'], 320)
+        self.assertEqual(run_ffprobe.call_count, 3)
+
+
+class UploadedFilesTestCase(SimpleTestCase):
+    """Test cases for passing uploaded files to ffmpeg without copying them"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+        self.uploaded_file = TemporaryUploadedFile('video.mp4', 'video/mp4', 4, None)
+        self.uploaded_file.write(b'data')
+        self.uploaded_file.flush()
+        self.addCleanup(self.uploaded_file.close)
+
+    def test_upload_temporary_file_is_used_in_place(self):
+        """Test that files written to disk by the upload handler are not copied"""
+        self.assertEqual(lib_ffmpeg.get_uploaded_file_path(self.uploaded_file),
+                         self.uploaded_file.temporary_file_path())
+
+        in_memory_path = lib_ffmpeg.get_uploaded_file_path(SimpleUploadedFile('video.mp4', b'data'), suffix='.mp4')
+        self.addCleanup(os.unlink, in_memory_path)
+        self.assertTrue(in_memory_path.endswith('.mp4'))
+
+    def test_link_uploaded_file(self):
+        """Test that an upload is hard-linked to the target path and survives the request"""
+        target_path = os.path.join(self.temp_dir, 'input.mp4')
+
+        lib_ffmpeg.link_uploaded_file(self.uploaded_file, target_path)
+        self.assertEqual(os.stat(target_path).st_ino, os.stat(self.uploaded_file.temporary_file_path()).st_ino)
+        self.uploaded_file.close()
+
+        self.assertEqual(os.stat(target_path).st_nlink, 1)
+        with open(target_path, 'rb') as f:
+            self.assertEqual(f.read(), b'data')
+
+
+@skipUnless(HAS_FFMPEG, 'ffmpeg is not installed')
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ConcatenateVideosTestCase(SimpleTestCase):
+    """Test cases for video concatenation"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+        self.output_path = os.path.join(self.temp_dir, 'output.mp4')
+
+    def test_matching_videos_are_not_reencoded(self):
+        """Test that videos with the same parameters are joined with stream copy"""
+        video_paths = [create_test_video(os.path.join(self.temp_dir, f'{i}.mp4'), duration=1 + i) for i in range(2)]
+
+        with mock.patch.object(lib_ffmpeg, '_scale_video') as scale_video:
+            success, error_message = lib_ffmpeg.concatenate_videos(video_paths, self.output_path)
+
+        self.assertTrue(success, error_message)
+        scale_video.assert_not_called()
+        self.assertAlmostEqual(lib_ffmpeg.probe_media(self.output_path)['duration'], 3.0, delta=0.2)
+
+    def test_different_videos_are_scaled(self):
+        """Test that videos with different dimensions are scaled to the first one"""
+        video_paths = [
+            create_test_video(os.path.join(self.temp_dir, 'large.mp4'), 320, 240),
+            create_test_video(os.path.join(self.temp_dir, 'small.mp4'), 160, 160),
+        ]
+
+        with mock.patch.object(lib_ffmpeg, '_scale_video', wraps=lib_ffmpeg._scale_video) as scale_video:
+            success, error_message = lib_ffmpeg.concatenate_videos(video_paths, self.output_path)
+
+        self.assertTrue(success, error_message)
+        self.assertEqual(scale_video.call_count, 2)
+        self.assertEqual(lib_ffmpeg.get_video_dimensions(self.output_path), (320, 240))
+
+    def test_failed_input_cancels_the_others(self):
+        """Test that the first failed input stops the operation with its number"""
+        broken_path = os.path.join(self.temp_dir, 'broken.mp4')
+        with open(broken_path, 'wb') as f:
+            f.write(b'not a video')
+        video_paths = [create_test_video(os.path.join(self.temp_dir, f'{i}.mp4'), 160 * (i + 1), 160)
+                       for i in range(2)]
+
+        success, error_message = lib_ffmpeg.concatenate_videos(video_paths + [broken_path], self.output_path)
+
+        self.assertFalse(success)
+        self.assertEqual(error_message, 'Failed to scale video 3.')
+
+    def test_auto_preset_fits_the_deadline(self):
+        """Test that the auto preset falls back to the fast one for videos too long to encode in time"""
+        video_paths = [
+            create_test_video(os.path.join(self.temp_dir, 'large.mp4'), 320, 240),
+            create_test_video(os.path.join(self.temp_dir, 'small.mp4'), 160, 160),
+        ]
+        short_infos = [{'duration': 10, 'fps': 25}] * 2
+        long_infos = [{'duration': 3600, 'fps': 25}, {'duration': 60, 'fps': 25}]
+
+        with mock.patch.object(lib_ffmpeg, 'CPU_COUNT', 4):
+            self.assertEqual(lib_ffmpeg.get_encoding_threads(2), (2, 2))
+            self.assertEqual(lib_ffmpeg.choose_encoder_preset(short_infos, 1280, 720, 300), 'balanced')
+            self.assertEqual(lib_ffmpeg.choose_encoder_preset(long_infos, 1280, 720, 300), 'fast')
+            # The longest video is encoded by one process, with its share of the cores
+            self.assertGreater(lib_ffmpeg.estimate_encoding_time(long_infos, 1280, 720, 'fast'),
+                               lib_ffmpeg.estimate_encoding_time([{'duration': 1830, 'fps': 25}] * 2,
+                                                                 1280, 720, 'fast'))
+
+        with mock.patch.object(lib_ffmpeg, '_scale_video', wraps=lib_ffmpeg._scale_video) as scale_video:
+            success, error_message = lib_ffmpeg.concatenate_videos(video_paths, self.output_path, preset='auto')
+        self.assertTrue(success, error_message)
+        self.assertEqual({call.args[-1] for call in scale_video.call_args_list}, {'balanced'})
+
+        success, error_message = lib_ffmpeg.concatenate_videos(video_paths, self.output_path, preset='slow')
+        self.assertFalse(success)
+        self.assertEqual(error_message, 'Invalid preset: slow.')
+
+    def test_process_group_deadline(self):
+        """Test that all commands of an operation share one deadline"""
+        process_group = lib_ffmpeg.FFmpegProcessGroup(timeout=0.2)
+        with self.assertRaises(subprocess.TimeoutExpired):
+            process_group.run(['sleep', '5'])
+        with self.assertRaises(subprocess.TimeoutExpired):
+            process_group.run(['true'])
+
+        process_group = lib_ffmpeg.FFmpegProcessGroup(timeout=10)
+        process_group.cancel()
+        with self.assertRaises(lib_ffmpeg.ProcessCancelled):
+            process_group.run(['true'])
+
+
+def count_video_frames(video_path: str) -> int:
+    cmd = [lib_ffmpeg.FFPROBE_PATH, '-v', 'error', '-count_frames', '-select_streams', 'v:0',
+           '-show_entries', 'stream=nb_read_frames', '-of', 'csv=p=0', video_path]
+    return int(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout.strip())
+
+
+@skipUnless(HAS_FFMPEG, 'ffmpeg is not installed')
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TrimVideoTestCase(SimpleTestCase):
+    """Test cases for video trimming"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.temp_dir = tempfile.mkdtemp()
+        # 6 seconds at 25 fps with a keyframe every second
+        cls.video_path = create_test_video(os.path.join(cls.temp_dir, 'video.mp4'), duration=6, gop=25)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_smart_trim_is_frame_accurate(self):
+        """Test that smart trimming cuts between keyframes and copies the whole GOPs"""
+        output_path = os.path.join(self.temp_dir, 'smart.mp4')
+
+        with mock.patch.object(lib_ffmpeg, '_reencode_segment') as reencode_segment:
+            success, error_message, video_duration = lib_ffmpeg.trim_video_segment(
+                self.video_path, output_path, 1.3, 4.7, mode='smart')
+
+        self.assertTrue(success, error_message)
+        reencode_segment.assert_not_called()
+        self.assertEqual(count_video_frames(output_path), 85)
+        info = lib_ffmpeg.probe_media(output_path)
+        self.assertAlmostEqual(info['video']['duration'], 3.4, delta=0.05)
+        self.assertAlmostEqual(info['audio']['duration'], 3.4, delta=0.05)
+
+    def test_copy_trim_snaps_to_keyframes(self):
+        """Test that the default stream copy mode starts at the keyframe before the start time"""
+        output_path = os.path.join(self.temp_dir, 'copy.mp4')
+
+        success, error_message, video_duration = lib_ffmpeg.trim_video_segment(
+            self.video_path, output_path, 1.3, 4.7)
+
+        self.assertTrue(success, error_message)
+        self.assertGreater(count_video_frames(output_path), 85)
+
+    def test_invalid_mode(self):
+        """Test that an unknown trim mode is rejected"""
+        success, error_message, video_duration = lib_ffmpeg.trim_video_segment(
+            self.video_path, os.path.join(self.temp_dir, 'output.mp4'), 1, 2, mode='fast')
+
+        self.assertFalse(success)
+        self.assertIn('copy, smart, reencode', error_message)
+
+
+@skipUnless(HAS_FFMPEG, 'ffmpeg is not installed')
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class StreamVideoTestCase(SimpleTestCase):
+    """Test cases for streaming the output of video operations"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+        self.video_path = create_test_video(os.path.join(self.temp_dir, 'video.mp4'), duration=4)
+
+    def test_streamed_output_is_fragmented_mp4(self):
+        """Test that the streamed trimmed video is complete and the input files are deleted at the end"""
+        input_path = shutil.copy(self.video_path, os.path.join(self.temp_dir, 'input.mp4'))
+
+        success, error_message, chunks = lib_ffmpeg.stream_video_operation(
+            lib_ffmpeg.trim_video_segment, cleanup_paths=[input_path],
+            video_path=input_path, start_time=1, end_time=3, mode='reencode')
+
+        self.assertTrue(success, error_message)
+        output_path = os.path.join(self.temp_dir, 'output.mp4')
+        with open(output_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        self.assertFalse(os.path.exists(input_path))
+        self.assertEqual(count_video_frames(output_path), 50)
+        with open(output_path, 'rb') as f:
+            self.assertIn(b'moof', f.read())
+
+    def test_error_before_output(self):
+        """Test that errors raised before the output is started are returned"""
+        success, error_message, chunks = lib_ffmpeg.stream_video_operation(
+            lib_ffmpeg.trim_video_segment, video_path=self.video_path, start_time=1, end_time=10)
+
+        self.assertFalse(success)
+        self.assertIsNone(chunks)
+        self.assertIn('exceeds video duration', error_message)
+
+    def test_operation_timeout_is_passed(self):
+        """Test that the timeout argument is passed to the operation"""
+        operation = mock.Mock(return_value=(False, 'Failed.'))
+
+        success, error_message, chunks = lib_ffmpeg.stream_video_operation(operation, video_path='video.mp4',
+                                                                           timeout=5)
+
+        self.assertEqual((success, error_message), (False, 'Failed.'))
+        self.assertEqual(operation.call_args.kwargs['timeout'], 5)
+
+    def test_single_video_concatenation(self):
+        """Test that a single streamed video is remuxed to the pipe instead of copied"""
+        success, error_message, chunks = lib_ffmpeg.stream_video_operation(
+            lib_ffmpeg.concatenate_videos, video_paths=[self.video_path], timeout=60)
+
+        self.assertTrue(success, error_message)
+        output_path = os.path.join(self.temp_dir, 'output.mp4')
+        with open(output_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        self.assertEqual(count_video_frames(output_path), 100)
+
+
+@skipUnless(HAS_FFMPEG, 'ffmpeg is not installed')
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ExtractFramesTestCase(SimpleTestCase):
+    """Test cases for batch frames extraction"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.video_path = create_test_video(os.path.join(cls.temp_dir, 'video.mp4'), duration=4)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_evenly_spaced_frames(self):
+        """Test that all frames are extracted with one ffmpeg command"""
+        with mock.patch.object(lib_ffmpeg.subprocess, 'run', wraps=subprocess.run) as run:
+            success, error_message, result = lib_ffmpeg.extract_frames_from_video(
+                self.video_path, self.temp_dir, 'even', count=4, width=160)
+
+        self.assertTrue(success, error_message)
+        ffmpeg_calls = [call for call in run.call_args_list if call.args[0][0] == lib_ffmpeg.FFMPEG_PATH]
+        self.assertEqual(len(ffmpeg_calls), 1)
+        self.assertEqual([frame['time'] for frame in result['frames']], [0.5, 1.5, 2.5, 3.5])
+        for frame in result['frames']:
+            frame_info = lib_ffmpeg.probe_media(os.path.join(self.temp_dir, frame['file']))
+            self.assertEqual((frame_info['width'], frame_info['height']), (160, 120))
+
+    def test_sprite_with_vtt_index(self):
+        """Test that the frames are tiled into a sprite sheet indexed by the WebVTT file"""
+        success, error_message, result = lib_ffmpeg.extract_frames_from_video(
+            self.video_path, self.temp_dir, 'sprite', interval=0.25, sprite=True)
+
+        self.assertTrue(success, error_message)
+        self.assertEqual(len(result['timestamps']), 16)
+        sprite_info = lib_ffmpeg.probe_media(os.path.join(self.temp_dir, result['sprite']))
+        self.assertEqual((sprite_info['width'], sprite_info['height']), (1600, 240))
+        with open(os.path.join(self.temp_dir, result['vtt'])) as f:
+            vtt = f.read()
+        self.assertTrue(vtt.startswith('WEBVTT'))
+        self.assertIn('00:00:00.250 --> 00:00:00.500\nsprite_sprite.jpg#xywh=160,0,160,120', vtt)
+        self.assertIn('00:00:03.750 --> 00:00:04.000\nsprite_sprite.jpg#xywh=800,120,160,120', vtt)
+
+    def test_too_many_frames(self):
+        """Test that the number of frames is limited"""
+        timestamps, error_message = lib_ffmpeg.get_frame_timestamps(3600, interval=1)
+
+        self.assertIsNone(timestamps)
+        self.assertEqual(error_message, f'Too many frames, maximum is {lib_ffmpeg.MAX_BATCH_FRAMES}.')
+
+
+@skipUnless(HAS_FFMPEG, 'ffmpeg is not installed')
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class MediaResultsTestCase(SimpleTestCase):
+    """Test cases for the content hashes of uploaded files and the cached operation results"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+
+    def test_upload_handler_hashes_content(self):
+        """Test that the content hash is computed while the file is received"""
+        data = os.urandom(200 * 1024)
+        handler = HashingTemporaryFileUploadHandler()
+        handler.new_file('video', 'video.mp4', 'video/mp4', len(data))
+        for start in range(0, len(data), handler.chunk_size):
+            handler.receive_data_chunk(data[start:start + handler.chunk_size], start)
+        uploaded_file = handler.file_complete(len(data))
+        self.addCleanup(uploaded_file.close)
+
+        self.assertEqual(uploaded_file.content_hash, hashlib.blake2b(data, digest_size=20).hexdigest())
+
+    def test_result_is_cached_while_output_exists(self):
+        """Test that the output of the same operation is returned until the file is deleted"""
+        uploaded_file = SimpleUploadedFile('video.mp4', b'video', content_type='video/mp4')
+        uploaded_file.content_hash = hashlib.blake2b(b'video', digest_size=20).hexdigest()
+        os.makedirs(os.path.join(self.temp_dir, 'video'))
+        with open(os.path.join(self.temp_dir, 'video', 'output.mp4'), 'wb') as f:
+            f.write(b'output')
+
+        with mock.patch.object(media_results, 'MEDIA_ROOT', self.temp_dir):
+            key = media_results.get_media_result_key('trim', [uploaded_file], {'second_start': 0, 'second_end': 1})
+            self.assertIsNone(media_results.get_cached_media_result(key))
+            media_results.cache_media_result(key, 'video/output.mp4')
+
+            self.assertEqual(media_results.get_cached_media_result(key), 'video/output.mp4')
+            other_key = media_results.get_media_result_key('trim', [uploaded_file],
+                                                           {'second_start': 0, 'second_end': 2})
+            self.assertIsNone(media_results.get_cached_media_result(other_key))
+            os.unlink(os.path.join(self.temp_dir, 'video', 'output.mp4'))
+            self.assertIsNone(media_results.get_cached_media_result(key))
+
+        # Files with no content hash are not cached
+        self.assertIsNone(media_results.get_media_result_key(
+            'trim', [SimpleUploadedFile('video.mp4', b'video')], {}))
+
+    @skipUnless(HAS_FFMPEG, 'ffmpeg is not installed')
+    def test_probe_uses_upload_hash(self):
+        """Test that an uploaded file is probed under its content hash without reading it again"""
+        uploaded_file = TemporaryUploadedFile('video.mp4', 'video/mp4', 0, None)
+        self.addCleanup(uploaded_file.close)
+        video_path = create_test_video(os.path.join(self.temp_dir, 'video.mp4'), duration=1)
+        with open(video_path, 'rb') as f:
+            shutil.copyfileobj(f, uploaded_file)
+        uploaded_file.flush()
+        uploaded_file.content_hash = 'a' * 40
+
+        file_path = lib_ffmpeg.get_uploaded_file_path(uploaded_file)
+        with mock.patch.object(lib_ffmpeg, '_run_ffprobe', wraps=lib_ffmpeg._run_ffprobe) as run_ffprobe:
+            info = lib_ffmpeg.probe_media(file_path)
+            lib_ffmpeg.probe_media(file_path)
+        self.assertEqual(run_ffprobe.call_count, 1)
+        self.assertEqual(info['width'], 320)
+
+
+class MediaJobsTestCase(TestCase):
+    """Test cases for background video processing jobs"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+        self.user = User.objects.create(username='media-jobs-test')
+        self.executor = mock.Mock()
+        for patcher in (
+            mock.patch.object(media_jobs, 'MEDIA_ROOT', os.path.join(self.temp_dir, 'media')),
+            mock.patch.object(media_jobs, 'MEDIA_JOBS_PATH', os.path.join(self.temp_dir, 'jobs')),
+            mock.patch.object(media_jobs, '_media_jobs_executor', self.executor),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        with open(create_test_video(os.path.join(self.temp_dir, 'video.mp4')), 'rb') as f:
+            self.upload = SimpleUploadedFile('video.mp4', f.read(), content_type='video/mp4')
+
+    def test_job_lifecycle(self):
+        """Test that a job is queued with its inputs and stores the output path when done"""
+        job = media_jobs.submit_media_job('trim', [self.upload], {'second_start': 0.5, 'second_end': 1.5},
+                                          user=self.user)
+
+        self.assertEqual(job.status, 'pending')
+        self.assertTrue(os.path.isfile(job.input_paths[0]))
+        self.executor.submit.assert_called_once_with(media_jobs._media_job_thread, job.id)
+
+        media_jobs._run_media_job(job.id)
+
+        job = media_jobs.get_media_job(str(job.uuid), user=self.user)
+        self.assertEqual(job.status, 'done')
+        self.assertTrue(os.path.isfile(os.path.join(media_jobs.MEDIA_ROOT, job.result['video_url'])))
+        self.assertFalse(os.path.exists(os.path.dirname(job.input_paths[0])))
+        with self.assertRaises(FileNotFoundError):
+            media_jobs.get_media_job(str(job.uuid), user=User.objects.create(username='other'))
+
+    def test_failed_job(self):
+        """Test that the operation error is stored in the job"""
+        job = media_jobs.submit_media_job('trim', [self.upload], {'second_start': 0, 'second_end': 60},
+                                          user=self.user)
+
+        media_jobs._run_media_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'error')
+        self.assertIn('exceeds video duration', job.error)
+
+    def test_recover_jobs_of_stopped_process(self):
+        """Test that jobs left by a stopped process are requeued or failed and their inputs deleted"""
+        params = {'second_start': 0.5, 'second_end': 1.5}
+        data = self.upload.read()
+        pending, processing, running = (
+            media_jobs.submit_media_job('trim', [SimpleUploadedFile('video.mp4', data, content_type='video/mp4')],
+                                        params, user=self.user)
+            for _ in range(3)
+        )
+        media_jobs.MediaJobModel.objects.filter(id=processing.id).update(status='processing')
+        media_jobs.MediaJobModel.objects.update(date_created=timezone.now() - timedelta(hours=1))
+        # The process holding the locks of the first two jobs stopped
+        media_jobs._release_job_lock(pending.id)
+        media_jobs._release_job_lock(processing.id)
+        orphan_dir = os.path.join(media_jobs.MEDIA_JOBS_PATH, '999')
+        os.makedirs(orphan_dir)
+        os.utime(orphan_dir, (time.time() - 3600, time.time() - 3600))
+        self.executor.reset_mock()
+
+        result = media_jobs.recover_media_jobs()
+
+        self.assertEqual(result, {'requeued': 1, 'failed': 1, 'deleted_dirs': 1})
+        self.executor.submit.assert_called_once_with(media_jobs._media_job_thread, pending.id)
+        processing.refresh_from_db()
+        self.assertEqual(processing.status, 'error')
+        self.assertFalse(os.path.exists(os.path.dirname(processing.input_paths[0])))
+        self.assertTrue(os.path.isfile(running.input_paths[0]))
+        self.assertFalse(os.path.exists(orphan_dir))
+        # The requeued job is now held by this process
+        self.assertEqual(media_jobs.recover_media_jobs(), {'requeued': 0, 'failed': 0, 'deleted_dirs': 0})
+        for job in (pending, running):
+            media_jobs._run_media_job(job.id)
+
+
+class MediaUploadsTestCase(TestCase):
+    """Test cases for resumable chunked uploads"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        patcher = mock.patch.object(media_uploads, 'MEDIA_UPLOADS_PATH', temp_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create(username='media-uploads-test')
+        self.data = os.urandom(300 * 1024)
+
+    def test_chunks_are_assembled(self):
+        """Test that chunks are appended in order and the complete upload is used in place of a file field"""
+        upload = media_uploads.create_upload('video.mp4', 'video/mp4', len(self.data), user=self.user)
+
+        offset = media_uploads.append_upload_chunk(upload, 0, io.BytesIO(self.data[:100000]), 100000)
+        self.assertEqual(offset, 100000)
+        with self.assertRaises(media_uploads.UploadError):
+            media_uploads.get_upload_file(str(upload.uuid), user=self.user)
+        # A chunk sent again after a lost response is rejected with the current offset
+        with self.assertRaisesMessage(media_uploads.UploadOffsetConflict, 'Upload offset is 100000'):
+            media_uploads.append_upload_chunk(upload, 0, io.BytesIO(self.data[:100000]), 100000)
+        # Connection dropped in the middle of a chunk: the received part is kept
+        upload = media_uploads.get_upload(str(upload.uuid), user=self.user)
+        offset = media_uploads.append_upload_chunk(upload, 100000, io.BytesIO(self.data[100000:150000]), 100000)
+        self.assertEqual(offset, 150000)
+        media_uploads.append_upload_chunk(upload, offset, io.BytesIO(self.data[offset:]), len(self.data) - offset)
+
+        uploaded_file = media_uploads.get_upload_file(str(upload.uuid), user=self.user)
+        self.assertEqual((uploaded_file.name, uploaded_file.content_type, uploaded_file.size),
+                         ('video.mp4', 'video/mp4', len(self.data)))
+        self.assertEqual(len(uploaded_file.content_hash), 40)
+        with open(lib_ffmpeg.get_uploaded_file_path(uploaded_file), 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+        with self.assertRaises(FileNotFoundError):
+            media_uploads.get_upload(str(upload.uuid), user=User.objects.create(username='other'))
+
+    def test_content_hash_does_not_depend_on_chunks(self):
+        """Test that the same file uploaded in chunks of other sizes or at once has the same content hash"""
+        content_hashes = []
+        for chunk_size in (100000, 64 * 1024 + 1):
+            upload = media_uploads.create_upload('video.mp4', 'video/mp4', len(self.data), user=self.user)
+            for start in range(0, len(self.data), chunk_size):
+                chunk = self.data[start:start + chunk_size]
+                media_uploads.append_upload_chunk(upload, start, io.BytesIO(chunk), len(chunk))
+            uploaded_file = media_uploads.get_upload_file(str(upload.uuid), user=self.user)
+            self.addCleanup(uploaded_file.close)
+            content_hashes.append(uploaded_file.content_hash)
+
+        handler = HashingTemporaryFileUploadHandler()
+        handler.new_file('video', 'video.mp4', 'video/mp4', len(self.data))
+        for start in range(0, len(self.data), handler.chunk_size):
+            handler.receive_data_chunk(self.data[start:start + handler.chunk_size], start)
+        uploaded_file = handler.file_complete(len(self.data))
+        self.addCleanup(uploaded_file.close)
+        content_hashes.append(uploaded_file.content_hash)
+
+        self.assertEqual(content_hashes, [content_hashes[2]] * 3)
+
+    def test_upload_size_is_limited(self):
+        """Test that uploads and chunks larger than the declared size are rejected"""
+        with self.assertRaises(media_uploads.UploadTooLarge):
+            media_uploads.create_upload('video.mp4', 'video/mp4', media_uploads.MEDIA_UPLOAD_MAX_BYTES + 1)
+
+        upload = media_uploads.create_upload('video.mp4', 'video/mp4', 1000, user=self.user)
+        with self.assertRaises(media_uploads.UploadTooLarge):
+            media_uploads.append_upload_chunk(upload, 0, io.BytesIO(self.data[:2000]), 2000)
+        self.assertEqual(media_uploads.get_upload(str(upload.uuid), user=self.user).offset, 0)
@@ -0,0 +1,40 @@
+import hashlib
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+HASH_READ_BLOCK_SIZE = 1024 * 1024
+
+
+def new_content_hash():
+    """Hash of the content of uploaded files, the same whether a file is uploaded at once or in chunks."""
+    return hashlib.blake2b(digest_size=20)
+
+
+def get_file_content_hash(file_path: str) -> str:
+    """Content hash of a file on disk (for files not hashed while they were received)."""
+    digest = new_content_hash()
+    with open(file_path, 'rb') as f:
+        while block := f.read(HASH_READ_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class HashingTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Upload handler streaming files into temporary files (as TemporaryFileUploadHandler)
+    and hashing the data as it is received, so the content hash of an uploaded file
+    (uploaded_file.content_hash) is known without reading it again.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = new_content_hash()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.content_hash = self.digest.hexdigest()
+        return uploaded_file
@@ -1,4 +1,5 @@
 import asyncio
+import functools
 import json
 import os
 import tempfile
@@ -18,7 +19,7 @@ import difflib
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import re
-from django.http import HttpResponse, FileResponse
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
 from django.contrib.auth.models import User, Group
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
@@ -35,12 +36,20 @@ from django.core.files.uploadedfile import TemporaryUploadedFile
 from yandex_cloud_ml_sdk import YCloudML
 
 from app import settings
-from main.embeddings import create_and_store_embeddings, create_docs_embeddings, get_answer_with_embeddings
+from main.embeddings import create_and_store_embeddings, create_docs_embeddings, get_answer_with_embeddings, \
+    search_store, stream_answer_with_embeddings, get_vector_store_cache_stats, get_query_cache_stats, \
+    get_storage_stats, update_store_embeddings, create_store_job, get_store_status
+from main.local_embeddings import is_local_embeddings_model
 from main.filters import IsOwnerFilterBackend, IsPublishedFilterBackend
 from main.lib import edge_tts_find_voice, edge_tts_create_audio, delete_old_files, edge_tts_locales, \
     upload_and_share_yadisk, is_internal_url, get_safe_filename
 from main.lib_ffmpeg import extract_frame_from_video, replace_audio_in_video, trim_video_segment, \
-    save_uploaded_file_to_temp, concatenate_videos
+    get_uploaded_file_path, concatenate_videos, TRIM_MODES, extract_frames_from_video, MAX_BATCH_FRAMES, \
+    stream_video_operation, ENCODER_PRESET_NAMES
+from main.media_jobs import submit_media_job, get_media_job
+from main.media_results import get_media_result_key, get_cached_media_result, cache_media_result
+from main.media_uploads import create_upload, get_upload, get_upload_file, append_upload_chunk, delete_upload, \
+    UploadError, UploadOffsetConflict, UploadTooLarge
 from main.models import ProductModel, LogOwnerModel, LogItemModel
 
 from main.serializers import UserSerializer, GroupSerializer, ProductModelSerializer, ProductModelListSerializer, \
@@ -51,12 +60,18 @@ from main.serializers import UserSerializer, GroupSerializer, ProductModelSerial
     YandexDiskUploadResponseSerializer, GoogleTtsLanguagesSerializer, GoogleTransOutputSerializer, \
     GoogleTransRequestSerializer, GoogleTTSRequestSerializer, GoogleTTSResponseSerializer, EdgeTtsResponseSerializer, \
     EdgeTtsRequestSerializer, YandexGPTResponseSerializer, OpenAIEmbeddingsResponseSerializer, \
-    OpenAIEmbeddingsQuestionResponseSerializer, VideoFrameExtractionRequestSerializer, \
+    OpenAIEmbeddingsQuestionResponseSerializer, OpenAIEmbeddingsStoreStatsResponseSerializer, \
+    OpenAIEmbeddingsSearchResponseSerializer, \
+    OpenAIEmbeddingsUpdateResponseSerializer, OpenAIEmbeddingsStoreStatusResponseSerializer, \
+    VideoFrameExtractionRequestSerializer, \
     VideoFrameExtractionResponseSerializer, VideoFrameExtractionErrorSerializer, \
+    VideoFramesExtractionResponseSerializer, VideoFramesExtractionErrorSerializer, \
     VideoAudioReplacementRequestSerializer, VideoAudioReplacementResponseSerializer, \
     VideoAudioReplacementErrorSerializer, VideoTrimRequestSerializer, VideoTrimResponseSerializer, \
     VideoTrimErrorSerializer, VideoConcatenationRequestSerializer, VideoConcatenationResponseSerializer, \
-    VideoConcatenationErrorSerializer, WebsiteScreenshotRequestSerializer, WebsiteScreenshotResponseSerializer, \
+    VideoConcatenationErrorSerializer, MediaJobSubmitResponseSerializer, MediaJobStatusResponseSerializer, \
+    MediaJobResultResponseSerializer, MediaUploadCreateRequestSerializer, MediaUploadResponseSerializer, \
+    MediaUploadErrorSerializer, WebsiteScreenshotRequestSerializer, WebsiteScreenshotResponseSerializer, \
     WebsiteScreenshotErrorSerializer, WidgetEmbedCodeRequestSerializer, WidgetEmbedCodeResponseSerializer, \
     WidgetEmbedCodeErrorSerializer, QRCodeGeneratorRequestSerializer, QRCodeGeneratorResponseSerializer, \
     QRCodeGeneratorErrorSerializer, OCRTextRecognitionRequestSerializer, OCRTextRecognitionResponseSerializer, \
@@ -1113,7 +1128,13 @@ def coggle_node_action(request, diagram_id, node_id):
             'type': 'object',
             'properties': {
                 'openai_api_url_base': {'type': 'string'},
-                'openai_model_name': {'type': 'string'},
+                'openai_model_name': {
+                    'type': 'string',
+                    'description': (
+                        'Embedding model. "local:<sentence-transformers model>" computes embeddings on the server CPU '
+                        '(no API key needed), "hashing" — deterministic hashing embeddings for tests.'
+                    ),
+                },
                 'knowledge_content': {'type': 'string'},
                 'mode': {
                     'type': 'string',
@@ -1133,6 +1154,24 @@ def coggle_node_action(request, diagram_id, node_id):
                     'type': 'integer',
                     'description': 'Overlap between chunks in characters (docs mode only, default 150).',
                 },
+                'background': {
+                    'type': 'boolean',
+                    'default': False,
+                    'description': (
+                        'Build the store in background: the response with status "pending" is returned '
+                        'right away, progress is available at /api/v1/store_status/<store_uuid>.'
+                    ),
+                },
+                'storage_format': {
+                    'type': 'string',
+                    'enum': ['faiss', 'mmap', 'mmap_fp16'],
+                    'description': (
+                        'Store file format (default from the server settings). '
+                        '"faiss" — FAISS index with pickled docstore. '
+                        '"mmap" / "mmap_fp16" — flat float32 / float16 vectors and texts in memory-mapped files: '
+                        'fast to load and shared between worker processes.'
+                    ),
+                },
             }
         }
     },
@@ -1157,8 +1196,10 @@ def embeddings_create_store_action(request):
     openai_model_name = request.data.get('openai_model_name')
     knowledge_content = request.data.get('knowledge_content')
     mode = request.data.get('mode', 'docs')
+    storage_format = request.data.get('storage_format') or None
+    background = request.data.get('background', 'false').lower() in ['true', '1', 'yes'] if isinstance(request.data.get('background'), str) else bool(request.data.get('background', False))
 
-    if api_key is None:
+    if api_key is None and not is_local_embeddings_model(openai_model_name):
         return HttpResponse(json.dumps({'success': False, 'detail': 'API key is required.'}),
                             content_type='application/json', status=420)
 
@@ -1170,6 +1211,11 @@ def embeddings_create_store_action(request):
         return HttpResponse(json.dumps({'success': False, 'detail': 'mode must be "docs" or "simple".'}),
                             content_type='application/json', status=420)
 
+    if storage_format not in (None, 'faiss', 'mmap', 'mmap_fp16'):
+        return HttpResponse(json.dumps({'success': False,
+                                        'detail': 'storage_format must be "faiss", "mmap" or "mmap_fp16".'}),
+                            content_type='application/json', status=420)
+
     if not openai_api_url_base:
         openai_api_url_base = 'https://api.openai.com/v1/'
 
@@ -1177,12 +1223,28 @@ def embeddings_create_store_action(request):
         openai_model_name = 'text-embedding-ada-002'
 
     try:
-        if mode == 'simple':
+        if background:
+            chunk_size = int(request.data.get('chunk_size', 1500))
+            chunk_overlap = int(request.data.get('chunk_overlap', 150))
+            store_uuid = create_store_job(
+                knowledge_content,
+                mode=mode,
+                model=openai_model_name,
+                api_key=api_key,
+                api_url_base=openai_api_url_base,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                storage_format=storage_format,
+            )
+            output = {'success': True, 'store_uuid': store_uuid, 'status': 'pending'}
+            return HttpResponse(json.dumps(output), content_type='application/json', status=202)
+        elif mode == 'simple':
             store_uuid = create_and_store_embeddings(
                 knowledge_content,
                 model=openai_model_name,
                 api_key=api_key,
                 api_url_base=openai_api_url_base,
+                storage_format=storage_format,
             )
         else:
             chunk_size = int(request.data.get('chunk_size', 1500))
@@ -1194,6 +1256,7 @@ def embeddings_create_store_action(request):
                 api_url_base=openai_api_url_base,
                 chunk_size=chunk_size,
                 chunk_overlap=chunk_overlap,
+                storage_format=storage_format,
             )
     except (TypeError, ValueError) as e:
         return HttpResponse(json.dumps({'success': False, 'detail': str(e)}),
@@ -1208,6 +1271,89 @@ def embeddings_create_store_action(request):
     return HttpResponse(json.dumps(output), content_type='application/json', status=200)
 
 
+@extend_schema(
+    tags=['OpenAI Embeddings'],
+    request={
+        'multipart/form-data': {
+            'type': 'object',
+            'properties': {
+                'openai_api_url_base': {'type': 'string'},
+                'openai_model_name': {
+                    'type': 'string',
+                    'description': 'Embedding model (default: the model the store was created with).',
+                },
+                'store_uuid': {'type': 'string'},
+                'knowledge_content': {
+                    'type': 'string',
+                    'description': (
+                        'New full content of the store. It is split with the same mode and chunk sizes '
+                        'the store was created with; only new or changed chunks are embedded.'
+                    ),
+                },
+            }
+        }
+    },
+    parameters=[
+        OpenApiParameter(
+            name='X-OpenAI-Api-Key',
+            type=str,
+            location=OpenApiParameter.HEADER,
+            description='OpenAI API Key',
+        )
+    ],
+    responses={
+        (200, 'application/json'): OpenAIEmbeddingsUpdateResponseSerializer
+    }
+)
+@api_view(['POST'])
+@authentication_classes([BasicAuthentication])
+@permission_classes([permissions.IsAuthenticated])
+def embeddings_update_store_action(request):
+    api_key = request.headers.get('X-OpenAI-Api-Key')
+    openai_api_url_base = request.data.get('openai_api_url_base')
+    openai_model_name = request.data.get('openai_model_name')
+    store_uuid = request.data.get('store_uuid')
+    knowledge_content = request.data.get('knowledge_content')
+
+    if api_key is None and not is_local_embeddings_model(openai_model_name):
+        return HttpResponse(json.dumps({'success': False, 'detail': 'API key is required.'}),
+                            content_type='application/json', status=420)
+
+    if not store_uuid:
+        return HttpResponse(json.dumps({'success': False, 'detail': 'Store ID is required.'}),
+                            content_type='application/json', status=420)
+
+    if not knowledge_content:
+        return HttpResponse(json.dumps({'success': False, 'detail': 'Content is required.'}),
+                            content_type='application/json', status=420)
+
+    if not openai_api_url_base:
+        openai_api_url_base = 'https://api.openai.com/v1/'
+
+    try:
+        result = update_store_embeddings(
+            store_uuid,
+            knowledge_content,
+            model=openai_model_name,
+            api_key=api_key,
+            api_url_base=openai_api_url_base,
+        )
+    except FileNotFoundError as e:
+        return HttpResponse(json.dumps({'success': False, 'detail': str(e)}),
+                            content_type='application/json', status=404)
+    except (TypeError, ValueError) as e:
+        return HttpResponse(json.dumps({'success': False, 'detail': str(e)}),
+                            content_type='application/json', status=420)
+    except Exception as e:
+        error_message = str(e)
+        return HttpResponse(json.dumps({'success': False, 'detail': error_message}),
+                            content_type='application/json', status=400)
+
+    output = {'success': True, 'store_uuid': store_uuid, **result}
+
+    return HttpResponse(json.dumps(output), content_type='application/json', status=200)
+
+
 @extend_schema(
     tags=['OpenAI Embeddings'],
     request={
@@ -1289,6 +1435,347 @@ def embeddings_store_question_action(request):
     return HttpResponse(json.dumps(output), content_type='application/json', status=200)
 
 
+def _sse_event(event: str, data: dict) -> str:
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+@extend_schema(
+    tags=['OpenAI Embeddings'],
+    request={
+        'multipart/form-data': {
+            'type': 'object',
+            'properties': {
+                'openai_api_url_base': {'type': 'string'},
+                'openai_embedding_model_name': {'type': 'string'},
+                'openai_model_name': {'type': 'string'},
+                'store_uuid': {'type': 'string'},
+                'instructions': {'type': 'string'},
+                'question': {'type': 'string'},
+            }
+        }
+    },
+    parameters=[
+        OpenApiParameter(
+            name='X-OpenAI-Api-Key',
+            type=str,
+            location=OpenApiParameter.HEADER,
+            description='OpenAI API Key',
+        )
+    ],
+    responses={
+        (200, 'text/event-stream'): {
+            'type': 'string',
+            'description': (
+                'Server-Sent Events: "retrieval" (the chunks used as context and retrieval timing, '
+                'same as /api/v1/store_search), then "token" events with pieces of the answer '
+                '({"content": "..."}), then "done" ({"answer": "..."}) or "error" ({"detail": "..."}).'
+            ),
+        }
+    }
+)
+@api_view(['POST'])
+@authentication_classes([BasicAuthentication])
+@permission_classes([permissions.IsAuthenticated])
+def embeddings_store_question_stream_action(request):
+    api_key = request.headers.get('X-OpenAI-Api-Key')
+    openai_api_url_base = request.data.get('openai_api_url_base')
+    openai_embedding_model_name = request.data.get('openai_embedding_model_name')
+    openai_model_name = request.data.get('openai_model_name')
+    store_uuid = request.data.get('store_uuid')
+    question = request.data.get('question')
+    instructions = request.data.get('instructions')
+
+    if api_key is None and not is_local_embeddings_model(openai_embedding_model_name):
+        return HttpResponse(json.dumps({'success': False, 'detail': 'API key is required.'}),
+                            content_type='application/json', status=420)
+
+    if not store_uuid:
+        return HttpResponse(json.dumps({'success': False, 'detail': 'Store ID is required.'}),
+                            content_type='application/json', status=420)
+
+    if not question:
+        return HttpResponse(json.dumps({'success': False, 'detail': 'Question is required.'}),
+                            content_type='application/json', status=420)
+
+    if not openai_api_url_base:
+        openai_api_url_base = 'https://api.openai.com/v1/'
+
+    if not openai_model_name:
+        openai_model_name = 'gpt-3.5-turbo'
+
+    if not openai_embedding_model_name:
+        openai_embedding_model_name = 'text-embedding-ada-002'
+
+    # Retrieval runs before the response starts, so its errors still get a proper status code
+    try:
+        retrieval = search_store(
+            question,
+            store_uuid,
+            embedding_model=openai_embedding_model_name,
+            api_key=api_key,
+            api_url_base=openai_api_url_base
+        )
+    except FileNotFoundError as e:
+        return HttpResponse(json.dumps({'success': False, 'detail': str(e)}),
+                            content_type='application/json', status=404)
+    except (TypeError, ValueError) as e:
+        return HttpResponse(json.dumps({'success': False, 'detail': str(e)}),
+                            content_type='application/json', status=420)
+    except Exception as e:
+        error_message = str(e)
+        return HttpResponse(json.dumps({'success': False, 'detail': error_message}),
+                            content_type='application/json', status=400)
+
+    def events():
+        yield _sse_event('retrieval', retrieval)
+        answer = []
+        try:
+            for token in stream_answer_with_embeddings(
+                question,
+                [chunk['content'] for chunk in retrieval['chunks']],
+                model=openai_model_name,
+                instructions=instructions,
+                api_key=api_key,
+                api_url_base=openai_api_url_base
+            ):
+                if token:
+                    answer.append(token)
+                    yield _sse_event('token', {'content': token})
+        except Exception as e:
+            logger.exception(e)
+            yield _sse_event('error', {'detail': str(e)})
+            return
+        yield _sse_event('done', {'answer': ''.join(answer)})
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@extend_schema(
+    tags=['OpenAI Embeddings'],
+    request={
+        'multipart/form-data': {
+            'type': 'object',
+            'properties': {
+                'openai_api_url_base': {'type': 'string'},
+                'openai_embedding_model_name': {'type': 'string'},
+                'store_uuid': {'type': 'string'},
+                'question': {'type': 'string'},
+                'k': {'type': 'integer', 'default': 6, 'description': 'Number of chunks to return.'},
+                'fetch_k': {
+                    'type': 'integer',
+                    'default': 20,
+                    'description': 'Number of nearest chunks MMR chooses from.',
+                },
+                'search_type': {
+                    'type': 'string',
+                    'enum': ['mmr', 'similarity', 'hybrid'],
+                    'description': (
+                        'Default: the same search store_question uses ("hybrid" for docs mode stores, '
+                        'otherwise "mmr"). "mmr" — diverse selection of the fetch_k nearest chunks; '
+                        '"similarity" — the k nearest chunks; "hybrid" — MMR results fused with BM25 '
+                        'keyword matches (docs mode stores).'
+                    ),
+                },
+            }
+        }
+    },
+    parameters=[
+        OpenApiParameter(
+            name='X-OpenAI-Api-Key',
+            type=str,
+            location=OpenApiParameter.HEADER,
+            description='OpenAI API Key',
+        )
+    ],
+    responses={
+        (200, 'application/json'): OpenAIEmbeddingsSearchResponseSerializer
+    }
+)
+@api_view(['POST'])
+@authentication_classes([BasicAuthentication])
+@permission_classes([permissions.IsAuthenticated])
+def embeddings_store_search_action(request):
+    api_key = request.headers.get('X-OpenAI-Api-Key')
+    openai_api_url_base = request.data.get('openai_api_url_base')
+    openai_embedding_model_name = request.data.get('openai_embedding_model_name')
+    store_uuid = request.data.get('store_uuid')
+    question = request.data.get('question')
+    search_type = request.data.get('search_type') or None
+
+    if api_key is None and not is_local_embeddings_model(openai_embedding_model_name):
+        return HttpResponse(json.dumps({'success': False, 'detail': 'API key is required.'}),
+                            content_type='application/json', status=420)
+
+    if not store_uuid:
+        return HttpResponse(json.dumps({'success': False, 'detail': 'Store ID is required.'}),
+                            content_type='application/json', status=420)
+
+    if not question:
+        return HttpResponse(json.dumps({'success': False, 'detail': 'Question is required.'}),
+                            content_type='application/json', status=420)
+
+    if not openai_api_url_base:
+        openai_api_url_base = 'https://api.openai.com/v1/'
+
+    if not openai_embedding_model_name:
+        openai_embedding_model_name = 'text-embedding-ada-002'
+
+    try:
+        result = search_store(
+            question,
+            store_uuid,
+            embedding_model=openai_embedding_model_name,
+            k=int(request.data.get('k', 6)),
+            fetch_k=int(request.data.get('fetch_k', 20)),
+            search_type=search_type,
+            api_key=api_key,
+            api_url_base=openai_api_url_base,
+        )
+    except FileNotFoundError as e:
+        return HttpResponse(json.dumps({'success': False, 'detail': str(e)}),
+                            content_type='application/json', status=404)
+    except (TypeError, ValueError) as e:
+        return HttpResponse(json.dumps({'success': False, 'detail': str(e)}),
+                            content_type='application/json', status=420)
+    except Exception as e:
+        error_message = str(e)
+        return HttpResponse(json.dumps({'success': False, 'detail': error_message}),
+                            content_type='application/json', status=400)
+
+    output = {'success': True, **result}
+
+    return HttpResponse(json.dumps(output), content_type='application/json', status=200)
+
+
+@extend_schema(
+    tags=['OpenAI Embeddings'],
+    responses={
+        (200, 'application/json'): OpenAIEmbeddingsStoreStatusResponseSerializer
+    }
+)
+@api_view(['GET'])
+@authentication_classes([BasicAuthentication])
+@permission_classes([permissions.IsAuthenticated])
+def embeddings_store_status_action(request, store_uuid):
+    """
+    Build status of a vector store: pending, processing, ready or error,
+    with the number of embedded chunks out of the total.
+    """
+    try:
+        store_status = get_store_status(str(store_uuid))
+    except FileNotFoundError as e:
+        return HttpResponse(json.dumps({'success': False, 'detail': str(e)}),
+                            content_type='application/json', status=404)
+
+    output = {'success': True, 'store_uuid': str(store_uuid), **store_status}
+
+    return HttpResponse(json.dumps(output), content_type='application/json', status=200)
+
+
+@extend_schema(
+    tags=['OpenAI Embeddings'],
+    responses={
+        (200, 'application/json'): OpenAIEmbeddingsStoreStatsResponseSerializer
+    }
+)
+@api_view(['GET'])
+@authentication_classes([BasicAuthentication])
+@permission_classes([permissions.IsAdminUser])
+def embeddings_store_stats_action(request):
+    """
+    Statistics of the loaded vector stores cache and the question embeddings / answers caches,
+    and of the stores on disk (count, total size, largest stores).
+    Cache counters are kept per worker process, so the response includes the worker PID.
+    """
+    output = {'success': True, 'cache': get_vector_store_cache_stats(), **get_query_cache_stats(),
+              'storage': get_storage_stats()}
+
+    return HttpResponse(json.dumps(output), content_type='application/json', status=200)
+
+
+def _submit_media_job_response(request, operation: str, uploaded_files: list, params: dict) -> HttpResponse:
+    """Queue a video operation for the background workers and respond with the job UUID."""
+    job = submit_media_job(operation, uploaded_files, params, user=request.user)
+    output = {'success': True, 'job_uuid': str(job.uuid), 'status': job.status}
+    return HttpResponse(json.dumps(output), content_type='application/json', status=202)
+
+
+def _closing_chunked_uploads(view):
+    """
+    Close the chunked uploads opened by the view (deleting them) when the request ends,
+    or when the streamed response ends, as Django does with the multipart upload files.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.chunked_uploads = []
+
+        def close_uploads():
+            for uploaded_file in request.chunked_uploads:
+                uploaded_file.close()
+
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            close_uploads()
+            raise
+        if not response.streaming:
+            close_uploads()
+            return response
+
+        streaming_content = response.streaming_content
+
+        def closing_content():
+            try:
+                yield from streaming_content
+            finally:
+                close_uploads()
+
+        response.streaming_content = closing_content()
+        return response
+
+    return wrapper
+
+
+def _get_upload_file(request, upload_id: str):
+    """Complete chunked upload of the user, closed by _closing_chunked_uploads when the request ends."""
+    uploaded_file = get_upload_file(upload_id, user=request.user)
+    request.chunked_uploads.append(uploaded_file)
+    return uploaded_file
+
+
+def _get_uploaded_file(request, field: str) -> tuple:
+    """
+    File of a multipart field, or the complete chunked upload whose id is in the "<field>_upload_id" field.
+    Returns a tuple of (file or None, error message or None).
+    """
+    if field in request.data:
+        return request.data.get(field), None
+    upload_id = request.data.get(f'{field}_upload_id')
+    if not upload_id:
+        return None, None
+    try:
+        return _get_upload_file(request, str(upload_id)), None
+    except (FileNotFoundError, UploadError) as e:
+        return None, str(e)
+
+
+def _stream_video_response(operation, temp_paths: list, **kwargs) -> HttpResponse:
+    """Respond with the fragmented MP4 output of a video operation, streamed while ffmpeg is running."""
+    success, error_message, chunks = stream_video_operation(operation, cleanup_paths=temp_paths, **kwargs)
+    if not success:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': error_message}),
+            content_type='application/json',
+            status=422
+        )
+    response = StreamingHttpResponse(chunks, content_type='video/mp4')
+    response['Content-Disposition'] = f'inline; filename="{uuid.uuid1()}.mp4"'
+    return response
+
+
 @extend_schema(
     tags=['Video'],
     request={
@@ -1299,33 +1786,249 @@ def embeddings_store_question_action(request):
                     'type': 'string',
                     'format': 'binary'
                 },
+                'video_upload_id': {
+                    'type': 'string',
+                    'format': 'uuid',
+                    'description': 'ID of a complete chunked upload (/api/v1/media_upload) in place of the video file.'
+                },
                 'second': {'type': 'number', 'default': 0},
-                'is_last': {'type': 'boolean', 'default': False}
+                'is_last': {'type': 'boolean', 'default': False},
+                'background': {
+                    'type': 'boolean',
+                    'default': False,
+                    'description': (
+                        'Process in background: the response with the job UUID is returned right away, '
+                        'status at /api/v1/media_job_status/<job_uuid>, output at /api/v1/media_job_result/<job_uuid>.'
+                    ),
+                },
             },
-            'required': ['video']
         }
     },
     responses={
         (200, 'application/json'): VideoFrameExtractionResponseSerializer,
+        (202, 'application/json'): MediaJobSubmitResponseSerializer,
         (422, 'application/json'): VideoFrameExtractionErrorSerializer
     }
 )
 @api_view(['POST'])
 @authentication_classes([BasicAuthentication])
 @permission_classes([permissions.IsAuthenticated])
+@_closing_chunked_uploads
 def extract_video_frame(request):
     """
     API endpoint for extracting a frame from a video file.
     Accepts video file and extracts a frame at specified second or the last frame.
     Returns JPG image with high quality.
     """
-    video_file: TemporaryUploadedFile = request.data.get('video') if 'video' in request.data else None
+    video_file, upload_error = _get_uploaded_file(request, 'video')
     second = float(request.data.get('second', 0))
     is_last = request.data.get('is_last', 'false').lower() in ['true', '1', 'yes'] if isinstance(request.data.get('is_last'), str) else bool(request.data.get('is_last', False))
+    background = request.data.get('background', 'false').lower() in ['true', '1', 'yes'] if isinstance(request.data.get('background'), str) else bool(request.data.get('background', False))
+
+    if upload_error:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': upload_error}),
+            content_type='application/json',
+            status=422
+        )
+
+    if video_file is None:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': 'Video file is required.'}),
+            content_type='application/json',
+            status=422
+        )
+
+    # Validate video file type
+    valid_video_types = ['video/mp4', 'video/webm', 'video/mpeg', 'video/quicktime', 'video/x-msvideo']
+    if video_file.content_type not in valid_video_types:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': 'Unsupported video file type.'}),
+            content_type='application/json',
+            status=422
+        )
+
+    # Validate file sizes
+    MAX_VIDEO_SIZE = 100 * 1024 * 1024  # 100 MB
+
+    if video_file.size > MAX_VIDEO_SIZE:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': 'Video file is too large. Maximum size is 100 MB.'}),
+            content_type='application/json',
+            status=422
+        )
+
+    if background:
+        return _submit_media_job_response(request, 'extract_frame', [video_file],
+                                          {'second': second, 'is_last': is_last})
+
+    host_url = f"{request.scheme}://{request.get_host()}"
+
+    # The same frame of the same video extracted before
+    result_key = get_media_result_key('extract_frame', [video_file], {'second': second, 'is_last': is_last})
+    cached_path = get_cached_media_result(result_key)
+    if cached_path:
+        video_file.close()
+        output = {
+            'success': True,
+            'image_url': f"{host_url}/media/{cached_path}"
+        }
+        return HttpResponse(json.dumps(output), content_type='application/json', status=200)
+
+    # Create frames directory if it doesn't exist
+    frames_dir = os.path.join(settings.MEDIA_ROOT, 'frames')
+    if not os.path.isdir(frames_dir):
+        os.makedirs(frames_dir)
+
+    # Delete old files
+    delete_old_files(frames_dir, max_hours=1)
+
+    # Generate unique filename for the output frame
+    frame_uuid = uuid.uuid1()
+    output_file_path = os.path.join(frames_dir, f'{frame_uuid}.jpg')
+
+    temp_video_path = None
+    try:
+        # Path of the uploaded video (the upload temporary file, not copied)
+        temp_video_path = get_uploaded_file_path(video_file, suffix=os.path.splitext(video_file.name)[1])
+
+        # Extract frame using lib_ffmpeg
+        success, error_message = extract_frame_from_video(
+            video_path=temp_video_path,
+            output_path=output_file_path,
+            second=second,
+            is_last=is_last,
+            quality=2,
+            timeout=60
+        )
+
+        # Clean up temporary video file
+        if temp_video_path and os.path.exists(temp_video_path):
+            os.unlink(temp_video_path)
+
+        if not success:
+            return HttpResponse(
+                json.dumps({'success': False, 'message': error_message}),
+                content_type='application/json',
+                status=422
+            )
+
+        cache_media_result(result_key, f'frames/{frame_uuid}.jpg')
+
+        # Return the URL to the extracted frame
+        frame_url = f"{host_url}/media/frames/{frame_uuid}.jpg"
+
+        output = {
+            'success': True,
+            'image_url': frame_url
+        }
+
+        return HttpResponse(json.dumps(output), content_type='application/json', status=200)
+
+    except Exception as e:
+        logger.error(f'Error extracting video frame: {str(e)}')
+        if temp_video_path and os.path.exists(temp_video_path):
+            os.unlink(temp_video_path)
+        return HttpResponse(
+            json.dumps({'success': False, 'message': f'Error: {str(e)}'}),
+            content_type='application/json',
+            status=422
+        )
+
+
+@extend_schema(
+    tags=['Video'],
+    request={
+        'multipart/form-data': {
+            'type': 'object',
+            'properties': {
+                'video': {
+                    'type': 'string',
+                    'format': 'binary'
+                },
+                'video_upload_id': {
+                    'type': 'string',
+                    'format': 'uuid',
+                    'description': 'ID of a complete chunked upload (/api/v1/media_upload) in place of the video file.'
+                },
+                'timestamps': {
+                    'type': 'string',
+                    'description': 'Comma-separated times of the frames in seconds, e.g. "0,1.5,10".'
+                },
+                'interval': {'type': 'number', 'description': 'Extract a frame every interval seconds.'},
+                'count': {'type': 'integer', 'description': 'Extract this number of evenly spaced frames.'},
+                'sprite': {
+                    'type': 'boolean',
+                    'default': False,
+                    'description': 'Tile the frames into one sprite sheet image with a WebVTT thumbnails index.'
+                },
+                'width': {'type': 'integer', 'description': 'Width of the frames (sprite tiles are 160 by default).'},
+            },
+        }
+    },
+    responses={
+        (200, 'application/json'): VideoFramesExtractionResponseSerializer,
+        (422, 'application/json'): VideoFramesExtractionErrorSerializer
+    }
+)
+@api_view(['POST'])
+@authentication_classes([BasicAuthentication])
+@permission_classes([permissions.IsAuthenticated])
+@_closing_chunked_uploads
+def extract_video_frames(request):
+    """
+    API endpoint for extracting many frames from a video file with one upload.
+    Accepts video file and a list of timestamps, an interval or a number of evenly spaced frames
+    (max 100 frames). Returns JPG images, or a sprite sheet image and its WebVTT index.
+    """
+    video_file, upload_error = _get_uploaded_file(request, 'video')
+    sprite = request.data.get('sprite', 'false').lower() in ['true', '1', 'yes'] if isinstance(request.data.get('sprite'), str) else bool(request.data.get('sprite', False))
+
+    if upload_error:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': upload_error}),
+            content_type='application/json',
+            status=422
+        )
+
+    if video_file is None:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': 'Video file is required.'}),
+            content_type='application/json',
+            status=422
+        )
+
+    try:
+        timestamps = request.data.get('timestamps') or None
+        if isinstance(timestamps, str):
+            timestamps = [float(value) for value in timestamps.split(',') if value.strip()]
+        interval = float(request.data['interval']) if request.data.get('interval') else None
+        count = int(request.data['count']) if request.data.get('count') else None
+        width = int(request.data['width']) if request.data.get('width') else None
+    except (ValueError, TypeError):
+        return HttpResponse(
+            json.dumps({'success': False, 'message': 'Parameters timestamps, interval, count and width must be numbers.'}),
+            content_type='application/json',
+            status=422
+        )
 
-    if video_file is None:
+    if not timestamps and not interval and not count:
         return HttpResponse(
-            json.dumps({'success': False, 'message': 'Video file is required.'}),
+            json.dumps({'success': False, 'message': 'One of the parameters timestamps, interval or count is required.'}),
+            content_type='application/json',
+            status=422
+        )
+
+    if (timestamps and len(timestamps) > MAX_BATCH_FRAMES) or (count and count > MAX_BATCH_FRAMES):
+        return HttpResponse(
+            json.dumps({'success': False, 'message': f'Too many frames, maximum is {MAX_BATCH_FRAMES}.'}),
+            content_type='application/json',
+            status=422
+        )
+
+    if width is not None and not 16 <= width <= 1920:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': 'Parameter width must be between 16 and 1920.'}),
             content_type='application/json',
             status=422
         )
@@ -1357,23 +2060,25 @@ def extract_video_frame(request):
     # Delete old files
     delete_old_files(frames_dir, max_hours=1)
 
-    # Generate unique filename for the output frame
-    frame_uuid = uuid.uuid1()
-    output_file_path = os.path.join(frames_dir, f'{frame_uuid}.jpg')
+    frames_uuid = uuid.uuid1()
 
     temp_video_path = None
     try:
-        # Save uploaded video to temporary file
-        temp_video_path = save_uploaded_file_to_temp(video_file, suffix=os.path.splitext(video_file.name)[1])
+        # Path of the uploaded video (the upload temporary file, not copied)
+        temp_video_path = get_uploaded_file_path(video_file, suffix=os.path.splitext(video_file.name)[1])
 
-        # Extract frame using lib_ffmpeg
-        success, error_message = extract_frame_from_video(
+        # Extract all frames with one ffmpeg command
+        success, error_message, result = extract_frames_from_video(
             video_path=temp_video_path,
-            output_path=output_file_path,
-            second=second,
-            is_last=is_last,
+            output_dir=frames_dir,
+            name=str(frames_uuid),
+            timestamps=timestamps,
+            interval=interval,
+            count=count,
+            sprite=sprite,
+            width=width,
             quality=2,
-            timeout=60
+            timeout=120
         )
 
         # Clean up temporary video file
@@ -1387,19 +2092,26 @@ def extract_video_frame(request):
                 status=422
             )
 
-        # Return the URL to the extracted frame
+        # Return the URLs of the extracted frames
         host_url = f"{request.scheme}://{request.get_host()}"
-        frame_url = f"{host_url}/media/frames/{frame_uuid}.jpg"
-
-        output = {
-            'success': True,
-            'image_url': frame_url
-        }
+        if sprite:
+            output = {
+                'success': True,
+                'sprite_url': f"{host_url}/media/frames/{result['sprite']}",
+                'vtt_url': f"{host_url}/media/frames/{result['vtt']}",
+                'timestamps': result['timestamps']
+            }
+        else:
+            output = {
+                'success': True,
+                'frames': [{'time': frame['time'], 'image_url': f"{host_url}/media/frames/{frame['file']}"}
+                           for frame in result['frames']]
+            }
 
         return HttpResponse(json.dumps(output), content_type='application/json', status=200)
 
     except Exception as e:
-        logger.error(f'Error extracting video frame: {str(e)}')
+        logger.error(f'Error extracting video frames: {str(e)}')
         if temp_video_path and os.path.exists(temp_video_path):
             os.unlink(temp_video_path)
         return HttpResponse(
@@ -1419,23 +2131,51 @@ def extract_video_frame(request):
                     'type': 'string',
                     'format': 'binary'
                 },
+                'video_upload_id': {
+                    'type': 'string',
+                    'format': 'uuid',
+                    'description': 'ID of a complete chunked upload (/api/v1/media_upload) in place of the video file.'
+                },
                 'audio': {
                     'type': 'string',
                     'format': 'binary'
                 },
-                'use_fade_out': {'type': 'boolean', 'default': False}
+                'audio_upload_id': {
+                    'type': 'string',
+                    'format': 'uuid',
+                    'description': 'ID of a complete chunked upload (/api/v1/media_upload) in place of the audio file.'
+                },
+                'use_fade_out': {'type': 'boolean', 'default': False},
+                'background': {
+                    'type': 'boolean',
+                    'default': False,
+                    'description': (
+                        'Process in background: the response with the job UUID is returned right away, '
+                        'status at /api/v1/media_job_status/<job_uuid>, output at /api/v1/media_job_result/<job_uuid>.'
+                    ),
+                },
+                'stream': {
+                    'type': 'boolean',
+                    'default': False,
+                    'description': (
+                        'Return the video itself (fragmented MP4) instead of its URL, streamed while it is being '
+                        'processed. For short clips.'
+                    ),
+                },
             },
-            'required': ['video', 'audio']
         }
     },
     responses={
         (200, 'application/json'): VideoAudioReplacementResponseSerializer,
+        (200, 'video/mp4'): {'type': 'string', 'format': 'binary', 'description': 'Video when stream is enabled.'},
+        (202, 'application/json'): MediaJobSubmitResponseSerializer,
         (422, 'application/json'): VideoAudioReplacementErrorSerializer
     }
 )
 @api_view(['POST'])
 @authentication_classes([BasicAuthentication])
 @permission_classes([permissions.IsAuthenticated])
+@_closing_chunked_uploads
 def replace_video_audio(request):
     """
     API endpoint for replacing or adding audio track to a video file.
@@ -1444,9 +2184,18 @@ def replace_video_audio(request):
     If use_fade_out is enabled and audio duration is longer than video duration,
     adds a 3-second fade-out to the audio before the end.
     """
-    video_file: TemporaryUploadedFile = request.data.get('video') if 'video' in request.data else None
-    audio_file: TemporaryUploadedFile = request.data.get('audio') if 'audio' in request.data else None
+    video_file, video_upload_error = _get_uploaded_file(request, 'video')
+    audio_file, audio_upload_error = _get_uploaded_file(request, 'audio')
     use_fade_out = request.data.get('use_fade_out', 'false').lower() in ['true', '1', 'yes'] if isinstance(request.data.get('use_fade_out'), str) else bool(request.data.get('use_fade_out', False))
+    background = request.data.get('background', 'false').lower() in ['true', '1', 'yes'] if isinstance(request.data.get('background'), str) else bool(request.data.get('background', False))
+    stream = request.data.get('stream', 'false').lower() in ['true', '1', 'yes'] if isinstance(request.data.get('stream'), str) else bool(request.data.get('stream', False))
+
+    if video_upload_error or audio_upload_error:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': video_upload_error or audio_upload_error}),
+            content_type='application/json',
+            status=422
+        )
 
     # Validate required files
     if video_file is None:
@@ -1499,6 +2248,32 @@ def replace_video_audio(request):
             status=422
         )
 
+    if background and stream:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': 'Parameters background and stream can not be used together.'}),
+            content_type='application/json',
+            status=422
+        )
+
+    if background:
+        return _submit_media_job_response(request, 'replace_audio', [video_file, audio_file],
+                                          {'use_fade_out': use_fade_out})
+
+    host_url = f"{request.scheme}://{request.get_host()}"
+
+    # The same files processed before (the streamed output is not kept)
+    result_key = None if stream else get_media_result_key('replace_audio', [video_file, audio_file],
+                                                          {'use_fade_out': use_fade_out})
+    cached_path = get_cached_media_result(result_key)
+    if cached_path:
+        video_file.close()
+        audio_file.close()
+        output = {
+            'success': True,
+            'video_url': f"{host_url}/media/{cached_path}"
+        }
+        return HttpResponse(json.dumps(output), content_type='application/json', status=200)
+
     # Create output directory if it doesn't exist
     output_dir = os.path.join(settings.MEDIA_ROOT, 'video')
     if not os.path.isdir(output_dir):
@@ -1515,9 +2290,21 @@ def replace_video_audio(request):
     temp_audio_path = None
 
     try:
-        # Save uploaded files to temporary locations
-        temp_video_path = save_uploaded_file_to_temp(video_file, suffix=os.path.splitext(video_file.name)[1])
-        temp_audio_path = save_uploaded_file_to_temp(audio_file, suffix=os.path.splitext(audio_file.name)[1])
+        # Paths of the uploaded files (the upload temporary files, not copied)
+        temp_video_path = get_uploaded_file_path(video_file, suffix=os.path.splitext(video_file.name)[1])
+        temp_audio_path = get_uploaded_file_path(audio_file, suffix=os.path.splitext(audio_file.name)[1])
+
+        if stream:
+            return _stream_video_response(
+                replace_audio_in_video,
+                [temp_video_path, temp_audio_path],
+                video_path=temp_video_path,
+                audio_path=temp_audio_path,
+                use_fade_out=use_fade_out,
+                fade_duration=3.0,
+                audio_bitrate='192k',
+                timeout=180
+            )
 
         # Replace audio using lib_ffmpeg
         success, error_message = replace_audio_in_video(
@@ -1543,8 +2330,9 @@ def replace_video_audio(request):
                 status=422
             )
 
+        cache_media_result(result_key, f'video/{video_uuid}.mp4')
+
         # Return the URL to the processed video
-        host_url = f"{request.scheme}://{request.get_host()}"
         video_url = f"{host_url}/media/video/{video_uuid}.mp4"
 
         output = {
@@ -1577,31 +2365,74 @@ def replace_video_audio(request):
                     'type': 'string',
                     'format': 'binary'
                 },
+                'video_upload_id': {
+                    'type': 'string',
+                    'format': 'uuid',
+                    'description': 'ID of a complete chunked upload (/api/v1/media_upload) in place of the video file.'
+                },
                 'second_start': {'type': 'number', 'default': 0},
-                'second_end': {'type': 'number'}
+                'second_end': {'type': 'number'},
+                'mode': {
+                    'type': 'string',
+                    'enum': list(TRIM_MODES),
+                    'default': 'copy',
+                    'description': (
+                        'copy - fastest, cuts snap to keyframes; smart - frame-accurate, only the partial GOPs '
+                        'at the cut points are re-encoded; reencode - frame-accurate, the whole segment is re-encoded.'
+                    ),
+                },
+                'background': {
+                    'type': 'boolean',
+                    'default': False,
+                    'description': (
+                        'Process in background: the response with the job UUID is returned right away, '
+                        'status at /api/v1/media_job_status/<job_uuid>, output at /api/v1/media_job_result/<job_uuid>.'
+                    ),
+                },
+                'stream': {
+                    'type': 'boolean',
+                    'default': False,
+                    'description': (
+                        'Return the video itself (fragmented MP4) instead of its URL, streamed while it is being '
+                        'processed. For short clips.'
+                    ),
+                },
             },
-            'required': ['video']
         }
     },
     responses={
         (200, 'application/json'): VideoTrimResponseSerializer,
+        (200, 'video/mp4'): {'type': 'string', 'format': 'binary', 'description': 'Video when stream is enabled.'},
+        (202, 'application/json'): MediaJobSubmitResponseSerializer,
         (422, 'application/json'): VideoTrimErrorSerializer
     }
 )
 @api_view(['POST'])
 @authentication_classes([BasicAuthentication])
 @permission_classes([permissions.IsAuthenticated])
+@_closing_chunked_uploads
 def trim_video(request):
     """
     API endpoint for trimming a video file.
     Accepts video file (max 100 MB) and extracts a segment from second_start to second_end.
+    Mode: copy (default, cuts snap to keyframes), smart or reencode (frame-accurate).
     Returns trimmed video in MP4 format.
     """
-    video_file: TemporaryUploadedFile = request.data.get('video') if 'video' in request.data else None
+    video_file, upload_error = _get_uploaded_file(request, 'video')
     second_start = float(request.data.get('second_start', 0))
     second_end = request.data.get('second_end')
+    mode = request.data.get('mode', 'copy')
+    background = request.data.get('background', 'false').lower() in ['true', '1', 'yes'] if isinstance(request.data.get('background'), str) else bool(request.data.get('background', False))
+    stream = request.data.get('stream', 'false').lower() in ['true', '1', 'yes'] if isinstance(request.data.get('stream'), str) else bool(request.data.get('stream', False))
 
     # Validate video file is provided
+    if upload_error:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': upload_error}),
+            content_type='application/json',
+            status=422
+        )
+
     if video_file is None:
         return HttpResponse(
             json.dumps({'success': False, 'message': 'Video file is required.'}),
@@ -1641,6 +2472,13 @@ def trim_video(request):
             status=422
         )
 
+    if mode not in TRIM_MODES:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': f'Parameter mode must be one of: {", ".join(TRIM_MODES)}.'}),
+            content_type='application/json',
+            status=422
+        )
+
     # Validate video file type
     valid_video_types = ['video/mp4', 'video/webm', 'video/mpeg', 'video/quicktime', 'video/x-msvideo']
     if video_file.content_type not in valid_video_types:
@@ -1659,6 +2497,31 @@ def trim_video(request):
             status=422
         )
 
+    if background and stream:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': 'Parameters background and stream can not be used together.'}),
+            content_type='application/json',
+            status=422
+        )
+
+    if background:
+        return _submit_media_job_response(request, 'trim', [video_file],
+                                          {'second_start': second_start, 'second_end': second_end, 'mode': mode})
+
+    host_url = f"{request.scheme}://{request.get_host()}"
+
+    # The same segment of the same video trimmed before (the streamed output is not kept)
+    result_key = None if stream else get_media_result_key(
+        'trim', [video_file], {'second_start': second_start, 'second_end': second_end, 'mode': mode})
+    cached_path = get_cached_media_result(result_key)
+    if cached_path:
+        video_file.close()
+        output = {
+            'success': True,
+            'video_url': f"{host_url}/media/{cached_path}"
+        }
+        return HttpResponse(json.dumps(output), content_type='application/json', status=200)
+
     # Create output directory if it doesn't exist
     output_dir = os.path.join(settings.MEDIA_ROOT, 'video')
     if not os.path.isdir(output_dir):
@@ -1674,8 +2537,19 @@ def trim_video(request):
     temp_video_path = None
 
     try:
-        # Save uploaded video to temporary file
-        temp_video_path = save_uploaded_file_to_temp(video_file, suffix=os.path.splitext(video_file.name)[1])
+        # Path of the uploaded video (the upload temporary file, not copied)
+        temp_video_path = get_uploaded_file_path(video_file, suffix=os.path.splitext(video_file.name)[1])
+
+        if stream:
+            return _stream_video_response(
+                trim_video_segment,
+                [temp_video_path],
+                video_path=temp_video_path,
+                start_time=second_start,
+                end_time=second_end,
+                timeout=180,
+                mode=mode
+            )
 
         # Trim video using lib_ffmpeg
         success, error_message, video_duration = trim_video_segment(
@@ -1683,7 +2557,8 @@ def trim_video(request):
             output_path=output_file_path,
             start_time=second_start,
             end_time=second_end,
-            timeout=180
+            timeout=180,
+            mode=mode
         )
 
         # Clean up temporary video file
@@ -1697,8 +2572,9 @@ def trim_video(request):
                 status=422
             )
 
+        cache_media_result(result_key, f'video/{video_uuid}.mp4')
+
         # Return the URL to the trimmed video
-        host_url = f"{request.scheme}://{request.get_host()}"
         video_url = f"{host_url}/media/video/{video_uuid}.mp4"
 
         output = {
@@ -1731,19 +2607,55 @@ def trim_video(request):
                         'type': 'string',
                         'format': 'binary'
                     }
-                }
+                },
+                'video_upload_ids': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'string',
+                        'format': 'uuid'
+                    },
+                    'description': 'IDs of complete chunked uploads (/api/v1/media_upload) in place of the video files.'
+                },
+                'preset': {
+                    'type': 'string',
+                    'enum': list(ENCODER_PRESET_NAMES),
+                    'default': 'balanced',
+                    'description': (
+                        'Encoder profile of the videos that are re-encoded: fast, balanced or archive '
+                        '(higher quality, larger file). auto uses balanced, or fast if the videos are too long '
+                        'to encode in time.'
+                    ),
+                },
+                'background': {
+                    'type': 'boolean',
+                    'default': False,
+                    'description': (
+                        'Process in background: the response with the job UUID is returned right away, '
+                        'status at /api/v1/media_job_status/<job_uuid>, output at /api/v1/media_job_result/<job_uuid>.'
+                    ),
+                },
+                'stream': {
+                    'type': 'boolean',
+                    'default': False,
+                    'description': (
+                        'Return the video itself (fragmented MP4) instead of its URL, streamed while it is being '
+                        'processed. For short clips.'
+                    ),
+                },
             },
-            'required': ['videos']
         }
     },
     responses={
         (200, 'application/json'): VideoConcatenationResponseSerializer,
+        (200, 'video/mp4'): {'type': 'string', 'format': 'binary', 'description': 'Video when stream is enabled.'},
+        (202, 'application/json'): MediaJobSubmitResponseSerializer,
         (422, 'application/json'): VideoConcatenationErrorSerializer
     }
 )
 @api_view(['POST'])
 @authentication_classes([BasicAuthentication])
 @permission_classes([permissions.IsAuthenticated])
+@_closing_chunked_uploads
 def concatenate_video_files(request):
     """
     API endpoint for concatenating multiple video files into one.
@@ -1753,6 +2665,26 @@ def concatenate_video_files(request):
     """
     # Get list of video files from request
     video_files = request.FILES.getlist('videos')
+    video_upload_ids = request.data.getlist('video_upload_ids') if hasattr(request.data, 'getlist') else request.data.get('video_upload_ids', [])
+    background = request.data.get('background', 'false').lower() in ['true', '1', 'yes'] if isinstance(request.data.get('background'), str) else bool(request.data.get('background', False))
+    stream = request.data.get('stream', 'false').lower() in ['true', '1', 'yes'] if isinstance(request.data.get('stream'), str) else bool(request.data.get('stream', False))
+    preset = request.data.get('preset', 'balanced')
+
+    # Complete chunked uploads in place of the video files (a list or comma-separated IDs)
+    if not video_files and video_upload_ids:
+        if isinstance(video_upload_ids, str):
+            video_upload_ids = [video_upload_ids]
+        for upload_id in ','.join(str(value) for value in video_upload_ids).split(','):
+            if not upload_id.strip():
+                continue
+            try:
+                video_files.append(_get_upload_file(request, upload_id.strip()))
+            except (FileNotFoundError, UploadError) as e:
+                return HttpResponse(
+                    json.dumps({'success': False, 'message': str(e)}),
+                    content_type='application/json',
+                    status=422
+                )
 
     # Validate that at least one video file is provided
     if not video_files or len(video_files) == 0:
@@ -1762,6 +2694,13 @@ def concatenate_video_files(request):
             status=422
         )
 
+    if preset not in ENCODER_PRESET_NAMES:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': f'Parameter preset must be one of: {", ".join(ENCODER_PRESET_NAMES)}.'}),
+            content_type='application/json',
+            status=422
+        )
+
     # Validate video file types and sizes
     valid_video_types = ['video/mp4', 'video/webm', 'video/mpeg', 'video/quicktime', 'video/x-msvideo']
     MAX_VIDEO_SIZE = 100 * 1024 * 1024  # 100 MB
@@ -1781,6 +2720,16 @@ def concatenate_video_files(request):
                 status=422
             )
 
+    if background and stream:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': 'Parameters background and stream can not be used together.'}),
+            content_type='application/json',
+            status=422
+        )
+
+    if background:
+        return _submit_media_job_response(request, 'concatenate', video_files, {'preset': preset})
+
     # Create output directory if it doesn't exist
     output_dir = os.path.join(settings.MEDIA_ROOT, 'video')
     if not os.path.isdir(output_dir):
@@ -1796,16 +2745,26 @@ def concatenate_video_files(request):
     temp_video_paths = []
 
     try:
-        # Save all uploaded videos to temporary files
+        # Paths of all uploaded videos (the upload temporary files, not copied)
         for video_file in video_files:
-            temp_path = save_uploaded_file_to_temp(video_file, suffix=os.path.splitext(video_file.name)[1])
+            temp_path = get_uploaded_file_path(video_file, suffix=os.path.splitext(video_file.name)[1])
             temp_video_paths.append(temp_path)
 
+        if stream:
+            return _stream_video_response(
+                concatenate_videos,
+                temp_video_paths,
+                video_paths=temp_video_paths,
+                timeout=300,
+                preset=preset
+            )
+
         # Concatenate videos using lib_ffmpeg
         success, error_message = concatenate_videos(
             video_paths=temp_video_paths,
             output_path=output_file_path,
-            timeout=300
+            timeout=300,
+            preset=preset
         )
 
         # Clean up temporary video files
@@ -1844,6 +2803,235 @@ def concatenate_video_files(request):
         )
 
 
+def _media_upload_response(upload, status: int = 200, output: dict = None) -> HttpResponse:
+    """JSON response about a chunked upload, with the offset also in the tus-style headers."""
+    output = output or {
+        'success': True,
+        'upload_id': str(upload.uuid),
+        'file_name': upload.file_name,
+        'size': upload.size,
+        'offset': upload.offset,
+        'status': upload.status,
+    }
+    response = HttpResponse(json.dumps(output), content_type='application/json', status=status)
+    response['Upload-Offset'] = str(upload.offset)
+    response['Upload-Length'] = str(upload.size)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@extend_schema(
+    tags=['Video'],
+    request=MediaUploadCreateRequestSerializer,
+    responses={
+        (201, 'application/json'): MediaUploadResponseSerializer,
+        (413, 'application/json'): MediaUploadErrorSerializer,
+        (422, 'application/json'): MediaUploadErrorSerializer
+    }
+)
+@api_view(['POST'])
+@authentication_classes([BasicAuthentication])
+@permission_classes([permissions.IsAuthenticated])
+def media_upload_create(request):
+    """
+    Start a resumable upload of a media file.
+    The data is sent with PATCH requests to /api/v1/media_upload/<upload_id> in consecutive chunks,
+    each with the Upload-Offset header (the number of bytes received so far). After a dropped connection
+    the upload continues from the offset returned by GET. The id of the complete upload is accepted
+    by the video endpoints in place of the file field (video_upload_id, audio_upload_id, video_upload_ids).
+    """
+    file_name = request.data.get('file_name')
+    content_type = request.data.get('content_type')
+    size = request.data.get('size') or request.headers.get('Upload-Length')
+
+    if not file_name or not content_type:
+        return HttpResponse(
+            json.dumps({'success': False, 'message': 'Parameters file_name and content_type are required.'}),
+            content_type='application/json',
+            status=422
+        )
+
+    try:
+        size = int(size)
+    except (ValueError, TypeError):
+        return HttpResponse(
+            json.dumps({'success': False, 'message': 'Parameter size must be a number.'}),
+            content_type='application/json',
+            status=422
+        )
+
+    try:
+        upload = create_upload(file_name, content_type, size, user=request.user)
+    except UploadTooLarge as e:
+        return HttpResponse(json.dumps({'success': False, 'message': str(e)}),
+                            content_type='application/json', status=413)
+    except UploadError as e:
+        return HttpResponse(json.dumps({'success': False, 'message': str(e)}),
+                            content_type='application/json', status=422)
+
+    response = _media_upload_response(upload, status=201)
+    response['Location'] = f"{request.scheme}://{request.get_host()}/api/v1/media_upload/{upload.uuid}"
+    return response
+
+
+@extend_schema(
+    tags=['Video'],
+    methods=['PATCH'],
+    request={
+        'application/offset+octet-stream': {
+            'type': 'string',
+            'format': 'binary',
+            'description': 'Chunk data. The Upload-Offset header is required.'
+        }
+    },
+    parameters=[
+        OpenApiParameter(
+            name='Upload-Offset',
+            type=int,
+            location=OpenApiParameter.HEADER,
+            description='Number of bytes received so far, the chunk is appended at this offset.',
+        )
+    ],
+    responses={
+        (200, 'application/json'): MediaUploadResponseSerializer,
+        (404, 'application/json'): MediaUploadErrorSerializer,
+        (409, 'application/json'): MediaUploadErrorSerializer,
+        (413, 'application/json'): MediaUploadErrorSerializer
+    }
+)
+@extend_schema(
+    tags=['Video'],
+    methods=['GET', 'DELETE'],
+    responses={
+        (200, 'application/json'): MediaUploadResponseSerializer,
+        (404, 'application/json'): MediaUploadErrorSerializer
+    }
+)
+@api_view(['GET', 'PATCH', 'DELETE'])
+@authentication_classes([BasicAuthentication])
+@permission_classes([permissions.IsAuthenticated])
+def media_upload_action(request, upload_id):
+    """
+    GET (or HEAD) - status and offset of a chunked upload, PATCH - append a chunk, DELETE - cancel the upload.
+    """
+    try:
+        upload = get_upload(str(upload_id), user=request.user)
+    except FileNotFoundError as e:
+        return HttpResponse(json.dumps({'success': False, 'message': str(e)}),
+                            content_type='application/json', status=404)
+
+    if request.method == 'DELETE':
+        delete_upload(upload)
+        return HttpResponse(json.dumps({'success': True, 'upload_id': str(upload.uuid)}),
+                            content_type='application/json', status=200)
+
+    if request.method == 'GET':
+        return _media_upload_response(upload)
+
+    try:
+        offset = int(request.headers.get('Upload-Offset'))
+    except (ValueError, TypeError):
+        return HttpResponse(
+            json.dumps({'success': False, 'message': 'Header Upload-Offset is required.'}),
+            content_type='application/json',
+            status=422
+        )
+
+    # The body is read from the request stream in blocks, not loaded into memory
+    length = int(request.META.get('CONTENT_LENGTH') or 0)
+    try:
+        append_upload_chunk(upload, offset, request.stream, length)
+    except UploadOffsetConflict as e:
+        return _media_upload_response(upload, status=409,
+                                      output={'success': False, 'message': str(e), 'offset': upload.offset})
+    except UploadTooLarge as e:
+        return _media_upload_response(upload, status=413,
+                                      output={'success': False, 'message': str(e), 'offset': upload.offset})
+    except OSError as e:
+        logger.error(f'Error appending upload chunk: {str(e)}')
+        return _media_upload_response(upload, status=422,
+                                      output={'success': False, 'message': 'Chunk was not received completely.',
+                                              'offset': upload.offset})
+
+    return _media_upload_response(upload)
+
+
+@extend_schema(
+    tags=['Video'],
+    responses={
+        (200, 'application/json'): MediaJobStatusResponseSerializer
+    }
+)
+@api_view(['GET'])
+@authentication_classes([BasicAuthentication])
+@permission_classes([permissions.IsAuthenticated])
+def media_job_status(request, job_uuid):
+    """
+    Status of a background video processing job: pending, processing, done or error.
+    """
+    try:
+        job = get_media_job(str(job_uuid), user=request.user)
+    except FileNotFoundError as e:
+        return HttpResponse(json.dumps({'success': False, 'message': str(e)}),
+                            content_type='application/json', status=404)
+
+    output = {
+        'success': True,
+        'job_uuid': str(job.uuid),
+        'operation': job.operation,
+        'status': job.status,
+        'date_created': job.date_created.isoformat(),
+        'date_started': job.date_started.isoformat() if job.date_started else None,
+        'date_finished': job.date_finished.isoformat() if job.date_finished else None,
+    }
+    if job.error:
+        output['message'] = job.error
+
+    return HttpResponse(json.dumps(output), content_type='application/json', status=200)
+
+
+@extend_schema(
+    tags=['Video'],
+    responses={
+        (200, 'application/json'): MediaJobResultResponseSerializer,
+        (202, 'application/json'): MediaJobStatusResponseSerializer,
+        (422, 'application/json'): VideoConcatenationErrorSerializer
+    }
+)
+@api_view(['GET'])
+@authentication_classes([BasicAuthentication])
+@permission_classes([permissions.IsAuthenticated])
+def media_job_result(request, job_uuid):
+    """
+    Output of a background video processing job, in the same format as the synchronous endpoint.
+    Returns status 202 while the job is not finished and 422 if it failed.
+    """
+    try:
+        job = get_media_job(str(job_uuid), user=request.user)
+    except FileNotFoundError as e:
+        return HttpResponse(json.dumps({'success': False, 'message': str(e)}),
+                            content_type='application/json', status=404)
+
+    if job.status == 'error':
+        return HttpResponse(json.dumps({'success': False, 'message': job.error}),
+                            content_type='application/json', status=422)
+
+    if job.status != 'done':
+        output = {'success': False, 'job_uuid': str(job.uuid), 'status': job.status,
+                  'message': 'Job is not finished yet.'}
+        return HttpResponse(json.dumps(output), content_type='application/json', status=202)
+
+    # Output files are deleted an hour after they were created
+    if not all(os.path.isfile(os.path.join(settings.MEDIA_ROOT, path)) for path in job.result.values()):
+        return HttpResponse(json.dumps({'success': False, 'message': 'Job output has expired.'}),
+                            content_type='application/json', status=404)
+
+    host_url = f"{request.scheme}://{request.get_host()}"
+    output = {'success': True, **{key: f"{host_url}/media/{path}" for key, path in job.result.items()}}
+
+    return HttpResponse(json.dumps(output), content_type='application/json', status=200)
+
+
 @extend_schema(
     tags=['Widget'],
     request=WidgetEmbedCodeRequestSerializer,